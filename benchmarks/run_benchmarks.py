@@ -0,0 +1,486 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Local benchmark suite for the dataset generators and graders.
+#
+# Every benchmark runs offline. Results are written as JSON and compared with
+# a stored baseline, and any benchmark that got slower than the threshold is
+# reported as a regression (non-zero exit code).
+#
+#   python benchmarks/run_benchmarks.py                  # run and compare
+#   python benchmarks/run_benchmarks.py --save-baseline  # record a new baseline
+#
+# Grader benchmarks also record a digest of the scores they produce, and a
+# digest that differs from the baseline's is reported like a regression, so a
+# grader optimization is checked for identical scores as well as for speed.
+#
+# Benchmarks whose dependencies are missing (vidyut, rapidfuzz) are skipped.
+# A benchmark that raises is reported as failed and the rest still run; any
+# failure makes the exit code non-zero.
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+COMMON_DIR = REPO_ROOT / "common"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_RESULTS = BENCH_DIR / "results.json"
+
+
+class Skip(Exception):
+    """Raised by a benchmark setup when a dependency is unavailable"""
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def load_challenge_module(challenge, name):
+    """Import a script from a challenge directory under a unique module name"""
+    challenge_dir = REPO_ROOT / challenge
+    # Both challenges have sibling modules with the same names (e.g.
+    # instrumentation), so drop any that were imported from the other one
+    for mod_name, mod in list(sys.modules.items()):
+        mod_file = getattr(mod, "__file__", None) or ""
+        if mod_file.startswith(str(REPO_ROOT / "challenge_")) and not mod_file.startswith(str(challenge_dir)):
+            del sys.modules[mod_name]
+
+    sys.path.insert(0, str(challenge_dir))
+    try:
+        spec = importlib.util.spec_from_file_location(f"{challenge}_{name}", challenge_dir / f"{name}.py")
+        module = importlib.util.module_from_spec(spec)
+        with working_directory(challenge_dir):
+            spec.loader.exec_module(module)
+    except ImportError as e:
+        raise Skip(f"{challenge}/{name}.py: {e}")
+    finally:
+        sys.path.remove(str(challenge_dir))
+    return module
+
+
+def load_common_module(name):
+    """Import a module shared by both challenges from common/"""
+    if str(COMMON_DIR) not in sys.path:
+        sys.path.append(str(COMMON_DIR))
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise Skip(f"common/{name}.py: {e}")
+
+
+def grader_source(challenge, kind=None):
+    """The grader source of a challenge's openai_rl_job.py: GRADER_SOURCE, or the one GRADERS calls kind.
+
+    Grader sources are built from shared pieces, so the script is imported;
+    it imports the OpenAI SDK only when a job is launched.
+    """
+    module = load_challenge_module(challenge, "openai_rl_job")
+    if kind is None:
+        source = getattr(module, "GRADER_SOURCE", None)
+    else:
+        source = getattr(module, "GRADERS", {}).get(kind, (None, None))[1]
+    if not isinstance(source, str):
+        raise Skip(f"No {kind or 'default'} grader source found in {challenge}/openai_rl_job.py")
+    return source
+
+
+def load_grader_namespace(challenge, kind=None):
+    """Run the grader source embedded in a challenge's openai_rl_job.py and return its definitions"""
+    namespace = {}
+    try:
+        exec(compile(grader_source(challenge, kind), f"<{challenge} grader>", "exec"), namespace)
+    except ImportError as e:
+        raise Skip(f"{challenge} grader: {e}")
+    return namespace
+
+
+def load_grader(challenge, kind=None):
+    """Compile the grade() function embedded in a challenge's openai_rl_job.py"""
+    return load_grader_namespace(challenge, kind)["grade"]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+
+
+def morphology_records(n, seed=0):
+    """Tiṅanta cell records shaped like challenge_2's generator output"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        history = [{"code": f"{rng.randint(1, 8)}.{rng.randint(1, 4)}.{rng.randint(1, 200)}",
+                    "text": "bhū + a + ti"} for _ in range(rng.randint(10, 30))]
+        records.append({
+            "id": "bhū|bhvādi|kartari|laṭ|prathama|eka",
+            "messages": [{"role": "developer", "content": "x" * 900}, {"role": "user", "content": "y" * 150}],
+            "dhatu": "bhū",
+            "gana": "bhvādi",
+            "prayoga": "kartari",
+            "lakara": "laṭ",
+            "purusha": "prathama",
+            "vacana": "eka",
+            "expected_answer": "bhavati",
+            "derivation_history": history,
+            "accepted_answers": ["bhavati"],
+            "alternative_derivations": [],
+        })
+    return records
+
+
+def quote_records(n, seed=0):
+    """Quote records shaped like challenge_3's generator output"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        verse = rng.randint(1, 120)
+        quote = " ".join(rng.choice(("kaścit", "kāntā", "virahaguruṇā", "svādhikārāt", "pramattaḥ"))
+                         for _ in range(rng.randint(4, 16)))
+        records.append({
+            "id": f"sa_kAlidAsa-meghadUta.xml#md_{i}",
+            "messages": [{"role": "system", "content": "x" * 900}, {"role": "user", "content": f'Sanskrit quote: "{quote}"'}],
+            "quote": quote,
+            "quote_type": "verse",
+            "meter": rng.choice(("mandākrāntā", "anuṣṭubh", None)),
+            "difficulty": rng.choice(("easy", "medium", "hard")),
+            "expected_answer": {"author": "Kālidāsa", "work": "Meghadūta", "book": "1", "chapter": "unknown",
+                                "verse": str(verse), "confidence": 1.0},
+            "metadata": {"filename": "sa_kAlidAsa-meghadUta.xml", "segment_id": f"md_{i}",
+                         "chapter_info": {"book": "1", "chapter": "unknown", "section": "unknown"},
+                         "text_length": len(quote), "author_id": "kalidasa", "work_id": "meghaduta"},
+            "location": {"path": [3, 0, 0, verse - 1], "labels": ["1", "unknown", str(verse)],
+                         "offsets": [None, None, 1]},
+            "answer_aliases": {"author": ["kalidasa", "kālidāsa"], "work": ["meghaduta", "meghadūta"]},
+        })
+    return records
+
+
+def derivation_rollouts(n, seed=0):
+    """(sample, item) pairs for the challenge_2 grader: perfect, partial and garbage outputs"""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(n):
+        history = [{"code": f"1.3.{j}", "text": f"bhū + step{j}"} for j in range(rng.randint(10, 30))]
+        kind = i % 3
+        if kind == 0:
+            output = json.dumps({"conjugated_verb": "bhavati", "derivation_history": history})
+        elif kind == 1:
+            cut = len(history) // 2
+            wrong = history[:cut] + [{"code": "9.9.9", "text": "wrong"}] + history[cut + 1:]
+            output = json.dumps({"conjugated_verb": "bhavati", "derivation_history": wrong})
+        else:
+            output = "Sure! Here is the answer: {conjugated_verb: bhavati"
+        pairs.append(({"output_text": output}, {"derivation_history": history}))
+    return pairs
+
+
+def librarian_rollouts(n, seed=0):
+    """(sample, item) pairs for the challenge_3 grader: perfect, partial and garbage outputs"""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(n):
+        expected = {"author": "Kālidāsa", "work": "Meghadūta", "book": "1", "chapter": "unknown",
+                    "verse": str(rng.randint(1, 120)), "confidence": 1.0}
+        kind = i % 3
+        if kind == 0:
+            output = json.dumps(dict(expected, confidence=0.9))
+        elif kind == 1:
+            output = json.dumps({"author": "kalidasa", "work": "meghaduta", "book": "2",
+                                 "chapter": "unknown", "verse": str(int(expected["verse"]) + 1),
+                                 "confidence": 0.5})
+        else:
+            output = "I believe this is from the Meghadūta"
+        # Alias keys as alias_index.py writes them with every generated item
+        aliases = {"author": ["kalidasa"], "work": ["megaduta", "megasandesa"]}
+        # And the location locations.py gives it: verses numbered from 1, chapter labels that aren't numbers
+        location = {"path": [3, 1, 1, int(expected["verse"])], "labels": ["1", "unknown", expected["verse"]],
+                    "offsets": [0, None, 0]}
+        pairs.append(({"output_text": output},
+                      {"expected_answer": expected, "difficulty": "medium", "answer_aliases": aliases,
+                       "location": location}))
+    return pairs
+
+
+def dataset_rollouts(items, seed=0):
+    """(sample, item) pairs over real dataset items: exact, near-miss, wrong-item, fenced and prose answers"""
+    rng = random.Random(seed)
+    pairs = []
+    for item in items:
+        expected = item["expected_answer"]
+        verse = str(expected.get("verse", ""))
+        other = items[rng.randrange(len(items))]["expected_answer"]
+        outputs = [
+            json.dumps(dict(expected, confidence=0.9), ensure_ascii=False),
+            json.dumps({"author": str(expected.get("author", "")).lower()[:-1] + "a",
+                        "work": str(expected.get("work", ""))[:-2], "book": expected.get("book"), "chapter": "2",
+                        "verse": str(int(verse) + rng.randint(1, 4)) if verse.isdigit() else verse + "b",
+                        "confidence": 0.5}, ensure_ascii=False),
+            "Here is my answer:\n```json\n" + json.dumps(dict(other, confidence=0.3), ensure_ascii=False) + "\n```",
+            f"I believe this is from the {expected.get('work')}",
+        ]
+        pairs.extend(({"output_text": output}, item) for output in outputs)
+    return pairs
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks. Each one is a setup function returning (fn, items) where fn() is
+# the timed call and items is the number of units of work it does.
+
+BENCHMARKS = {}
+# Benchmarks whose timed call returns the list of scores it graded
+SCORED = set()
+
+
+def benchmark(name, scores=False):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        if scores:
+            SCORED.add(name)
+        return setup
+    return register
+
+
+def scores_digest(scores):
+    """sha256 of a list of scores; floats are serialized by repr, so equal digests mean identical scores"""
+    return hashlib.sha256(json.dumps(scores).encode("utf-8")).hexdigest()
+
+
+@benchmark("challenge_2.generate_jsonl_dataset")
+def bench_generate_jsonl_dataset(tmp):
+    gen = load_challenge_module("challenge_2", "make_dataset_openai_jsonl")
+
+    def run():
+        # generate_jsonl_dataset always works on the same ten roots
+        with working_directory(REPO_ROOT / "challenge_2"):
+            return gen.generate_jsonl_dataset()
+    return run, 450
+
+
+for _size in ("16KB", "64KB", "256KB"):
+    def _make_extract_bench(size):
+        def bench_extract(tmp):
+            mod = load_challenge_module("challenge_3", "make_dataset_openai_jsonl")
+            synthetic = load_challenge_module("challenge_3", "synthetic_tei")
+            path = Path(tmp) / f"sa_synthetic-{size}.xml"
+            counts = synthetic.SyntheticTEIWriter(seed=0).write(
+                path, synthetic.parse_size(size), title="Synthetic Text", author="Anonymous")
+            processor = mod.SanskritTextProcessor(tmp)
+            return (lambda: processor.extract_text_segments(path)), counts["verses"]
+        return bench_extract
+    benchmark(f"challenge_3.extract_text_segments[{_size}]")(_make_extract_bench(_size))
+
+
+for _challenge, _records in (("challenge_2", morphology_records), ("challenge_3", quote_records)):
+    def _make_split_benches(challenge, records):
+        def bench_split_dataset(tmp):
+            mod = load_challenge_module(challenge, "make_dataset_openai_jsonl")
+            data = records(20_000)
+            return (lambda: mod.split_dataset(data)), len(data)
+
+        def bench_write_jsonl_file(tmp):
+            mod = load_challenge_module(challenge, "make_dataset_openai_jsonl")
+            data = records(5_000)
+            path = Path(tmp) / f"{challenge}_out.jsonl"
+            return (lambda: mod.write_jsonl_file(data, path)), len(data)
+        return bench_split_dataset, bench_write_jsonl_file
+    _split, _write = _make_split_benches(_challenge, _records)
+    benchmark(f"{_challenge}.split_dataset")(_split)
+    benchmark(f"{_challenge}.write_jsonl_file")(_write)
+
+
+@benchmark("challenge_2.grade", scores=True)
+def bench_challenge_2_grade(tmp):
+    grade = load_grader("challenge_2")
+    pairs = derivation_rollouts(3_000)
+    return (lambda: [grade(sample, item) for sample, item in pairs]), len(pairs)
+
+
+@benchmark("challenge_3.grade", scores=True)
+def bench_challenge_3_grade(tmp):
+    grade = load_grader("challenge_3")
+    pairs = librarian_rollouts(3_000)
+    return (lambda: [grade(sample, item) for sample, item in pairs]), len(pairs)
+
+
+@benchmark("challenge_3.grade[location]", scores=True)
+def bench_challenge_3_grade_location(tmp):
+    grade = load_grader("challenge_3", "location")
+    pairs = librarian_rollouts(3_000)
+    return (lambda: [grade(sample, item) for sample, item in pairs]), len(pairs)
+
+
+@benchmark("challenge_3.grade[location, batch]", scores=True)
+def bench_challenge_3_grade_location_batch(tmp):
+    locations = load_challenge_module("challenge_3", "locations")
+    namespace = load_grader_namespace("challenge_3", "location")
+    pairs = librarian_rollouts(3_000)
+    # The batch scorer has to give grade()'s scores, not just the same digest run to run
+    scores = [namespace["grade"](sample, item) for sample, item in pairs]
+    batch = locations.grade_location_batch(namespace["location_answer"], pairs)
+    if batch != scores:
+        mismatches = sum(a != b for a, b in zip(scores, batch))
+        raise AssertionError(f"grade_location_batch differs from grade() on {mismatches} of {len(pairs)} rollouts")
+    return (lambda: locations.grade_location_batch(namespace["location_answer"], pairs)), len(pairs)
+
+
+@benchmark("challenge_3.grade[dataset]", scores=True)
+def bench_challenge_3_grade_dataset(tmp):
+    # The shipped 2,000-quote dataset, pretty-printed, hence iter_records
+    complete = sorted((REPO_ROOT / "challenge_3" / "sanskrit_dataset_output").glob("sanskrit_quote_id_complete_*.jsonl"))
+    if not complete:
+        raise Skip("no challenge_3 sanskrit_quote_id_complete_*.jsonl")
+    items = list(load_common_module("record_store").iter_records(complete[0]))
+    grade = load_grader("challenge_3")
+    pairs = dataset_rollouts(items)
+    return (lambda: [grade(sample, item) for sample, item in pairs]), len(pairs)
+
+
+for _challenge, _rollouts in (("challenge_2", derivation_rollouts), ("challenge_3", librarian_rollouts)):
+    def _make_cached_grade_bench(challenge, rollouts):
+        def bench_cached_grade(tmp):
+            cache_mod = load_common_module("grading_cache")
+            cache = cache_mod.GradingCache(grader_source(challenge), str(Path(tmp) / f"{challenge}_grades.sqlite"),
+                                           grade_fn=load_grader(challenge))
+            pairs = rollouts(3_000)
+            cache.grade_many(pairs)  # every timed run is a re-score of an already graded set
+            return (lambda: cache.grade_many(pairs)), len(pairs)
+        return bench_cached_grade
+    benchmark(f"{_challenge}.grade[cached]", scores=True)(_make_cached_grade_bench(_challenge, _rollouts))
+
+
+# ---------------------------------------------------------------------------
+
+
+def run_benchmark(setup, repeat, tmp, scored=False):
+    fn, items = setup(tmp)
+    output = fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    result = {
+        "median_s": median,
+        "min_s": min(timings),
+        "repeat": repeat,
+        "items": items,
+        "items_per_s": items / median if median > 0 else None,
+    }
+    if scored:
+        result["scores_sha256"] = scores_digest(output)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Return (name, baseline_s, current_s, ratio) for every benchmark slower than threshold or whose scores changed.
+
+    ratio is None for a score change.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or "median_s" not in result or "median_s" not in base:
+            continue
+        ratio = result["median_s"] / base["median_s"]
+        marker = "REGRESSION" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "ok")
+        scores_changed = "scores_sha256" in base and result.get("scores_sha256") != base["scores_sha256"]
+        if scores_changed:
+            marker += ", SCORES CHANGED"
+        print(f"  {name:<45} {base['median_s'] * 1000:>10.2f}ms -> {result['median_s'] * 1000:>10.2f}ms "
+              f"({ratio:.2f}x) {marker}")
+        if ratio > 1 + threshold:
+            regressions.append((name, base["median_s"], result["median_s"], ratio))
+        if scores_changed:
+            regressions.append((name, base["median_s"], result["median_s"], None))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local benchmark suite")
+    parser.add_argument("-k", "--filter", default=None, help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=str(DEFAULT_RESULTS))
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression (default 0.2 = 20%%)")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = {}
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            try:
+                result = run_benchmark(BENCHMARKS[name], args.repeat, tmp, scored=name in SCORED)
+            except Skip as e:
+                print(f"  {name:<45} skipped ({e})")
+                results[name] = {"skipped": str(e)}
+                continue
+            except Exception as e:
+                # One broken benchmark must not take the rest of the suite down with it
+                print(f"  {name:<45} FAILED ({type(e).__name__}: {e})")
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+                failed.append(name)
+                continue
+            results[name] = result
+            print(f"  {name:<45} {result['median_s'] * 1000:>10.2f}ms median "
+                  f"({result['items_per_s']:.0f} items/s)")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if failed:
+        print(f"{len(failed)} benchmark(s) failed: {', '.join(failed)}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 1 if failed else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 1 if failed else 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparison with baseline from {baseline.get('timestamp', '?')}:")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} or with changed scores")
+        return 1
+    print("\nNo regressions")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from record_store import iter_records
+
+# Arrow / Hugging Face datasets export of the morphology records.
+#
+# The generator writes JSONL, so every analysis over a regenerated corpus
+# starts by parsing all of it. This writes the splits as a DatasetDict with an
+# explicit schema instead: derivation_history and the steps of
+# alternative_derivations are lists of {code, text} structs, accepted_answers
+# a list of strings. datasets.load_from_disk() memory-maps the Arrow files, so
+# filtering and evaluation run column-wise on the mapped data, with no JSON
+# parsing.
+#
+#   python arrow_export.py --output-dir sanskrit_morphology_arrow
+#   python make_dataset_openai_jsonl.py --arrow-output sanskrit_morphology_arrow
+#
+#   >>> from datasets import load_from_disk
+#   >>> ds = load_from_disk("sanskrit_morphology_arrow")
+#   >>> ds["train"].filter(lambda lakara: [l == "liṭ" for l in lakara], input_columns="lakara", batched=True)
+
+DEFAULT_OUTPUT_DIR = "sanskrit_morphology_arrow"
+DEFAULT_SPLITS = {
+    "train": "sanskrit_morphology_train.jsonl",
+    "validation": "sanskrit_morphology_val.jsonl",
+    "test": "sanskrit_morphology_test.jsonl",
+}
+
+
+def schema():
+    """Arrow schema of every column a morphology record can have, in column order"""
+    from datasets import Value
+
+    step = {"code": Value("string"), "text": Value("string")}
+    return {
+        "id": Value("string"),
+        "messages": [{"role": Value("string"), "content": Value("string")}],
+        "pada_type": Value("string"),
+        # tiṅanta cells
+        "dhatu": Value("string"),
+        "gana": Value("string"),
+        "sanadi": Value("string"),
+        "prayoga": Value("string"),
+        "lakara": Value("string"),
+        "purusha": Value("string"),
+        # subanta cells
+        "pratipadika": Value("string"),
+        "linga": Value("string"),
+        "vibhakti": Value("string"),
+        "vacana": Value("string"),
+        "expected_answer": Value("string"),
+        "derivation_history": [step],
+        "accepted_answers": [Value("string")],
+        "alternative_derivations": [{"answer": Value("string"), "prefix": Value("int32"), "steps": [step]}],
+        # paradigm-table entries (--tables)
+        "cells": [{"purusha": Value("string"), "vacana": Value("string"), "expected_answer": Value("string"),
+                   "accepted_answers": [Value("string")]}],
+    }
+
+
+def features_for(columns):
+    """Features for the schema columns present in the records"""
+    from datasets import Features
+
+    full = schema()
+    unknown = set(columns) - set(full)
+    if unknown:
+        raise ValueError(f"No Arrow schema for record fields: {sorted(unknown)}")
+    return Features({name: feature for name, feature in full.items() if name in columns})
+
+
+def _rows(path, columns):
+    for record in iter_records(path):
+        yield {column: record.get(column) for column in columns}
+
+
+def export_arrow(splits, output_dir=DEFAULT_OUTPUT_DIR):
+    """Save splits (name -> JSONL path or list of records) as a DatasetDict.
+
+    JSONL files are streamed into Arrow rather than loaded, so this also works
+    for corpora that don't fit in memory. Returns the row count per split.
+    """
+    from datasets import Dataset, DatasetDict
+
+    columns = set()
+    for source in splits.values():
+        records = iter_records(source) if isinstance(source, (str, os.PathLike)) else source
+        for record in records:
+            columns.update(record)
+    features = features_for(columns)
+    columns = list(features)
+
+    # A private cache dir, so a regenerated file is never served from a stale cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        dataset = DatasetDict()
+        for name, source in splits.items():
+            if isinstance(source, (str, os.PathLike)):
+                dataset[name] = Dataset.from_generator(_rows, gen_kwargs={"path": str(source), "columns": columns},
+                                                       features=features, cache_dir=cache_dir)
+            else:
+                dataset[name] = Dataset.from_list([{column: record.get(column) for column in columns}
+                                                   for record in source], features=features)
+        dataset.save_to_disk(output_dir)
+    return {name: split.num_rows for name, split in dataset.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the morphology JSONL splits as an Arrow DatasetDict")
+    for name, path in DEFAULT_SPLITS.items():
+        parser.add_argument(f"--{name}", default=path, help=f"JSONL file for the {name} split")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = export_arrow({name: getattr(args, name) for name in DEFAULT_SPLITS}, args.output_dir)
+    print(f"Wrote {args.output_dir} in {time.perf_counter() - start:.2f}s: "
+          + ", ".join(f"{name} {count} rows" for name, count in counts.items()))
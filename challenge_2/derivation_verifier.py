@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+import unicodedata
+from collections import OrderedDict
+
+from rapidfuzz import fuzz, utils
+
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+import make_dataset_openai_jsonl as gen
+from output_parsing import extract_json_fields
+from sutra_index import get_sutra_index
+
+# Replays model answers against vidyut instead of a single stored derivation.
+#
+# The grader in openai_rl_job.py only compares the model's derivation with
+# prakriyas[0], the one history stored in the dataset, so a different but
+# valid derivation (or an optional form such as atardizyat/atardizyad) scores
+# zero. The verifier re-derives the cell the item asks for, i.e. its (dhātu,
+# gaṇa, prayoga, lakāra, puruṣa, vacana), through Vyakarana and accepts the
+# final form and the step history of any prakriyā in the result.
+#
+# Each step code of the model's derivation is also checked against the
+# sūtrapāṭha index (sutra_index.py): codes that name no sūtra, vārttika or
+# dhātu are reported, and steps are given partial credit position by position
+# for citing a valid sūtra from the same adhikāra as the matched history.
+#
+# Derived cells are kept in a bounded LRU in memory and, optionally, in a
+# SQLite file keyed by vidyut version and cell. Grading thousands of rollouts
+# for one cell therefore costs a single derivation.
+#
+#   python derivation_verifier.py rollouts.jsonl --items sanskrit_morphology_val.jsonl
+
+CELL_FIELDS = ("dhatu", "gana", "prayoga", "lakara", "purusha", "vacana")
+ANSWER_KEYS = ("conjugated_verb", "derivation_history")
+DEFAULT_CACHE_PATH = "prakriya_cache.sqlite"
+DEFAULT_MAXSIZE = 4096
+# Same step criterion as the grader: equal sūtra code, WRatio >= 95 on the text
+STEP_TEXT_THRESHOLD = 95
+
+
+def normalize_form(text):
+    return unicodedata.normalize("NFC", str(text)).strip()
+
+
+def cell_key(item):
+    """The Tinanta request an item describes, as IAST labels in CELL_FIELDS order"""
+    return tuple(normalize_form(item[field]) for field in CELL_FIELDS)
+
+
+def derivation_streak(model_steps, expected_steps):
+    """Fraction of expected_steps matched in order before the first mismatch, as in grade()"""
+    if not expected_steps or not model_steps:
+        return 0.0
+    streak = 0
+    for expected_step, model_step in zip(expected_steps, model_steps):
+        if not isinstance(model_step, dict):
+            # grade() fails on such a step and returns 0.0
+            return 0.0
+        if str(model_step.get("code", "")).strip() != str(expected_step.get("code", "")).strip():
+            break
+        similarity = fuzz.WRatio(str(model_step.get("text", "")).strip(),
+                                 str(expected_step.get("text", "")).strip(),
+                                 processor=utils.default_process)
+        if similarity < STEP_TEXT_THRESHOLD:
+            break
+        streak += 1
+    return streak / len(expected_steps)
+
+
+def step_code_credit(model_steps, expected_steps, sutras):
+    """Mean SutraIndex.score_step_code() of the model's step codes against expected_steps, position by position.
+
+    Unlike derivation_streak this goes on past the first mismatch, so a
+    derivation that cites a neighbouring rule of the right section still
+    gets some credit for each such step.
+    """
+    if not expected_steps or not model_steps:
+        return 0.0
+    total = 0.0
+    for expected_step, model_step in zip(expected_steps, model_steps):
+        if isinstance(model_step, dict):
+            total += sutras.score_step_code(model_step.get("code", ""), expected_step.get("code", ""))
+    return total / len(expected_steps)
+
+
+class PrakriyaCache:
+    """Bounded LRU of derived cells, optionally backed by a SQLite file"""
+
+    def __init__(self, path=None, maxsize=DEFAULT_MAXSIZE, namespace=""):
+        self.maxsize = maxsize
+        self.namespace = namespace
+        self.entries = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.path = path
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cells ("
+                              " cell TEXT PRIMARY KEY, prakriyas TEXT NOT NULL) WITHOUT ROWID")
+
+    def _db_key(self, key):
+        return self.namespace + "|" + "|".join(key)
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.memory_hits += 1
+            return value
+        if self.conn is not None:
+            row = self.conn.execute("SELECT prakriyas FROM cells WHERE cell = ?", (self._db_key(key),)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value)
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.conn is not None:
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO cells VALUES (?, ?)",
+                                  (self._db_key(key), json.dumps(value, ensure_ascii=False)))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class DerivationVerifier:
+    """Checks model answers against every prakriyā vidyut produces for a cell"""
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, maxsize=DEFAULT_MAXSIZE,
+                 data_path=gen.morphological_data_path):
+        from importlib.metadata import version
+
+        self.data_path = data_path
+        self.cache = PrakriyaCache(cache_path, maxsize, namespace=f"vidyut-{version('vidyut')}")
+        self.derivations = 0
+        self.derive_seconds = 0.0
+        self._dhatus = None
+        self._labels = None
+        self._sutras = None
+
+    def _dhatu_index(self):
+        """(IAST citation form, IAST gaṇa) -> dhātus, built on first use"""
+        if self._dhatus is None:
+            from vidyut.prakriya import Data
+
+            self._dhatus = {}
+            for entry in Data(self.data_path).load_dhatu_entries():
+                dhatu = entry.dhatu
+                key = (gen.get_human_readable_dhatu(dhatu), gen.translit(dhatu.gana))
+                self._dhatus.setdefault(key, []).append(dhatu)
+        return self._dhatus
+
+    def _label_index(self):
+        """IAST label -> enum value for prayoga, lakāra, puruṣa and vacana, as written by the generator"""
+        if self._labels is None:
+            from vidyut.prakriya import Lakara, Prayoga, Purusha, Vacana
+
+            self._labels = {
+                field: {gen.translit(str(value).replace("~", "")): value for value in enum.choices()}
+                for field, enum in (("prayoga", Prayoga), ("lakara", Lakara),
+                                    ("purusha", Purusha), ("vacana", Vacana))
+            }
+        return self._labels
+
+    def _sutra_index(self):
+        """The memory-mapped sūtra index, opened (and built if missing) on first use"""
+        if self._sutras is None:
+            self._sutras = get_sutra_index(self.data_path)
+        return self._sutras
+
+    def _derive(self, key):
+        from vidyut.prakriya import Pada
+
+        dhatu, gana, prayoga, lakara, purusha, vacana = key
+        labels = self._label_index()
+        dhatus = self._dhatu_index().get((dhatu, gana))
+        try:
+            args = {"prayoga": labels["prayoga"][prayoga], "lakara": labels["lakara"][lakara],
+                    "purusha": labels["purusha"][purusha], "vacana": labels["vacana"][vacana]}
+        except KeyError:
+            dhatus = None
+        if not dhatus:
+            return {"known": False, "forms": [], "histories": []}
+
+        forms = []
+        histories = []
+        start = time.perf_counter()
+        # Homonymous dhātus (same citation form and gaṇa) all count
+        for d in dhatus:
+            for prakriya in gen.get_vyakarana().derive(Pada.Tinanta(dhatu=d, **args)):
+                forms.append(gen.translit(prakriya.text))
+                histories.append(gen.extract_derivation_history(prakriya))
+        self.derive_seconds += time.perf_counter() - start
+        self.derivations += 1
+        return {"known": True, "forms": forms, "histories": histories}
+
+    def prakriyas(self, key):
+        """Final forms and step histories of every prakriyā for a cell, from the cache if possible"""
+        value = self.cache.get(key)
+        if value is None:
+            value = self._derive(key)
+            self.cache.put(key, value)
+        return value
+
+    def verify(self, item, conjugated_verb=None, derivation_history=None):
+        """Check a claimed form and derivation against the item's cell"""
+        cell = self.prakriyas(cell_key(item))
+        result = {
+            "known_cell": cell["known"],
+            "num_prakriyas": len(cell["histories"]),
+            "form_valid": conjugated_verb is not None and normalize_form(conjugated_verb) in cell["forms"],
+            "derivation_score": 0.0,
+            "matched_prakriya": None,
+            "code_credit": 0.0,
+            "invalid_codes": [],
+        }
+        if derivation_history:
+            for index, history in enumerate(cell["histories"]):
+                score = derivation_streak(derivation_history, history)
+                if score > result["derivation_score"]:
+                    result["derivation_score"] = score
+                    result["matched_prakriya"] = index
+            if isinstance(derivation_history, list):
+                sutras = self._sutra_index()
+                result["invalid_codes"] = [step.get("code") for step in derivation_history
+                                           if isinstance(step, dict) and not sutras.is_valid(step.get("code", ""))]
+                if cell["histories"]:
+                    matched = cell["histories"][result["matched_prakriya"] or 0]
+                    result["code_credit"] = step_code_credit(derivation_history, matched, sutras)
+        return result
+
+    def grade(self, sample, item):
+        """Like the grader's grade(), but against the best-matching prakriyā"""
+        try:
+            answer, _ = extract_json_fields(sample["output_text"].strip(), ANSWER_KEYS)
+            if answer is None:
+                return 0.0
+            return self.verify(item, answer.get("conjugated_verb"),
+                               answer.get("derivation_history"))["derivation_score"]
+        except Exception:
+            return 0.0
+
+    def report(self):
+        return {
+            "derivations": self.derivations,
+            "derive_seconds": round(self.derive_seconds, 4),
+            "memory_hits": self.cache.memory_hits,
+            "disk_hits": self.cache.disk_hits,
+            "misses": self.cache.misses,
+        }
+
+    def print_report(self):
+        r = self.report()
+        print(f"{r['derivations']} cells derived in {r['derive_seconds']:.2f}s; cache: "
+              f"{r['memory_hits']} memory hits, {r['disk_hits']} disk hits, {r['misses']} misses")
+
+    def close(self):
+        self.cache.close()
+
+
+if __name__ == "__main__":
+    from grading_cache import load_jsonl
+
+    parser = argparse.ArgumentParser(description="Verify model conjugations and derivations against vidyut")
+    parser.add_argument("rollouts", help="JSONL with output_text and item or item_index per line")
+    parser.add_argument("--items", default=None, help="Dataset JSONL that item_index refers to")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite file for derived cells ('' for none)")
+    parser.add_argument("--maxsize", type=int, default=DEFAULT_MAXSIZE, help="Cells kept in memory")
+    parser.add_argument("--results-output", default=None, help="Write per-rollout results as JSONL")
+    args = parser.parse_args()
+
+    rollouts = load_jsonl(args.rollouts)
+    items = []
+    if any("item" not in r for r in rollouts):
+        if not args.items:
+            parser.error("rollouts use item_index, so --items is required")
+        items = load_jsonl(args.items)
+
+    verifier = DerivationVerifier(args.cache or None, args.maxsize)
+    results = []
+    start = time.perf_counter()
+    for rollout in rollouts:
+        item = rollout["item"] if "item" in rollout else items[rollout["item_index"]]
+        answer, _ = extract_json_fields(rollout["output_text"].strip(), ANSWER_KEYS)
+        answer = answer or {}
+        result = verifier.verify(item, answer.get("conjugated_verb"), answer.get("derivation_history"))
+        # What the stored-history grader would give the same answer
+        result["stored_history_score"] = derivation_streak(answer.get("derivation_history"),
+                                                           item.get("derivation_history"))
+        result["form_is_stored_answer"] = (answer.get("conjugated_verb") is not None and
+                                           normalize_form(answer["conjugated_verb"]) ==
+                                           normalize_form(item.get("expected_answer", "")))
+        results.append(result)
+    elapsed = time.perf_counter() - start
+
+    total = max(len(results), 1)
+    valid = sum(r["form_valid"] for r in results)
+    alternative = sum(r["form_valid"] and not r["form_is_stored_answer"] for r in results)
+    rescued = sum(r["derivation_score"] > r["stored_history_score"] for r in results)
+    print(f"Verified {len(results)} rollouts in {elapsed:.2f}s")
+    print(f"  valid forms: {valid} ({100 * valid / total:.1f}%), of which {alternative} differ from the stored answer")
+    print(f"  mean derivation score: {sum(r['derivation_score'] for r in results) / total:.4f} "
+          f"(stored history only: {sum(r['stored_history_score'] for r in results) / total:.4f}); "
+          f"{rescued} rollouts score higher against another prakriyā")
+    with_invalid = sum(bool(r["invalid_codes"]) for r in results)
+    print(f"  mean step code credit: {sum(r['code_credit'] for r in results) / total:.4f}; "
+          f"{with_invalid} rollouts cite codes that name no sūtra, vārttika or dhātu")
+    verifier.print_report()
+    verifier.close()
+
+    if args.results_output:
+        with open(args.results_output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
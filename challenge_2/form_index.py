@@ -0,0 +1,278 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import Counter
+
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from make_dataset_openai_jsonl import normalize_answer
+
+# Reverse index from inflected surface forms to every cell that produces them.
+#
+# Built in one pass over the generator's JSONL output (the sanskrit_morphology
+# files, or the paradigm_enumeration.py shards), it maps each normalized form
+# in an entry's accepted_answers to the entry's analysis: its dhātu, gaṇa,
+# prayoga, lakāra, puruṣa and vacana (or prātipadika, liṅga, vibhakti and
+# vacana for subantas). The index is a single file that is memory-mapped
+# rather than loaded:
+#
+#   header      magic, section counts and offsets
+#   forms       sorted UTF-8 forms, with a uint32 offset table
+#   postings    uint32 analysis ids per form, with a uint32 offset table
+#   analyses    compact JSON objects, with a uint32 offset table
+#
+# A lookup is a binary search over the form offsets, so opening the index is
+# instant and a query touches only a few pages, however many forms it holds.
+# That is enough to classify wrong answers at scale, e.g. "right lakāra, wrong
+# puruṣa":
+#
+#   python form_index.py build sanskrit_morphology_complete.jsonl -o forms.idx
+#   python form_index.py lookup bhavati bhavanti --index forms.idx
+#   python form_index.py classify rollouts.jsonl --items sanskrit_morphology_val.jsonl --index forms.idx
+
+MAGIC = b"FORMIDX1"
+# magic, byte order, n_forms, n_analyses, three section offsets, two reserved
+HEADER = struct.Struct("<8sBxxxIIQQQQQ")
+DEFAULT_INDEX_PATH = "forms.idx"
+
+ANALYSIS_FIELDS = ("pada_type", "dhatu", "gana", "sanadi", "prayoga", "lakara", "purusha", "vacana",
+                   "pratipadika", "linga", "vibhakti")
+# Fields that identify the lexeme rather than the cell of its paradigm
+LEMMA_FIELDS = ("dhatu", "gana", "sanadi", "pratipadika")
+
+
+def with_pada_type(analysis):
+    """The analysis with its pada_type, which generator entries leave out and enumeration entries have"""
+    if analysis.get("pada_type"):
+        return analysis
+    return dict(analysis, pada_type="subanta" if analysis.get("pratipadika") else "tinanta")
+
+
+def entry_analysis(entry):
+    """The cell an entry describes, with only the fields it has"""
+    return with_pada_type({field: entry[field] for field in ANALYSIS_FIELDS if entry.get(field)})
+
+
+def entry_forms(entry):
+    return entry.get("accepted_answers") or [normalize_answer(entry["expected_answer"])]
+
+
+def iter_entries(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % 4))
+
+
+def _write_table(f, blobs):
+    """Write a uint32 offset table followed by the concatenated blobs; return the section offset"""
+    _pad(f)
+    start = f.tell()
+    offsets = array("I", [0])
+    total = 0
+    for blob in blobs:
+        total += len(blob)
+        offsets.append(total)
+    if total >= 1 << 32:
+        raise ValueError("index section larger than 4 GiB")
+    offsets.tofile(f)
+    for blob in blobs:
+        f.write(blob)
+    return start
+
+
+def build_index(paths, output=DEFAULT_INDEX_PATH):
+    """Build the index file from generator JSONL files and return its statistics"""
+    analysis_ids = {}
+    postings = {}
+    entries = 0
+    for entry in iter_entries(paths):
+        analysis = json.dumps(entry_analysis(entry), ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        analysis_id = analysis_ids.setdefault(analysis, len(analysis_ids))
+        for form in entry_forms(entry):
+            ids = postings.setdefault(normalize_answer(form).encode("utf-8"), [])
+            if analysis_id not in ids:
+                ids.append(analysis_id)
+        entries += 1
+
+    forms = sorted(postings)
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        forms_offset = _write_table(f, forms)
+        postings_offset = _write_table(f, [array("I", postings[form]).tobytes() for form in forms])
+        analyses_offset = _write_table(f, [a.encode("utf-8") for a in analysis_ids])
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, sys.byteorder == "little", len(forms), len(analysis_ids),
+                            forms_offset, postings_offset, analyses_offset, 0, 0))
+    os.replace(tmp_path, output)
+    return {"entries": entries, "forms": len(forms), "analyses": len(analysis_ids),
+            "bytes": os.path.getsize(output)}
+
+
+class FormIndex:
+    """Read-only, memory-mapped form -> analyses index written by build_index()"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, little, self.n_forms, self.n_analyses, forms_offset, postings_offset, analyses_offset, _, _ = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a form index")
+        if little != (sys.byteorder == "little"):
+            raise ValueError(f"{path} was built on a machine with the other byte order")
+        view = memoryview(self._mm)
+        self._form_offsets, self._forms_start = self._table(view, forms_offset, self.n_forms)
+        self._posting_offsets, self._postings_start = self._table(view, postings_offset, self.n_forms)
+        self._analysis_offsets, self._analyses_start = self._table(view, analyses_offset, self.n_analyses)
+        self._postings = view
+        self._analysis_cache = {}
+
+    @staticmethod
+    def _table(view, offset, count):
+        end = offset + 4 * (count + 1)
+        return view[offset:end].cast("I"), end
+
+    def _form(self, i):
+        return self._mm[self._forms_start + self._form_offsets[i]:self._forms_start + self._form_offsets[i + 1]]
+
+    def _find(self, key):
+        lo, hi = 0, self.n_forms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._form(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_forms and self._form(lo) == key:
+            return lo
+        return -1
+
+    def analysis(self, analysis_id):
+        analysis = self._analysis_cache.get(analysis_id)
+        if analysis is None:
+            start = self._analyses_start + self._analysis_offsets[analysis_id]
+            end = self._analyses_start + self._analysis_offsets[analysis_id + 1]
+            analysis = self._analysis_cache[analysis_id] = json.loads(self._mm[start:end])
+        return analysis
+
+    def analysis_ids(self, form):
+        i = self._find(normalize_answer(form).encode("utf-8"))
+        if i < 0:
+            return []
+        start = self._postings_start + self._posting_offsets[i]
+        end = self._postings_start + self._posting_offsets[i + 1]
+        return self._postings[start:end].cast("I").tolist()
+
+    def lookup(self, form):
+        """Every analysis (cell) that produces form, [] if none does"""
+        return [self.analysis(i) for i in self.analysis_ids(form)]
+
+    def __contains__(self, form):
+        return self._find(normalize_answer(form).encode("utf-8")) >= 0
+
+    def __len__(self):
+        return self.n_forms
+
+    def classify(self, item, form):
+        """What an answer is relative to the item's cell.
+
+        "correct" when form belongs to the cell itself, "unknown_form" when no
+        cell produces it, "other_lemma" when only other dhātus/prātipadikas do,
+        and otherwise "wrong_" plus the cell fields it gets wrong, e.g.
+        "wrong_purusha" or "wrong_lakara+vacana", taking the closest analysis.
+        """
+        analyses = self.lookup(form)
+        if not analyses:
+            return "unknown_form"
+        expected = entry_analysis(item)
+        best = None
+        # Indexes built before analyses carried a pada_type still compare equal
+        for analysis in map(with_pada_type, analyses):
+            if any(analysis.get(field) != expected.get(field) for field in LEMMA_FIELDS):
+                continue
+            wrong = [field for field in ANALYSIS_FIELDS
+                     if field not in LEMMA_FIELDS and analysis.get(field) != expected.get(field)]
+            if best is None or len(wrong) < len(best):
+                best = wrong
+        if best is None:
+            return "other_lemma"
+        return "wrong_" + "+".join(best) if best else "correct"
+
+    def close(self):
+        for view in (self._form_offsets, self._posting_offsets, self._analysis_offsets, self._postings):
+            view.release()
+        self._mm.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the inflected-form reverse index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Index generator JSONL output")
+    build.add_argument("files", nargs="+")
+    build.add_argument("-o", "--output", default=DEFAULT_INDEX_PATH)
+
+    lookup = subparsers.add_parser("lookup", help="Print the analyses of some forms")
+    lookup.add_argument("forms", nargs="+")
+    lookup.add_argument("--index", default=DEFAULT_INDEX_PATH)
+
+    classify = subparsers.add_parser("classify", help="Break down the answers in a rollout file by error type")
+    classify.add_argument("rollouts", help="JSONL with output_text and item or item_index per line")
+    classify.add_argument("--items", default=None, help="Dataset JSONL that item_index refers to")
+    classify.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        stats = build_index(args.files, args.output)
+        print(f"Indexed {stats['forms']:,} forms ({stats['analyses']:,} analyses, {stats['entries']:,} entries) "
+              f"into {args.output}: {stats['bytes']:,} bytes in {time.perf_counter() - start:.2f}s")
+    elif args.command == "lookup":
+        index = FormIndex(args.index)
+        for form in args.forms:
+            print(f"{form}:")
+            for analysis in index.lookup(form):
+                print(f"  {json.dumps(analysis, ensure_ascii=False)}")
+            if form not in index:
+                print("  (no analyses)")
+        index.close()
+    else:
+        from grading_cache import load_jsonl
+        from output_parsing import extract_json_fields
+
+        rollouts = load_jsonl(args.rollouts)
+        items = []
+        if any("item" not in r for r in rollouts):
+            if not args.items:
+                parser.error("rollouts use item_index, so --items is required")
+            items = load_jsonl(args.items)
+
+        index = FormIndex(args.index)
+        categories = Counter()
+        start = time.perf_counter()
+        for rollout in rollouts:
+            item = rollout["item"] if "item" in rollout else items[rollout["item_index"]]
+            answer, _ = extract_json_fields(rollout["output_text"].strip(), ("conjugated_verb", "declined_form"))
+            form = (answer or {}).get("conjugated_verb") or (answer or {}).get("declined_form")
+            categories[index.classify(item, form) if form else "no_answer"] += 1
+        elapsed = time.perf_counter() - start
+        index.close()
+
+        total = max(sum(categories.values()), 1)
+        print(f"Classified {sum(categories.values())} answers in {elapsed:.2f}s")
+        for category, count in categories.most_common():
+            print(f"  {category:<30} {count:>8}  {100 * count / total:5.1f}%")
@@ -1,25 +1,306 @@
-from vidyut.prakriya import *
-from vidyut.lipi import  *
 import os
 import json
-import re
-import pandas as pd
-from datetime import datetime
+import sys
+import unicodedata
+
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from instrumentation import metrics, profiled
+from sharding import (check_shard_args, load_manifests, merge_shards, owns, write_output_manifest,
+                      write_shard)
+
+# vidyut is imported inside the functions that need it, and the Vyakarana is
+# built on first use, so helpers like split_dataset() and write_jsonl_file()
+# can be imported without paying for either.
 
 # You have download Vidyut data beforehand
 # I include a copy of it in the repo for simplicity 
 # (but this is not good practice)
 morphological_data_path = "vidyut-0.4.0/prakriya/"
 
-v = Vyakarana(log_steps=True)
+_vyakarana = None
+
+def get_vyakarana():
+    """The shared Vyakarana, created on first use"""
+    global _vyakarana
+    if _vyakarana is None:
+        from vidyut.prakriya import Vyakarana
+        _vyakarana = Vyakarana(log_steps=True)
+    return _vyakarana
+
+# System message for the developer role
+system_message = """You are an expert in Sanskrit grammar. You will conjugate Sanskrit verb roots according to Paninian rules. I will give you a Sanskrit dhātu (verb root) along with morphological markers also given in terms of their Sanskrit names. You must conjugate the verb correctly.
+Output the conjugated verb form in JSON format: { "conjugated_verb": "your_answer_here" }
+Note: Use IAST transliteration (ā, ī, ū, ṛ, ṝ, ḷ, ṃ, ḥ, ñ, ṅ, ṭ, ḍ, ṇ, ś, ṣ). Be careful to not confuse "h" and "ḥ"! They aren't interchangeable.
+Please don't include back ticks (```) in your response or any other form of Markdown formatting. Just give me raw JSON output which I will then parse using Python. Thanks. Now here's the input. Read it, then output your answer as JSON following the specifications above:"""
+
+def translit(x):
+    from vidyut.lipi import Scheme, transliterate
+    with metrics.stage("transliterate"):
+        return transliterate(str(x), Scheme.Slp1, Scheme.Iast)
+
+# Deriving the citation form of a dhatu is a full prakriya, so cache it
+_human_readable_dhatus = {}
 
 def get_human_readable_dhatu(dhatu):
-    human_readable_dhatu = v.derive(dhatu)
-    assert human_readable_dhatu
-    human_readable_dhatu = human_readable_dhatu[0].text
-    return transliterate(human_readable_dhatu, Scheme.Slp1, Scheme.Iast)
+    key = repr(dhatu)
+    if key not in _human_readable_dhatus:
+        from vidyut.lipi import Scheme, transliterate
+        with metrics.stage("derive"):
+            human_readable_dhatu = get_vyakarana().derive(dhatu)
+        assert human_readable_dhatu
+        human_readable_dhatu = human_readable_dhatu[0].text
+        _human_readable_dhatus[key] = transliterate(human_readable_dhatu, Scheme.Slp1, Scheme.Iast)
+    return _human_readable_dhatus[key]
+
+def dhatu_id(dhatu):
+    """The dhātu part of an entry id: upadeśa (with any +sanādi) and gaṇa (with any :antargaṇa), in IAST.
+
+    The citation form isn't enough: about a hundred distinct Dhātupāṭha roots
+    share one with another root of the same gaṇa (kadi~ and kadi~\\, ...).
+    """
+    upadesha = "+".join([translit(dhatu.aupadeshika)] + [translit(s) for s in dhatu.sanadi])
+    gana = translit(dhatu.gana)
+    if dhatu.antargana is not None:
+        gana += ":" + translit(dhatu.antargana)
+    return f"{upadesha}|{gana}"
+
+def extract_derivation_history(prakriya):
+    """Convert a prakriya's steps into the {code, text} list used in the dataset"""
+    from vidyut.lipi import Scheme, transliterate
+    derivation_history = []
+    with metrics.stage("history_extraction"):
+        for step in prakriya.history:
+            #new_result = [v.derive(elem) for elem in step.result]
+            new_result = [elem for elem in step.result]
+            derivation_history.append({
+                "code": step.code,
+                "text": transliterate(' + '.join(new_result), Scheme.Slp1, Scheme.Iast)
+            })
+    return derivation_history
+
+def normalize_answer(text):
+    """Form used for answer-set grading: NFC, lowercase, no whitespace"""
+    return "".join(unicodedata.normalize("NFC", str(text)).lower().split())
+
+def variant_fields(prakriyas, derivation_history):
+    """accepted_answers and alternative_derivations for all of a cell's prakriyas.
+
+    vidyut returns several prakriyas for many cells (optional rules, padas).
+    accepted_answers holds every distinct final form, normalized. Each other
+    distinct history is stored only from where it leaves derivation_history
+    (prakriyas[0]): {"answer", "prefix": shared step count, "steps": the rest}.
+    """
+    accepted_answers = []
+    alternative_derivations = []
+    seen = {json.dumps(derivation_history, ensure_ascii=False)}
+    for i, prakriya in enumerate(prakriyas):
+        answer = translit(prakriya.text)
+        if normalize_answer(answer) not in accepted_answers:
+            accepted_answers.append(normalize_answer(answer))
+        if i == 0:
+            continue
+        history = extract_derivation_history(prakriya)
+        key = json.dumps(history, ensure_ascii=False)
+        if key in seen:
+            continue
+        seen.add(key)
+        prefix = 0
+        for ours, theirs in zip(history, derivation_history):
+            if ours != theirs:
+                break
+            prefix += 1
+        alternative_derivations.append({"answer": answer, "prefix": prefix, "steps": history[prefix:]})
+    return {"accepted_answers": accepted_answers, "alternative_derivations": alternative_derivations}
+
+def all_derivations(entry):
+    """Every full derivation history of an entry, the stored one first"""
+    stored = entry["derivation_history"]
+    return [stored] + [stored[:alt["prefix"]] + alt["steps"] for alt in entry.get("alternative_derivations", [])]
+
+def build_tinanta_entry(dhatu, prayoga, lakara, purusha, vacana):
+    """Derive one paradigm cell and build its JSONL entry, or None if vidyut has no form"""
+    from vidyut.prakriya import Pada
+    with metrics.stage("derive"):
+        prakriyas = get_vyakarana().derive(Pada.Tinanta(
+            dhatu=dhatu,
+            prayoga=prayoga,
+            lakara=lakara,
+            purusha=purusha,
+            vacana=vacana,
+        ))
+    metrics.count("cells")
+
+    if not prakriyas:
+        metrics.count("empty_cells")
+        return None
+
+    ground_truth = prakriyas[0]
+    derivation_history = extract_derivation_history(ground_truth)
+    hrd = get_human_readable_dhatu(dhatu)
+
+    # Create the user input content
+    #lakara_clean = str(v.derive(lakara))
+    lakara_clean = str(lakara).replace('~','')
+    #print("____",lakara,v.derive(lakara))
+    user_input = f'''{{
+    "dhātu": "{hrd}",
+    "gaṇa": "{translit(dhatu.gana)}",
+    "prayoga": "{translit(prayoga)}",
+    "lakara": "{translit(lakara_clean)}",
+    "purusha": "{translit(purusha)}",
+    "vacana": "{translit(vacana)}"
+}}'''
+
+    # Create the JSONL entry
+    return {
+        "id": f"{dhatu_id(dhatu)}|{translit(prayoga)}|{translit(lakara_clean)}|{translit(purusha)}|{translit(vacana)}",
+        "messages": [
+            {
+                "role": "developer",
+                "content": system_message
+            },
+            {
+                "role": "user",
+                "content": user_input
+            }
+        ],
+        "dhatu": hrd,
+        "gana": translit(dhatu.gana),
+        "prayoga": translit(prayoga),
+        "lakara": translit(lakara_clean),
+        "purusha": translit(purusha),
+        "vacana": translit(vacana),
+        "expected_answer": translit(ground_truth.text),
+        "derivation_history": derivation_history,
+        **variant_fields(prakriyas, derivation_history)
+    }
+
+# System message for paradigm-table prompts: one request per (dhātu, lakāra)
+# asks for all nine puruṣa x vacana forms, so the shared instructions, root
+# and gaṇa are sent once instead of nine times
+table_system_message = """You are an expert in Sanskrit grammar. You will conjugate Sanskrit verb roots according to Paninian rules. I will give you a Sanskrit dhātu (verb root) along with its gaṇa, prayoga and lakāra, given in terms of their Sanskrit names. You must give the full paradigm of the dhātu in that lakāra: all three puruṣas (prathama, madhyama, uttama) in all three vacanas (eka, dvi, bahu).
+Output the conjugated forms in JSON format: { "table": { "prathama": { "eka": "...", "dvi": "...", "bahu": "..." }, "madhyama": { "eka": "...", "dvi": "...", "bahu": "..." }, "uttama": { "eka": "...", "dvi": "...", "bahu": "..." } } }
+Note: Use IAST transliteration (ā, ī, ū, ṛ, ṝ, ḷ, ṃ, ḥ, ñ, ṅ, ṭ, ḍ, ṇ, ś, ṣ). Be careful to not confuse "h" and "ḥ"! They aren't interchangeable.
+Please don't include back ticks (```) in your response or any other form of Markdown formatting. Just give me raw JSON output which I will then parse using Python. Thanks. Now here's the input. Read it, then output your answer as JSON following the specifications above:"""
+
+def build_tinanta_table_entry(dhatu, prayoga, lakara):
+    """Derive the nine puruṣa x vacana cells of one lakāra and build a single table entry.
+
+    cells holds each derived cell's puruṣa, vacana, expected answer and
+    accepted answers, in table order; cells vidyut has no form for are left
+    out. Returns None if none of them has a form.
+    """
+    from vidyut.prakriya import Purusha, Vacana
+    cells = []
+    for purusha in Purusha.choices():
+        for vacana in Vacana.choices():
+            entry = build_tinanta_entry(dhatu, prayoga, lakara, purusha, vacana)
+            if entry:
+                cells.append({key: entry[key] for key in ("purusha", "vacana", "expected_answer", "accepted_answers")})
+    if not cells:
+        return None
+
+    hrd = get_human_readable_dhatu(dhatu)
+    lakara_clean = str(lakara).replace('~','')
+    user_input = f'''{{
+    "dhātu": "{hrd}",
+    "gaṇa": "{translit(dhatu.gana)}",
+    "prayoga": "{translit(prayoga)}",
+    "lakara": "{translit(lakara_clean)}"
+}}'''
+
+    return {
+        "id": f"{dhatu_id(dhatu)}|{translit(prayoga)}|{translit(lakara_clean)}",
+        "messages": [
+            {
+                "role": "developer",
+                "content": table_system_message
+            },
+            {
+                "role": "user",
+                "content": user_input
+            }
+        ],
+        "dhatu": hrd,
+        "gana": translit(dhatu.gana),
+        "prayoga": translit(prayoga),
+        "lakara": translit(lakara_clean),
+        "cells": cells
+    }
+
+# System message for nominal (subanta) declension
+subanta_system_message = """You are an expert in Sanskrit grammar. You will decline Sanskrit nominal stems according to Paninian rules. I will give you a Sanskrit prātipadika (nominal stem) along with its liṅga (gender), vibhakti (case) and vacana (number), given in terms of their Sanskrit names. You must decline the stem correctly.
+Output the declined form in JSON format: { "declined_form": "your_answer_here" }
+Note: Use IAST transliteration (ā, ī, ū, ṛ, ṝ, ḷ, ṃ, ḥ, ñ, ṅ, ṭ, ḍ, ṇ, ś, ṣ). Be careful to not confuse "h" and "ḥ"! They aren't interchangeable.
+Please don't include back ticks (```) in your response or any other form of Markdown formatting. Just give me raw JSON output which I will then parse using Python. Thanks. Now here's the input. Read it, then output your answer as JSON following the specifications above:"""
+
+# Common prātipadikas (SLP1) covering the main declension classes, with the
+# liṅgas each one is declined in. Adjectival stems are declined in all three.
+default_pratipadikas = [
+    ("deva", ["Pum"]), ("rAma", ["Pum"]), ("Pala", ["Napumsaka"]), ("vana", ["Napumsaka"]),
+    ("latA", ["Stri"]), ("senA", ["Stri"]), ("kavi", ["Pum"]), ("hari", ["Pum"]),
+    ("mati", ["Stri"]), ("vAri", ["Napumsaka"]), ("guru", ["Pum"]), ("Denu", ["Stri"]),
+    ("maDu", ["Napumsaka"]), ("nadI", ["Stri"]), ("vaDU", ["Stri"]), ("pitf", ["Pum"]),
+    ("mAtf", ["Stri"]), ("kartf", ["Pum"]), ("rAjan", ["Pum"]), ("Atman", ["Pum"]),
+    ("nAman", ["Napumsaka"]), ("manas", ["Napumsaka"]), ("vAc", ["Stri"]), ("marut", ["Pum"]),
+    ("jagat", ["Napumsaka"]), ("sarva", ["Pum", "Stri", "Napumsaka"]),
+    ("mahat", ["Pum", "Stri", "Napumsaka"]), ("SuBa", ["Pum", "Stri", "Napumsaka"]),
+]
+
+def build_subanta_entry(pratipadika_text, linga, vibhakti, vacana):
+    """Derive one nominal paradigm cell and build its JSONL entry, or None if vidyut has no form"""
+    from vidyut.prakriya import Pada, Pratipadika
+    with metrics.stage("derive"):
+        prakriyas = get_vyakarana().derive(Pada.Subanta(
+            pratipadika=Pratipadika.basic(pratipadika_text),
+            linga=linga,
+            vibhakti=vibhakti,
+            vacana=vacana,
+        ))
+    metrics.count("cells")
+
+    if not prakriyas:
+        metrics.count("empty_cells")
+        return None
+
+    ground_truth = prakriyas[0]
+    derivation_history = extract_derivation_history(ground_truth)
+    stem = translit(pratipadika_text)
+
+    user_input = f'''{{
+    "prātipadika": "{stem}",
+    "liṅga": "{translit(linga)}",
+    "vibhakti": "{translit(vibhakti)}",
+    "vacana": "{translit(vacana)}"
+}}'''
+
+    return {
+        "id": f"{stem}|{translit(linga)}|{translit(vibhakti)}|{translit(vacana)}",
+        "messages": [
+            {
+                "role": "developer",
+                "content": subanta_system_message
+            },
+            {
+                "role": "user",
+                "content": user_input
+            }
+        ],
+        "pratipadika": stem,
+        "linga": translit(linga),
+        "vibhakti": translit(vibhakti),
+        "vacana": translit(vacana),
+        "expected_answer": translit(ground_truth.text),
+        "derivation_history": derivation_history,
+        **variant_fields(prakriyas, derivation_history)
+    }
+
+def load_desired_dhatus():
+    """The dhātus the dataset covers, in Dhātupāṭha order"""
+    from vidyut.prakriya import Data
 
-def generate_jsonl_dataset():
     data = Data(morphological_data_path)
     dhatu_list = [e.dhatu for e in data.load_dhatu_entries()]
 
@@ -44,15 +325,30 @@ def generate_jsonl_dataset():
             dhatus.append(i)
 
     print("Obtained dhatu list successfully")
+    return dhatus
 
-    # System message for the developer role
-    system_message = """You are an expert in Sanskrit grammar. You will conjugate Sanskrit verb roots according to Paninian rules. I will give you a Sanskrit dhātu (verb root) along with morphological markers also given in terms of their Sanskrit names. You must conjugate the verb correctly.
-Output the conjugated verb form in JSON format: { "conjugated_verb": "your_answer_here" }
-Note: Use IAST transliteration (ā, ī, ū, ṛ, ṝ, ḷ, ṃ, ḥ, ñ, ṅ, ṭ, ḍ, ṇ, ś, ṣ). Be careful to not confuse "h" and "ḥ"! They aren't interchangeable.
-Please don't include back ticks (```) in your response or any other form of Markdown formatting. Just give me raw JSON output which I will then parse using Python. Thanks. Now here's the input. Read it, then output your answer as JSON following the specifications above:"""
+def dataset_lakaras():
+    from vidyut.prakriya import Lakara
+    return [Lakara.Lat, Lakara.Lit, Lakara.VidhiLin, Lakara.Lot, Lakara.Lan]
+
+def iter_dataset_entries(shard_index=0, num_shards=1):
+    """(cell position, entry) for every cell the shard owns, in generation order.
+
+    Cells are numbered in the order of the dhātu/lakāra/puruṣa/vacana loops,
+    and shard i of n derives the cells whose position is i mod n, so n
+    shards together produce exactly the entries of a single run.
+    """
+    from vidyut.prakriya import Prayoga, Purusha, Vacana
+
+    check_shard_args(shard_index, num_shards)
+    dhatus = load_desired_dhatus()
 
-    jsonl_lines = []
     prayoga = Prayoga.Kartari
+    lakaras = dataset_lakaras()
+    total_cells = len(dhatus) * len(lakaras) * len(Purusha.choices()) * len(Vacana.choices())
+    shard_cells = len(range(shard_index, total_cells, num_shards))
+    cell = 0
+    done_cells = 0
     
     for dhatu in dhatus:
         '''
@@ -63,76 +359,64 @@ Please don't include back ticks (```) in your response or any other form of Mark
         Lit = reduplicating past tense (this one might be hard for model)
         Lin = optative
         '''
-        for lakara in [Lakara.Lat, Lakara.Lit, Lakara.VidhiLin, Lakara.Lot, Lakara.Lan]:
+        for lakara in lakaras:
             for purusha in Purusha.choices():
                 for vacana in Vacana.choices():
-                    prakriyas = v.derive(Pada.Tinanta(
-                        dhatu=dhatu,
-                        prayoga=prayoga,
-                        lakara=lakara,
-                        purusha=purusha,
-                        vacana=vacana,
-                    ))
-
-                    if prakriyas:  # Make sure we have results
-                        ground_truth = prakriyas[0]
-                        translit = lambda x: transliterate(str(x), Scheme.Slp1, Scheme.Iast)
-
-                        # Create the user input content
-                        #lakara_clean = str(v.derive(lakara))
-                        lakara_clean = str(lakara).replace('~','')
-                        #print("____",lakara,v.derive(lakara))
-                        user_input = f'''{{
-    "dhātu": "{get_human_readable_dhatu(dhatu)}",
-    "gaṇa": "{translit(dhatu.gana)}",
-    "prayoga": "{translit(prayoga)}",
-    "lakara": "{translit(lakara_clean)}",
-    "purusha": "{translit(purusha)}",
-    "vacana": "{translit(vacana)}"
-}}'''
+                    position = cell
+                    cell += 1
+                    if not owns(position, shard_index, num_shards):
+                        continue
+                    jsonl_entry = build_tinanta_entry(dhatu, prayoga, lakara, purusha, vacana)
+
+                    if jsonl_entry:  # Make sure we have results
+                        metrics.count("entries")
+                        yield position, jsonl_entry
+
+                    # Rate-limited progress instead of a print per entry
+                    done_cells += 1
+                    metrics.progress(done_cells, shard_cells, unit="cells")
+
+    metrics.progress(done_cells, shard_cells, unit="cells", force=True)
+
+def iter_table_entries(shard_index=0, num_shards=1):
+    """(table position, entry) for every (dhātu, lakāra) table the shard owns, in generation order"""
+    from vidyut.prakriya import Prayoga
+
+    check_shard_args(shard_index, num_shards)
+    dhatus = load_desired_dhatus()
+    lakaras = dataset_lakaras()
+    total_tables = len(dhatus) * len(lakaras)
+    shard_tables = len(range(shard_index, total_tables, num_shards))
+    done_tables = 0
+
+    for position, (dhatu, lakara) in enumerate((d, l) for d in dhatus for l in lakaras):
+        if not owns(position, shard_index, num_shards):
+            continue
+        entry = build_tinanta_table_entry(dhatu, Prayoga.Kartari, lakara)
+        if entry:
+            metrics.count("entries")
+            yield position, entry
+        done_tables += 1
+        metrics.progress(done_tables, shard_tables, unit="tables")
+
+    metrics.progress(done_tables, shard_tables, unit="tables", force=True)
+
+def generate_jsonl_dataset(tables=False):
+    entries = iter_table_entries() if tables else iter_dataset_entries()
+    return [entry for _, entry in entries]
 
-                        # Extract derivation history
-                        derivation_history = []
-                        for i, step in enumerate(ground_truth.history):
-                            #new_result = [v.derive(elem) for elem in step.result]
-                            new_result = [elem for elem in step.result]
-                            derivation_history.append({
-                                "code": step.code,
-                                "text": transliterate(' + '.join(new_result), Scheme.Slp1, Scheme.Iast)
-                            })
-
-                        # Create the JSONL entry
-                        jsonl_entry = {
-                            "messages": [
-                                {
-                                    "role": "developer",
-                                    "content": system_message
-                                },
-                                {
-                                    "role": "user",
-                                    "content": user_input
-                                }
-                            ],
-                            "dhatu": get_human_readable_dhatu(dhatu),
-                            "gana": translit(dhatu.gana),
-                            "prayoga": translit(prayoga),
-                            "lakara": translit(lakara_clean),
-                            "purusha": translit(purusha),
-                            "vacana": translit(vacana),
-                            "expected_answer": translit(ground_truth.text),
-                            "derivation_history": derivation_history
-                        }
-                        
-                        jsonl_lines.append(jsonl_entry)
-                        
-                        # Optional: print progress
-                        print(f"Generated entry for {get_human_readable_dhatu(dhatu)} - {translit(lakara_clean)} - {translit(purusha)} - {translit(vacana)}")
-
-    return jsonl_lines
+def run_spec(tables=False):
+    """What determines the generated entries, recorded in shard manifests"""
+    from importlib.metadata import version
+    spec = {"generator": "challenge_2/make_dataset_openai_jsonl.py", "vidyut": version("vidyut"),
+            "data_path": morphological_data_path}
+    if tables:
+        spec["mode"] = "tables"
+    return spec
 
 def write_jsonl_file(data, filename):
     """Write data to JSONL file (one JSON object per line)"""
-    with open(filename, 'w', encoding='utf-8') as f:
+    with metrics.stage("serialization"), open(filename, 'w', encoding='utf-8') as f:
         for entry in data:
             f.write(json.dumps(entry, ensure_ascii=False) + '\n')
 
@@ -154,15 +438,36 @@ def split_dataset(data, train_ratio=0.8, val_ratio=0.1, test_ratio=0.1):
     
     return train_data, val_data, test_data
 
-if __name__ == "__main__":
+SHARD_PREFIX = "sanskrit_morphology"
+TABLE_PREFIX = "sanskrit_morphology_tables"
+
+def main(arrow_output=None, shard_index=None, num_shards=None, shard_dir="shards", merge=False, tables=False):
     # Check if morphological_data_path exists
     if not os.path.exists(morphological_data_path):
         print(f"Path {morphological_data_path} does not exist. Please download the vidyut data first.")
         exit(1)
 
-    # Generate dataset
-    print("Generating JSONL dataset...")
-    dataset = generate_jsonl_dataset()
+    # Table mode writes its own shards and files, sanskrit_morphology_tables_*.jsonl
+    prefix = TABLE_PREFIX if tables else SHARD_PREFIX
+    metrics.name = "challenge_2"
+    metrics.reset()
+    if num_shards is not None:
+        # Derive only this shard's cells; --merge combines the shards later
+        print(f"Generating shard {shard_index} of {num_shards}...")
+        entries = iter_table_entries if tables else iter_dataset_entries
+        manifest = write_shard(shard_dir, prefix, shard_index, num_shards,
+                               entries(shard_index, num_shards), run_spec(tables))
+        print(f"  {manifest['records']} entries -> {os.path.join(shard_dir, manifest['file'])} "
+              f"(sha256 {manifest['sha256'][:16]}...)")
+        return
+
+    if merge:
+        print(f"Merging shards from {shard_dir}...")
+        dataset = list(merge_shards(shard_dir, prefix, run_spec(tables)))
+    else:
+        # Generate dataset
+        print("Generating JSONL dataset...")
+        dataset = generate_jsonl_dataset(tables)
     
     print(f"Generated {len(dataset)} training examples")
     
@@ -170,20 +475,66 @@ if __name__ == "__main__":
     train_data, val_data, test_data = split_dataset(dataset)
     
     # Write to separate files
-    write_jsonl_file(train_data, "sanskrit_morphology_train.jsonl")
-    write_jsonl_file(val_data, "sanskrit_morphology_val.jsonl")
-    write_jsonl_file(test_data, "sanskrit_morphology_test.jsonl")
+    write_jsonl_file(train_data, f"{prefix}_train.jsonl")
+    write_jsonl_file(val_data, f"{prefix}_val.jsonl")
+    write_jsonl_file(test_data, f"{prefix}_test.jsonl")
     
     print(f"Dataset split and saved:")
-    print(f"  Training set: {len(train_data)} examples -> sanskrit_morphology_train.jsonl")
-    print(f"  Validation set: {len(val_data)} examples -> sanskrit_morphology_val.jsonl")
-    print(f"  Test set: {len(test_data)} examples -> sanskrit_morphology_test.jsonl")
+    print(f"  Training set: {len(train_data)} examples -> {prefix}_train.jsonl")
+    print(f"  Validation set: {len(val_data)} examples -> {prefix}_val.jsonl")
+    print(f"  Test set: {len(test_data)} examples -> {prefix}_test.jsonl")
     
     # Also create a single combined file if needed
-    write_jsonl_file(dataset, "sanskrit_morphology_complete.jsonl")
-    print(f"  Complete dataset: {len(dataset)} examples -> sanskrit_morphology_complete.jsonl")
+    write_jsonl_file(dataset, f"{prefix}_complete.jsonl")
+    print(f"  Complete dataset: {len(dataset)} examples -> {prefix}_complete.jsonl")
+
+    if merge:
+        outputs = [f"{prefix}_{name}.jsonl" for name in ("train", "val", "test", "complete")]
+        merged_manifest = os.path.join(shard_dir, "tables_merged.manifest.json" if tables else "merged.manifest.json")
+        write_output_manifest(outputs, merged_manifest, run_spec(tables),
+                              len(load_manifests(shard_dir, prefix, verify=False)))
+        print(f"  Output checksums -> {merged_manifest}")
+
+    if arrow_output:
+        from arrow_export import export_arrow
+        with metrics.stage("arrow_export"):
+            export_arrow({"train": train_data, "validation": val_data, "test": test_data}, arrow_output)
+        print(f"  Arrow DatasetDict (datasets.load_from_disk) -> {arrow_output}")
     
     # Print a sample entry for verification
     if dataset:
         print("\nSample entry:")
         print(json.dumps(dataset[0], indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate the Sanskrit morphology dataset")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], default=None,
+                        help="Run the generator under a profiler")
+    parser.add_argument("--profile-output", default=None, help="Where to save the profiler output")
+    parser.add_argument("--timing-output", default="sanskrit_morphology_timing.json",
+                        help="Where to write the JSON timing summary")
+    parser.add_argument("--arrow-output", default=None,
+                        help="Also save the splits as an Arrow DatasetDict in this directory")
+    parser.add_argument("--shard-index", type=int, default=None,
+                        help="Only derive the cells of this shard (0-based), into --shard-dir")
+    parser.add_argument("--num-shards", type=int, default=None, help="Total number of shards")
+    parser.add_argument("--shard-dir", default="shards", help="Where shard files and manifests are written/read")
+    parser.add_argument("--merge", action="store_true",
+                        help="Build the splits from the shards in --shard-dir instead of generating")
+    parser.add_argument("--tables", action="store_true",
+                        help="One entry per (dhātu, lakāra) asking for the whole puruṣa x vacana table, "
+                             "written to sanskrit_morphology_tables_*.jsonl (grade with --grader table)")
+    args = parser.parse_args()
+    if (args.shard_index is None) != (args.num_shards is None):
+        parser.error("--shard-index and --num-shards go together")
+    if args.num_shards is not None and args.merge:
+        parser.error("--merge combines all shards; don't pass --shard-index/--num-shards with it")
+
+    with profiled(args.profile, args.profile_output):
+        main(args.arrow_output, args.shard_index, args.num_shards, args.shard_dir, args.merge, args.tables)
+
+    metrics.print_summary()
+    metrics.write_summary(args.timing_output)
+    print(f"Timing summary written to {args.timing_output}")
@@ -1,18 +1,38 @@
 import os
-from openai import OpenAI
-from openai.types.fine_tuning import ReinforcementMethod, ReinforcementHyperparameters
+import sys
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from output_parsing import PARSER_SOURCE
+
+# The OpenAI SDK is imported, and OPENAI_API_KEY read, only when a job is
+# actually launched, so GRADER_SOURCE and the helpers below can be imported
+# for local grading without either
+_client = None
+
+def get_client():
+    """The OpenAI client, created on first use"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return _client
+
+def data_files(grader="derivation"):
+    """Training and validation files for a grader: the table grader needs the --tables dataset"""
+    prefix = "sanskrit_morphology_tables" if grader == "table" else "sanskrit_morphology"
+    return f"{prefix}_train.jsonl", f"{prefix}_val.jsonl"
 
 # First, upload your training and validation files
-def upload_files():
+def upload_files(paths=None):
     """Upload the JSONL files to OpenAI"""
+    training_path, validation_path = paths or data_files()
     
     # Upload training file
     print("Uploading training file...")
-    with open("sanskrit_morphology_train.jsonl", "rb") as f:
-        training_file = client.files.create(
+    with open(training_path, "rb") as f:
+        training_file = get_client().files.create(
             file=f,
             purpose="fine-tune"
         )
@@ -20,8 +40,8 @@ def upload_files():
     
     # Upload validation file
     print("Uploading validation file...")
-    with open("sanskrit_morphology_val.jsonl", "rb") as f:
-        validation_file = client.files.create(
+    with open(validation_path, "rb") as f:
+        validation_file = get_client().files.create(
             file=f,
             purpose="fine-tune"
         )
@@ -29,14 +49,12 @@ def upload_files():
     
     return training_file.id, validation_file.id
 
-# Define the custom grader for Sanskrit morphology
-from openai.types.graders import PythonGrader
+# Define the custom grader for Sanskrit morphology. Graders run on OpenAI's
+# side and can't import local modules, so every grader source is the shared
+# JSON answer parser (output_parsing.PARSER_SOURCE) followed by its own code
+GRADER_NAME = "Sanskrit Morphology Derivation Grader"
 
-sanskrit_grader = PythonGrader(
-    name="Sanskrit Morphology Derivation Grader",
-    type="python",
-    source="""
-import json
+GRADER_SOURCE = PARSER_SOURCE + """
 from rapidfuzz import fuzz, utils
 
 def grade(sample, item) -> float:
@@ -44,13 +62,13 @@ def grade(sample, item) -> float:
         # Extract the model's output text
         output_text = sample["output_text"].strip()
         
-        # Parse the model's JSON response to get derivation steps
-        try:
-            model_response = json.loads(output_text)
-            model_derivation = model_response.get("derivation_history", [])
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return 0
+        # Find the JSON answer, even inside a code fence or after some prose
+        model_response, parse_status = extract_json_fields(
+            output_text, ("conjugated_verb", "derivation_history"))
+        if model_response is None:
+            # No usable JSON object, return 0
             return 0.0
+        model_derivation = model_response.get("derivation_history", [])
         
         # Get the expected derivation history from the item
         expected_derivation = item.get("derivation_history", [])
@@ -98,32 +116,124 @@ def grade(sample, item) -> float:
     except Exception as e:
         return 0.0
 """
-)
 
-def create_rl_job(training_file_id, validation_file_id):
-    """Create the reinforcement learning fine-tuning job"""
-    
-    print("Creating RL fine-tuning job...")
-    
-    job = client.fine_tuning.jobs.create(
+# Answer-only grader: the model's conjugated_verb (declined_form for subanta
+# items) against every variant form of the cell. accepted_answers is normalized by the generator, so grading is
+# one normalization of the output and a hash lookup, with no fuzzy matching.
+ANSWER_GRADER_NAME = "Sanskrit Morphology Answer Set Grader"
+
+ANSWER_GRADER_SOURCE = PARSER_SOURCE + """
+import unicodedata
+
+def grade(sample, item) -> float:
+    try:
+        # Tiṅanta prompts ask for "conjugated_verb", subanta prompts for "declined_form"
+        model_response, parse_status = extract_json_fields(
+            sample["output_text"].strip(), ("conjugated_verb", "declined_form"))
+        if model_response is None:
+            return 0.0
+        form = model_response.get("conjugated_verb") or model_response.get("declined_form") or ""
+        # Same normalization as normalize_answer() in make_dataset_openai_jsonl.py
+        answer = "".join(unicodedata.normalize("NFC", str(form)).lower().split())
+        accepted = item.get("accepted_answers")
+        if accepted is None:
+            # Items generated before accepted_answers existed
+            accepted = ["".join(unicodedata.normalize("NFC", str(item.get("expected_answer", ""))).lower().split())]
+        return 1.0 if answer and answer in frozenset(accepted) else 0.0
+    except Exception as e:
+        return 0.0
+"""
+
+# Paradigm-table grader for make_dataset_openai_jsonl.py --tables entries: one
+# JSON answer holds the whole puruṣa x vacana table of a (dhātu, lakāra), and
+# every cell is checked against its accepted_answers like the answer grader.
+# The score is the fraction of the item's cells that are right.
+TABLE_GRADER_NAME = "Sanskrit Morphology Paradigm Table Grader"
+
+TABLE_GRADER_SOURCE = PARSER_SOURCE + """
+import unicodedata
+
+# Table keys as the model may write them ("Prathama", "prathamapuruṣa",
+# "ekavacana") -> the item's puruṣa / vacana labels
+def _cell_key(text):
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = "".join(c for c in text if c.isalpha())
+    for suffix in ("purusha", "purusa", "vacana"):
+        if text.endswith(suffix) and text != suffix:
+            return text[:-len(suffix)]
+    return text
+
+def grade(sample, item) -> float:
+    try:
+        model_response, parse_status = extract_json_fields(sample["output_text"].strip(), ("table",))
+        if model_response is None:
+            return 0.0
+        table = model_response.get("table")
+        cells = item.get("cells") or []
+        if not isinstance(table, dict) or not cells:
+            return 0.0
+        forms = {}
+        for purusha, row in table.items():
+            if isinstance(row, dict):
+                for vacana, form in row.items():
+                    forms[_cell_key(purusha), _cell_key(vacana)] = form
+        correct = 0
+        for cell in cells:
+            form = forms.get((_cell_key(cell["purusha"]), _cell_key(cell["vacana"])))
+            # Same normalization as normalize_answer() in make_dataset_openai_jsonl.py
+            answer = "".join(unicodedata.normalize("NFC", str(form or "")).lower().split())
+            if answer and answer in frozenset(cell["accepted_answers"]):
+                correct += 1
+        # Fraction of the item's cells answered with an accepted form
+        return correct / len(cells)
+    except Exception as e:
+        return 0.0
+"""
+
+GRADERS = {
+    "derivation": (GRADER_NAME, GRADER_SOURCE),
+    "answer": (ANSWER_GRADER_NAME, ANSWER_GRADER_SOURCE),
+    "table": (TABLE_GRADER_NAME, TABLE_GRADER_SOURCE),
+}
+
+def build_grader(kind="derivation"):
+    """The PythonGrader sent with the job: "derivation" (default), "answer" or "table" from GRADERS"""
+    from openai.types.graders import PythonGrader
+    name, source = GRADERS[kind]
+    return PythonGrader(name=name, type="python", source=source)
+
+def rl_job_params(training_file_id, validation_file_id, reasoning_effort="medium", n_epochs=3,
+                  grader="derivation", **hyperparameters):
+    """Keyword arguments for fine_tuning.jobs.create, shared by the sync and async paths"""
+    from openai.types.fine_tuning import ReinforcementMethod, ReinforcementHyperparameters
+
+    return dict(
         training_file=training_file_id,
         validation_file=validation_file_id,
         model="o4-mini-2025-04-16",  # Using GPT-4o as base model
         method={
             "type": "reinforcement",
             "reinforcement": ReinforcementMethod(
-                grader=sanskrit_grader,
+                grader=build_grader(grader),
                 hyperparameters=ReinforcementHyperparameters(
-                    reasoning_effort="medium",  # Can be "low", "medium", or "high"
-                    # You can also set other hyperparameters like:
-                    n_epochs=3,
-                    # batch_size=8,
-                    # learning_rate_multiplier=1.0,
+                    reasoning_effort=reasoning_effort,  # Can be "low", "medium", or "high"
+                    n_epochs=n_epochs,
+                    # You can also set other hyperparameters like batch_size=8
+                    # or learning_rate_multiplier=1.0
+                    **hyperparameters,
                 )
             )
         },
         seed=42,
     )
+
+def create_rl_job(training_file_id, validation_file_id, grader="derivation"):
+    """Create the reinforcement learning fine-tuning job"""
+    
+    print("Creating RL fine-tuning job...")
+    
+    job = get_client().fine_tuning.jobs.create(**rl_job_params(training_file_id, validation_file_id, grader=grader))
     
     print(f"RL Job created successfully!")
     print(f"Job ID: {job.id}")
@@ -139,7 +249,7 @@ def monitor_job(job_id):
     print("You can also monitor this at: https://platform.openai.com/finetune")
     
     # Get current job status
-    job = client.fine_tuning.jobs.retrieve(job_id)
+    job = get_client().fine_tuning.jobs.retrieve(job_id)
     print(f"Current status: {job.status}")
     
     if job.status == "completed":
@@ -151,13 +261,63 @@ def monitor_job(job_id):
     
     return job
 
-if __name__ == "__main__":
+async def run_async(args):
+    """Upload concurrently (skipping content that was already uploaded), then
+    launch one job, or a sweep of jobs, and stream their events until done"""
+    from functools import partial
+
+    from openai_async import AsyncJobOrchestrator, parse_sweep_configs
+
+    orchestrator = AsyncJobOrchestrator(base_url=args.base_url, max_concurrency=args.max_concurrency)
+    try:
+        paths = list(data_files(args.grader))
+        if args.strip_fields:
+            # Upload copies with only the fields the model and the grader read
+            from upload_export import export_for_grader
+            paths = [report["outputs"][0] for report in export_for_grader(paths, GRADERS[args.grader][1])]
+        training_file_id, validation_file_id = await orchestrator.upload_all(paths)
+        configs = parse_sweep_configs(args.sweep) if args.command == "sweep" else [{}]
+        return await orchestrator.sweep(training_file_id, validation_file_id, configs,
+                                        partial(rl_job_params, grader=args.grader),
+                                        timeout=args.poll_timeout)
+    finally:
+        await orchestrator.close()
+
+def main(argv=None):
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Launch the Sanskrit morphology RL fine-tuning job")
+    parser.add_argument("command", nargs="?", choices=["run", "async", "sweep"], default="run",
+                        help="run: upload and create one job (default); async: concurrent uploads "
+                             "and streamed job events; sweep: one job per --sweep config")
+    parser.add_argument("--sweep", action="append", default=[],
+                        help="Hyperparameters for one sweep job, e.g. n_epochs=2,reasoning_effort=low")
+    parser.add_argument("--base-url", default=None,
+                        help="API base URL, e.g. http://127.0.0.1:8089/v1 for mock_openai_server.py")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--strip-fields", action="store_true",
+                        help="Upload minimal copies without the fields the grader never reads (see upload_export.py)")
+    parser.add_argument("--grader", choices=sorted(GRADERS), default="derivation",
+                        help="derivation: step-by-step derivation grader (default); "
+                             "answer: conjugated_verb against all accepted_answers; "
+                             "table: whole paradigm tables (needs make_dataset_openai_jsonl.py --tables)")
+    parser.add_argument("--poll-timeout", type=float, default=None,
+                        help="Stop monitoring after this many seconds")
+    args = parser.parse_args(argv)
+
+    if args.command != "run":
+        if args.command == "sweep" and not args.sweep:
+            parser.error("sweep needs at least one --sweep config")
+        asyncio.run(run_async(args))
+        return
+
     try:
         # Step 1: Upload files
-        training_file_id, validation_file_id = upload_files()
+        training_file_id, validation_file_id = upload_files(data_files(args.grader))
         
         # Step 2: Create RL job
-        job = create_rl_job(training_file_id, validation_file_id)
+        job = create_rl_job(training_file_id, validation_file_id, args.grader)
         
         # Step 3: Monitor job (initial check)
         monitor_job(job.id)
@@ -181,3 +341,6 @@ if __name__ == "__main__":
         print("1. Set your OPENAI_API_KEY environment variable")
         print("2. Generated the JSONL files by running the dataset generator script")
         print("3. Have sufficient credits in your OpenAI account")
+
+if __name__ == "__main__":
+    main()
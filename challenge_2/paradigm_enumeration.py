@@ -0,0 +1,396 @@
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from vidyut.prakriya import Data, Lakara, Linga, Prayoga, Purusha, Sanadi, Vacana, Vibhakti
+
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+import make_dataset_openai_jsonl as gen
+from instrumentation import metrics, profiled
+
+# Full-paradigm enumeration over the whole Dhātupāṭha and a list of prātipadikas.
+#
+# The tiṅanta cell space is every dhātu x sanādi (none, or one of san, yaṅ,
+# yaṅluk and ṇic) x prayoga x lakāra x puruṣa x vacana, leaving out sanādi
+# units whose derived dhātu is the plain one; the subanta cell space is
+# every prātipadika x liṅga x vibhakti x vacana. Work is split into units of
+# one (dhātu, sanādi) pair or one prātipadika, which are derived in a process
+# pool and streamed to sharded JSONL files in a deterministic order. After
+# every unit a checkpoint records how far we got, so an interrupted run
+# resumes where it stopped.
+
+DEFAULT_OUTPUT_DIR = "paradigm_output"
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def load_dhatus(data_path=gen.morphological_data_path):
+    """All dhātus of the Dhātupāṭha, in Dhātupāṭha order.
+
+    Roots the Dhātupāṭha lists more than once (with different meanings) are
+    kept once: their paradigms, and so their entry ids, are the same.
+    """
+    data = Data(data_path)
+    dhatus = {}
+    for e in data.load_dhatu_entries():
+        dhatus.setdefault(repr(e.dhatu), e.dhatu)
+    return list(dhatus.values())
+
+
+def load_pratipadikas(path=None):
+    """(stem, [Linga, ...]) pairs from a TSV of `stem<TAB>Linga,Linga` (SLP1), or the built-in list"""
+    if path is None:
+        rows = gen.default_pratipadikas
+    else:
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) >= 2 and fields[0]:
+                    rows.append((fields[0], fields[1].split(",")))
+    return [(stem, [getattr(Linga, name.strip()) for name in lingas]) for stem, lingas in rows]
+
+
+# The sanādi pratyayas that derive a new dhātu from a verbal root. kāmyac,
+# kyac and kyaṅ make denominatives from nominal stems; vidyut ignores them on
+# a dhātu and derives the plain forms, so they are not part of the default axis
+DHATU_SANADIS = ("san", "yaN", "yaNluk", "Ric")
+
+
+def cell_axes(prayogas=None, lakaras=None, sanadis=None):
+    """The axes of the cell space; None means every choice vidyut offers (DHATU_SANADIS for sanādi)"""
+    if sanadis is None:
+        sanadis = [getattr(Sanadi, name) for name in DHATU_SANADIS]
+    return {
+        # None stands for the plain (mūla) dhātu
+        "sanadis": [None] + list(sanadis),
+        "prayogas": list(Prayoga.choices() if prayogas is None else prayogas),
+        "lakaras": list(Lakara.choices() if lakaras is None else lakaras),
+        "purushas": list(Purusha.choices()),
+        "vacanas": list(Vacana.choices()),
+        "vibhaktis": list(Vibhakti.choices()),
+    }
+
+
+def iter_units(num_dhatus, num_pratipadikas, axes):
+    """Yield (unit_id, kind, index, sub_index) work units in a fixed order"""
+    unit_id = 0
+    for dhatu_index in range(num_dhatus):
+        for sanadi_index in range(len(axes["sanadis"])):
+            yield unit_id, "tinanta", dhatu_index, sanadi_index
+            unit_id += 1
+    for stem_index in range(num_pratipadikas):
+        yield unit_id, "subanta", stem_index, 0
+        unit_id += 1
+
+
+def derives_new_dhatu(dhatu, sanadi):
+    """Whether adding the sanādi pratyaya changes the dhātu's text at all"""
+    vyakarana = gen.get_vyakarana()
+    with metrics.stage("derive"):
+        plain = {p.text for p in vyakarana.derive(dhatu)}
+        derived = {p.text for p in vyakarana.derive(dhatu.with_sanadi([sanadi]))}
+    return derived != plain
+
+
+def iter_cells(dhatu, sanadi, axes):
+    """Yield every (dhatu, prayoga, lakara, purusha, vacana) cell of one unit"""
+    if sanadi is not None:
+        dhatu = dhatu.with_sanadi([sanadi])
+    for prayoga in axes["prayogas"]:
+        for lakara in axes["lakaras"]:
+            for purusha in axes["purushas"]:
+                for vacana in axes["vacanas"]:
+                    yield dhatu, prayoga, lakara, purusha, vacana
+
+
+def iter_subanta_cells(stem, lingas, axes):
+    """Yield every (stem, linga, vibhakti, vacana) cell of one prātipadika"""
+    for linga in lingas:
+        for vibhakti in axes["vibhaktis"]:
+            for vacana in axes["vacanas"]:
+                yield stem, linga, vibhakti, vacana
+
+
+def cells_per_unit(axes):
+    return len(axes["prayogas"]) * len(axes["lakaras"]) * len(axes["purushas"]) * len(axes["vacanas"])
+
+
+def count_cells(units, pratipadikas, axes):
+    total = 0
+    for _, kind, index, _ in units:
+        if kind == "tinanta":
+            total += cells_per_unit(axes)
+        else:
+            total += len(pratipadikas[index][1]) * len(axes["vibhaktis"]) * len(axes["vacanas"])
+    return total
+
+
+# Per-worker state, set up once by the pool initializer
+_worker = {}
+
+
+def _init_worker(data_path, axes_spec, pratipadika_path):
+    _worker["dhatus"] = load_dhatus(data_path)
+    _worker["pratipadikas"] = load_pratipadikas(pratipadika_path)
+    _worker["axes"] = cell_axes(**axes_spec)
+
+
+def derive_unit(unit):
+    """Derive every cell of one work unit; runs in a worker process"""
+    unit_id, kind, index, sub_index = unit
+    axes = _worker["axes"]
+    # Stage timers are collected per unit and merged in the parent process
+    metrics.reset()
+
+    if kind == "tinanta":
+        sanadi = axes["sanadis"][sub_index]
+        dhatu = _worker["dhatus"][index]
+        if sanadi is not None and not derives_new_dhatu(dhatu, sanadi):
+            # Every cell would repeat the plain dhātu's form under a sanādi label
+            metrics.count("dropped_units")
+            print(f"Unit {unit_id}: dropped, {gen.translit(sanadi)} leaves the dhātu unchanged")
+            return unit_id, [], 0, metrics.snapshot()
+        cells = iter_cells(dhatu, sanadi, axes)
+        build = gen.build_tinanta_entry
+        extra = {"pada_type": "tinanta", "sanadi": gen.translit(sanadi) if sanadi is not None else ""}
+    else:
+        stem, lingas = _worker["pratipadikas"][index]
+        cells = iter_subanta_cells(stem, lingas, axes)
+        build = gen.build_subanta_entry
+        extra = {"pada_type": "subanta"}
+
+    entries = []
+    skipped = 0
+    first_error = None
+    for cell in cells:
+        try:
+            entry = build(*cell)
+        except Exception as e:
+            # Some sanādi/prayoga combinations are rejected by vidyut outright;
+            # skip that cell and carry on with the rest of the unit
+            skipped += 1
+            first_error = first_error or e
+            continue
+        if entry:
+            entry.update(extra)
+            entries.append(entry)
+    if skipped:
+        metrics.count("skipped_cells", skipped)
+        print(f"Unit {unit_id}: skipped {skipped} cells vidyut rejected (first: {first_error})")
+    with metrics.stage("serialization"):
+        lines = [json.dumps(e, ensure_ascii=False) for e in entries]
+    return unit_id, lines, skipped, metrics.snapshot()
+
+
+class ShardWriter:
+    """Stream JSON lines into numbered shard files of at most shard_size records"""
+
+    def __init__(self, output_dir, prefix, shard_size, shard_index=0, shard_count=0, offset=0):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self._file = None
+        self._open(offset)
+
+    def _path(self, index):
+        return os.path.join(self.output_dir, f"{self.prefix}-{index:05d}.jsonl")
+
+    def _open(self, offset=0):
+        path = self._path(self.shard_index)
+        # Drop anything written after the last checkpoint
+        mode = "r+b" if os.path.exists(path) else "wb"
+        self._file = open(path, mode)
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def write(self, line):
+        if self.shard_count >= self.shard_size:
+            self._file.close()
+            self.shard_index += 1
+            self.shard_count = 0
+            self._open()
+        self._file.write(line.encode("utf-8") + b"\n")
+        self.shard_count += 1
+
+    def state(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {
+            "shard_index": self.shard_index,
+            "shard_count": self.shard_count,
+            "offset": self._file.tell(),
+        }
+
+    def close(self):
+        self._file.close()
+
+
+def _load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def _save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+
+def enumerate_paradigms(output_dir=DEFAULT_OUTPUT_DIR,
+                        data_path=gen.morphological_data_path,
+                        axes_spec=None,
+                        mode="tinanta",
+                        pratipadika_path=None,
+                        max_dhatus=None,
+                        shard_size=100_000,
+                        num_workers=None,
+                        progress_interval=10.0,
+                        prefix=None,
+                        timing_output=None):
+    """Enumerate the tiṅanta and/or subanta cell space into sharded JSONL files, resuming if possible
+
+    mode is "tinanta", "subanta" or "both" (a combined dataset in one pass).
+    """
+    axes_spec = axes_spec or {}
+    prefix = prefix or mode
+    os.makedirs(output_dir, exist_ok=True)
+
+    num_dhatus = 0
+    if mode in ("tinanta", "both"):
+        num_dhatus = len(load_dhatus(data_path))
+        if max_dhatus is not None:
+            num_dhatus = min(num_dhatus, max_dhatus)
+    pratipadikas = load_pratipadikas(pratipadika_path) if mode in ("subanta", "both") else []
+    axes = cell_axes(**axes_spec)
+    units = list(iter_units(num_dhatus, len(pratipadikas), axes))
+    total_cells = count_cells(units, pratipadikas, axes)
+
+    # The checkpoint also pins the cell space, so a resume can't mix two runs
+    run_spec = {
+        "mode": mode,
+        "num_dhatus": num_dhatus,
+        "pratipadikas": [stem for stem, _ in pratipadikas],
+        "axes": {name: [str(x) for x in values] for name, values in axes.items()},
+        "shard_size": shard_size,
+        "prefix": prefix,
+    }
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    checkpoint = _load_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint["run_spec"] != run_spec:
+        raise ValueError(f"{checkpoint_path} belongs to a different run; use a fresh output directory")
+    if checkpoint is None:
+        checkpoint = {
+            "run_spec": run_spec,
+            "next_unit": 0,
+            "records": 0,
+            "skipped_cells": 0,
+            "writer": {"shard_index": 0, "shard_count": 0, "offset": 0},
+            "complete": False,
+        }
+
+    if checkpoint["complete"]:
+        print(f"Run in {output_dir} is already complete ({checkpoint['records']} records)")
+        return checkpoint
+
+    remaining = units[checkpoint["next_unit"]:]
+    print(f"Cell space: {num_dhatus} dhātus x {len(axes['sanadis'])} sanādi x {cells_per_unit(axes)} cells, "
+          f"{len(pratipadikas)} prātipadikas = {total_cells} cells in {len(units)} units")
+    if checkpoint["next_unit"]:
+        print(f"Resuming at unit {checkpoint['next_unit']} with {checkpoint['records']} records written")
+
+    metrics.name = "paradigm_enumeration"
+    metrics.reset()
+    writer = ShardWriter(output_dir, prefix, shard_size, **checkpoint["writer"])
+    start = time.monotonic()
+    last_report = start
+    done_at_start = checkpoint["next_unit"]
+
+    try:
+        with Pool(num_workers, initializer=_init_worker, initargs=(data_path, axes_spec, pratipadika_path)) as pool:
+            # imap keeps results in unit order, which keeps the output deterministic. A unit
+            # only comes back once all its cells were tried; if a worker fails, imap
+            # raises and the checkpoint still points at that unit
+            for unit_id, lines, skipped, worker_metrics in pool.imap(derive_unit, remaining, chunksize=1):
+                metrics.merge(worker_metrics)
+                with metrics.stage("write"):
+                    for line in lines:
+                        writer.write(line)
+                checkpoint["records"] += len(lines)
+                checkpoint["skipped_cells"] = checkpoint.get("skipped_cells", 0) + skipped
+                checkpoint["next_unit"] = unit_id + 1
+                with metrics.stage("checkpoint"):
+                    checkpoint["writer"] = writer.state()
+                    _save_checkpoint(checkpoint_path, checkpoint)
+
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    last_report = now
+                    done = checkpoint["next_unit"]
+                    rate = (done - done_at_start) / (now - start)
+                    eta = (len(units) - done) / rate if rate else 0
+                    print(f"[{done}/{len(units)} units, {100 * done / len(units):.1f}%] "
+                          f"{checkpoint['records']} records, {checkpoint['skipped_cells']} cells skipped, "
+                          f"{rate:.2f} units/s, "
+                          f"ETA {_format_seconds(eta)}")
+    finally:
+        writer.close()
+
+    checkpoint["complete"] = True
+    _save_checkpoint(checkpoint_path, checkpoint)
+    print(f"Finished: {checkpoint['records']} records in {checkpoint['writer']['shard_index'] + 1} shards, "
+          f"{checkpoint.get('skipped_cells', 0)} cells skipped ({_format_seconds(time.monotonic() - start)})")
+
+    # Worker stage times are summed across processes, so they can exceed wall time
+    metrics.print_summary()
+    timing_output = timing_output or os.path.join(output_dir, "timing.json")
+    metrics.write_summary(timing_output)
+    print(f"Timing summary written to {timing_output}")
+    return checkpoint
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Enumerate the full tiṅanta/subanta paradigm space")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--mode", choices=["tinanta", "subanta", "both"], default="tinanta")
+    parser.add_argument("--pratipadikas", default=None, help="TSV of SLP1 stems and liṅgas (default: built-in list)")
+    parser.add_argument("--max-dhatus", type=int, default=None, help="Only use the first N dhātus")
+    parser.add_argument("--shard-size", type=int, default=100_000, help="Records per output shard")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-sanadi", action="store_true", help="Only derive plain (mūla) dhātus")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], default=None,
+                        help="Profile the parent process (derivation itself runs in the workers)")
+    parser.add_argument("--profile-output", default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(gen.morphological_data_path):
+        print(f"Path {gen.morphological_data_path} does not exist. Please download the vidyut data first.")
+        exit(1)
+
+    with profiled(args.profile, args.profile_output):
+        enumerate_paradigms(
+            output_dir=args.output_dir,
+            axes_spec={"sanadis": []} if args.no_sanadi else {},
+            mode=args.mode,
+            pratipadika_path=args.pratipadikas,
+            max_dhatus=args.max_dhatus,
+            shard_size=args.shard_size,
+            num_workers=args.workers,
+            progress_interval=args.progress_interval,
+        )
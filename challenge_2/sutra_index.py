@@ -0,0 +1,314 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+
+# Compact, memory-mapped index over the sūtrapāṭha, the Kāśikā excerpts and the
+# vārttikas shipped with the vidyut data. The index is compiled once into a
+# single binary file next to the TSVs and then mmap'd read-only, so every
+# grading process shares the same pages instead of re-reading the TSVs.
+#
+# Layout of the index file (all integers little-endian uint32):
+#   header        magic, version, n_records, n_varttikas, n_dhatus, blob_offset
+#   sutra table   8 adhyāyas x 4 pādas x 256 slots -> record number + 1 (0 = missing)
+#   varttika keys sorted keys, followed by their record numbers
+#   dhatu keys    sorted keys, followed by their record numbers
+#   records       text_off, text_len, comm_off, comm_len, adhikara_mask
+#   blob          UTF-8 (SLP1) texts
+
+morphological_data_path = "vidyut-0.4.0/prakriya/"
+INDEX_FILENAME = "sutra_index.bin"
+
+MAGIC = b"SIDX"
+VERSION = 1
+HEADER = struct.Struct("<4s5I")
+RECORD = struct.Struct("<5I")
+SUTRA_SLOTS = 8 * 4 * 256
+
+# Major adhikāra (heading) sūtras and the range of sūtras they govern.
+# A step can then get partial credit for citing a valid sūtra from the right
+# section of the Aṣṭādhyāyī even if it is not the exact expected rule.
+ADHIKARAS = [
+    ("samāsaḥ", "2.1.3", "2.2.38"),
+    ("kārake", "1.4.23", "1.4.55"),
+    ("nipātāḥ", "1.4.56", "1.4.97"),
+    ("pratyayaḥ", "3.1.1", "5.4.160"),
+    ("dhātoḥ", "3.1.91", "3.4.117"),
+    ("ṅyāpprātipadikāt", "4.1.1", "5.4.160"),
+    ("taddhitāḥ", "4.1.76", "5.4.160"),
+    ("ekāco dve prathamasya", "6.1.1", "6.1.12"),
+    ("saṃhitāyām", "6.1.72", "6.1.157"),
+    ("aṅgasya", "6.4.1", "7.4.97"),
+    ("bhasya", "6.4.129", "6.4.175"),
+    ("abhyāsasya", "7.4.58", "7.4.97"),
+    ("padasya", "8.1.16", "8.3.54"),
+    ("pūrvatrāsiddham", "8.2.1", "8.4.68"),
+]
+
+
+def parse_code(code):
+    """Parse a step code into (kind, key), or None if it is malformed"""
+    parts = str(code).strip().split(".")
+    if not all(p.isdigit() for p in parts):
+        return None
+
+    nums = [int(p) for p in parts]
+    if len(parts) == 2:
+        # Dhātupāṭha reference such as "01.0934"
+        return "dhatu", nums[0] * 10000 + nums[1]
+
+    if len(parts) not in (3, 4):
+        return None
+    adhyaya, pada, sutra = nums[:3]
+    if not (1 <= adhyaya <= 8 and 1 <= pada <= 4 and 1 <= sutra <= 255):
+        return None
+    key = (adhyaya << 16) | (pada << 8) | sutra
+    if len(parts) == 3:
+        return "sutra", key
+    if not 1 <= nums[3] <= 255:
+        return None
+    return "varttika", (key << 8) | nums[3]
+
+
+def _sutra_slot(key):
+    adhyaya, pada, sutra = key >> 16, (key >> 8) & 0xFF, key & 0xFF
+    return ((adhyaya - 1) * 4 + (pada - 1)) * 256 + sutra
+
+
+def _adhikara_mask(key):
+    mask = 0
+    for bit, (_, start, end) in enumerate(ADHIKARAS):
+        if parse_code(start)[1] <= key <= parse_code(end)[1]:
+            mask |= 1 << bit
+    return mask
+
+
+def _read_tsv(path):
+    """Yield (code, text) rows from a vidyut TSV file, skipping the header"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        next(f, None)
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 2:
+                yield fields[0], fields[1]
+
+
+def build_index(data_path=morphological_data_path, index_path=None):
+    """Compile the TSV sources into a single binary index file"""
+    index_path = index_path or os.path.join(data_path, INDEX_FILENAME)
+
+    commentary = {}
+    for code, text in _read_tsv(os.path.join(data_path, "kashika.tsv")):
+        commentary[code] = text
+
+    blob = bytearray()
+
+    def add_text(text):
+        data = text.encode("utf-8")
+        offset = len(blob)
+        blob.extend(data)
+        return offset, len(data)
+
+    records = []
+    sutra_table = [0] * SUTRA_SLOTS
+    for code, text in _read_tsv(os.path.join(data_path, "sutrapatha.tsv")):
+        parsed = parse_code(code)
+        if not parsed or parsed[0] != "sutra":
+            continue
+        key = parsed[1]
+        comm = commentary.get(code)
+        comm_off, comm_len = add_text(comm) if comm else (0, 0)
+        records.append((*add_text(text), comm_off, comm_len, _adhikara_mask(key)))
+        sutra_table[_sutra_slot(key)] = len(records)
+
+    def keyed_section(filename, kind):
+        entries = []
+        for fields in _read_tsv(os.path.join(data_path, filename)):
+            parsed = parse_code(fields[0])
+            if not parsed or parsed[0] != kind:
+                continue
+            mask = _adhikara_mask(parsed[1] >> 8) if kind == "varttika" else 0
+            records.append((*add_text(fields[1]), 0, 0, mask))
+            entries.append((parsed[1], len(records) - 1))
+        entries.sort()
+        return entries
+
+    varttikas = keyed_section("varttikas.tsv", "varttika")
+    dhatus = keyed_section("dhatupatha.tsv", "dhatu")
+
+    blob_offset = (
+        HEADER.size
+        + 4 * SUTRA_SLOTS
+        + 8 * len(varttikas)
+        + 8 * len(dhatus)
+        + RECORD.size * len(records)
+    )
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records), len(varttikas), len(dhatus), blob_offset))
+        f.write(struct.pack(f"<{SUTRA_SLOTS}I", *sutra_table))
+        for entries in (varttikas, dhatus):
+            f.write(struct.pack(f"<{len(entries)}I", *(k for k, _ in entries)))
+            f.write(struct.pack(f"<{len(entries)}I", *(r for _, r in entries)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+        f.write(blob)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+class SutraIndex:
+    """Read-only view over a compiled sūtra index file"""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        with open(index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_records, n_varttikas, n_dhatus, blob_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{index_path} is not a version {VERSION} sūtra index")
+
+        self._view = view = memoryview(self._mm)
+        offset = HEADER.size
+        self._sutras = view[offset:offset + 4 * SUTRA_SLOTS].cast("I")
+        offset += 4 * SUTRA_SLOTS
+
+        def section(count):
+            nonlocal offset
+            keys = view[offset:offset + 4 * count].cast("I")
+            rows = view[offset + 4 * count:offset + 8 * count].cast("I")
+            offset += 8 * count
+            return keys, rows
+
+        self._varttikas = section(n_varttikas)
+        self._dhatus = section(n_dhatus)
+        self._records_offset = offset
+        self._blob_offset = blob_offset
+        self.n_records = n_records
+
+    def _record_number(self, code):
+        parsed = parse_code(code)
+        if parsed is None:
+            return None, None
+        kind, key = parsed
+        if kind == "sutra":
+            row = self._sutras[_sutra_slot(key)]
+            return kind, (row - 1 if row else None)
+
+        keys, rows = self._varttikas if kind == "varttika" else self._dhatus
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return kind, rows[i]
+        return kind, None
+
+    def _text(self, offset, length):
+        start = self._blob_offset + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def is_valid(self, code):
+        """Return True if the code names a sūtra, vārttika or dhātupāṭha entry"""
+        return self._record_number(code)[1] is not None
+
+    def lookup(self, code):
+        """Return a dict describing the code, or None if it does not exist"""
+        kind, row = self._record_number(code)
+        if row is None:
+            return None
+        text_off, text_len, comm_off, comm_len, mask = RECORD.unpack_from(
+            self._mm, self._records_offset + RECORD.size * row
+        )
+        return {
+            "code": str(code).strip(),
+            "kind": kind,
+            "text": self._text(text_off, text_len),
+            "commentary": self._text(comm_off, comm_len) if comm_len else None,
+            "adhikaras": _mask_names(mask),
+        }
+
+    def adhikara_mask(self, code):
+        """Bitmask of the adhikāras (see ADHIKARAS) governing a valid code"""
+        kind, row = self._record_number(code)
+        if row is None:
+            return 0
+        return RECORD.unpack_from(self._mm, self._records_offset + RECORD.size * row)[4]
+
+    def adhikaras(self, code):
+        """Names of the adhikāras governing a valid code"""
+        return _mask_names(self.adhikara_mask(code))
+
+    def shares_adhikara(self, code_a, code_b):
+        """True if both codes are valid and fall under a common adhikāra"""
+        return bool(self.adhikara_mask(code_a) & self.adhikara_mask(code_b))
+
+    def score_step_code(self, model_code, expected_code):
+        """Partial credit for a derivation step's sūtra code.
+
+        1.0 for an exact match, 0.5 for a valid sūtra from the same adhikāra,
+        0.25 for any other valid code and 0.0 for a code that does not exist.
+        """
+        model_code = str(model_code).strip()
+        expected_code = str(expected_code).strip()
+        if model_code == expected_code:
+            return 1.0
+        if not self.is_valid(model_code):
+            return 0.0
+        if self.shares_adhikara(model_code, expected_code):
+            return 0.5
+        return 0.25
+
+    def close(self):
+        self._sutras.release()
+        for keys, rows in (self._varttikas, self._dhatus):
+            keys.release()
+            rows.release()
+        self._view.release()
+        self._mm.close()
+
+
+def _mask_names(mask):
+    return [name for bit, (name, _, _) in enumerate(ADHIKARAS) if mask & (1 << bit)]
+
+
+def _is_stale(index_path, data_path):
+    if not os.path.exists(index_path):
+        return True
+    built = os.path.getmtime(index_path)
+    sources = ["sutrapatha.tsv", "kashika.tsv", "varttikas.tsv", "dhatupatha.tsv"]
+    return any(
+        os.path.getmtime(os.path.join(data_path, name)) > built
+        for name in sources
+        if os.path.exists(os.path.join(data_path, name))
+    )
+
+
+_index = None
+
+
+def get_sutra_index(data_path=morphological_data_path):
+    """Return the process-wide sūtra index, building the file on first use"""
+    global _index
+    if _index is None:
+        index_path = os.path.join(data_path, INDEX_FILENAME)
+        if _is_stale(index_path, data_path):
+            build_index(data_path, index_path)
+        _index = SutraIndex(index_path)
+    return _index
+
+
+if __name__ == "__main__":
+    import sys
+
+    if not os.path.exists(morphological_data_path):
+        print(f"Path {morphological_data_path} does not exist. Please download the vidyut data first.")
+        exit(1)
+
+    path = build_index()
+    index = get_sutra_index()
+    print(f"Built {path} ({os.path.getsize(path)} bytes, {index.n_records} records)")
+
+    for code in sys.argv[1:] or ["3.2.123", "1.3.3.1", "01.0001", "9.9.9"]:
+        print(code, "->", index.lookup(code))
@@ -2,73 +2,14 @@ import os
 import requests
 import json
 
+from openai_rl_job import ANSWER_GRADER_SOURCE, GRADER_SOURCE
+
 # Get the API key from environment
 api_key = os.environ["OPENAI_API_KEY"]
 headers = {"Authorization": f"Bearer {api_key}"}
 
-grading_function = """
-import json
-from rapidfuzz import fuzz, utils
-
-def grade(sample, item) -> float:
-    try:
-        # Extract the model's output text
-        output_text = sample["output_text"].strip()
-        
-        # Parse the model's JSON response to get derivation steps
-        try:
-            model_response = json.loads(output_text)
-            model_derivation = model_response.get("derivation_history", [])
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return 0
-            return 0.0
-        
-        # Get the expected derivation history from the item
-        expected_derivation = item.get("derivation_history", [])
-        
-        # If no expected derivation history, return 0
-        if not expected_derivation:
-            return 0.0
-        
-        # If model provides no derivation steps, return 0
-        if not model_derivation:
-            return 0.0
-        
-        total_steps = len(expected_derivation)
-        correct_streak = 0
-        
-        # Compare each step in sequence until we find a mismatch
-        for i in range(min(len(model_derivation), len(expected_derivation))):
-            expected_step = expected_derivation[i]
-            model_step = model_derivation[i]
-            
-            # Extract code and text from expected step
-            expected_code = str(expected_step.get("code", "")).strip()
-            expected_text = str(expected_step.get("text", "")).strip()
-            
-            # Extract code and text from model step
-            model_code = str(model_step.get("code", "")).strip()
-            model_text = str(model_step.get("text", "")).strip()
-            
-            # Both code and text must match exactly (or very closely for text due to transliteration variations)
-            code_match = (expected_code == model_code)
-            text_similarity = fuzz.WRatio(model_text, expected_text, processor=utils.default_process) / 100.0
-            text_match = (text_similarity >= 0.95)  # Allow slight transliteration differences
-            
-            # Step is correct only if both code and text match
-            if code_match and text_match:
-                correct_streak += 1
-            else:
-                # Once a step is wrong, break the streak
-                break
-        
-        # Score is the fraction of correct consecutive steps from the beginning
-        score = correct_streak / total_steps if total_steps > 0 else 0.0
-        return score
-        
-    except Exception as e:
-        return 0.0
-"""
+# The grader the RL job sends, so these tests run exactly that source
+grading_function = GRADER_SOURCE
 
 # Define the grader
 grader = {
@@ -205,3 +146,83 @@ response = requests.post(
 print("\nTest 4 (No derivation from model - should score 0.0):")
 print("Request_id:", response.headers.get("x-request-id", "N/A"))
 print("Response:", response.text)
+
+# Test case 5: Correct derivation wrapped in a Markdown code fence with some prose
+test_payload_5 = {
+    "grader": grader,
+    "item": {
+        "derivation_history": [
+            {"code": "1.3.1", "text": "bhū"},
+            {"code": "3.2.123", "text": "bhū + lam̐ṭ"}
+        ]
+    },
+    "model_sample": """Here is the derivation:
+```json
+{
+    "conjugated_verb": "bhavati",
+    "derivation_history": [
+        {"code": "1.3.1", "text": "bhū"},
+        {"code": "3.2.123", "text": "bhū + lam̐ṭ"}
+    ]
+}
+```"""
+}
+
+response = requests.post(
+    "https://api.openai.com/v1/fine_tuning/alpha/graders/run",
+    json=test_payload_5,
+    headers=headers
+)
+print("\nTest 5 (Fenced JSON after prose - should score 1.0):")
+print("Request_id:", response.headers.get("x-request-id", "N/A"))
+print("Response:", response.text)
+
+# The answer grader (openai_rl_job.py --grader answer) takes the final form
+# under either key: tiṅanta prompts ask for conjugated_verb, subanta prompts
+# for declined_form
+print("\n" + "="*50)
+print("Testing answer grader with tiṅanta and subanta answers")
+print("="*50)
+
+answer_grader = {
+    "type": "python",
+    "source": ANSWER_GRADER_SOURCE
+}
+
+# Test case 6: Correct tiṅanta form
+test_payload_6 = {
+    "grader": answer_grader,
+    "item": {
+        "expected_answer": "bhavati",
+        "accepted_answers": ["bhavati"]
+    },
+    "model_sample": '{"conjugated_verb": "bhavati"}'
+}
+
+response = requests.post(
+    "https://api.openai.com/v1/fine_tuning/alpha/graders/run",
+    json=test_payload_6,
+    headers=headers
+)
+print("\nTest 6 (Correct conjugated_verb - should score 1.0):")
+print("Request_id:", response.headers.get("x-request-id", "N/A"))
+print("Response:", response.text)
+
+# Test case 7: Correct subanta form
+test_payload_7 = {
+    "grader": answer_grader,
+    "item": {
+        "expected_answer": "devaḥ",
+        "accepted_answers": ["devaḥ"]
+    },
+    "model_sample": '{"declined_form": "devaḥ"}'
+}
+
+response = requests.post(
+    "https://api.openai.com/v1/fine_tuning/alpha/graders/run",
+    json=test_payload_7,
+    headers=headers
+)
+print("\nTest 7 (Correct declined_form - should score 1.0):")
+print("Request_id:", response.headers.get("x-request-id", "N/A"))
+print("Response:", response.text)
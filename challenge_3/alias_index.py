@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from pathlib import Path
+
+# Canonical author and work ids for the GRETIL corpus, with their aliases.
+#
+# The same author shows up as "Bhāravi" in a TEI header, "BAravi" in a file
+# name and "Bharavi" in a model answer; works likewise, plus abbreviations
+# used in file names. Every name is reduced to an alias key (no diacritics,
+# case, punctuation, aspiration or doubled vowels, with ri before a consonant
+# and SLP1 letters such as f read as r). Names that co-occur in one
+# file, the header author and the file name's author fragment, or the title,
+# its first word and the file name's work fragment, are joined into one
+# group. Its id is the key of its most common header spelling, which is also
+# its display name.
+#
+# Resolving a name is then a dict lookup of its key. Only unknown keys fall
+# back to fuzzy matching, against the few keys that start with the same
+# letter. The generator uses the index to normalize author/work in the
+# expected answers and writes each item's alias keys to answer_aliases, which
+# the grader checks before any fuzzy comparison.
+#
+#   python alias_index.py build ./gretil_data/ -o sanskrit_dataset_output/alias_index.json
+#   python alias_index.py resolve author Bharavi "Bhāravi" BAravi
+
+KINDS = ("author", "work")
+DEFAULT_INDEX_PATH = "sanskrit_dataset_output/alias_index.json"
+FUZZY_THRESHOLD = 80
+TEI_NS = "{http://www.tei-c.org/ns/1.0}"
+
+# alias_key() and its tables, as source text: the graders in openai_rl_job.py
+# run on OpenAI's side and include this text, and this module runs it for its
+# own definitions
+ALIAS_KEY_SOURCE = r'''
+import re
+import unicodedata
+
+# SLP1 letters with no other use in romanized Sanskrit (after lowercasing)
+_SLP1_FOLD = str.maketrans({"f": "r", "x": "l", "z": "s", "w": "t", "q": "d"})
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_ASPIRATE = re.compile(r"([kgcjtdpb])h")
+_LONG_VOWEL = re.compile(r"([aiu])\1+")
+# ASCII spelling of ṛ, as in Bhartrihari or Krishna
+_VOCALIC_R = re.compile(r"ri(?=[^aeiou])")
+
+
+def alias_key(text):
+    """Folded form of a name used for alias lookups, e.g. "Bhāravi", "BAravi", "bharavi" -> "baravi" """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower().translate(_SLP1_FOLD)
+    text = _NON_ALNUM.sub("", text).replace("sh", "s")
+    return _VOCALIC_R.sub("r", _LONG_VOWEL.sub(r"\1", _ASPIRATE.sub(r"\1", text)))
+'''
+
+exec(ALIAS_KEY_SOURCE)
+
+
+def read_header(xml_path):
+    """(title, author) from a TEI header, reading no further than the header"""
+    title = author = None
+    try:
+        for _, element in ElementTree.iterparse(xml_path, events=("end",)):
+            tag = element.tag
+            if tag == TEI_NS + "title" and title is None and element.text and element.text.strip():
+                title = element.text.strip()
+            elif tag == TEI_NS + "author" and author is None and element.text and element.text.strip():
+                author = element.text.strip()
+            elif tag == TEI_NS + "teiHeader":
+                break
+    except ElementTree.ParseError:
+        # Malformed files: keep whatever was read before the error
+        pass
+    return title, author
+
+
+def corpus_signature(xml_files):
+    """Names and sizes of the corpus files, to tell when an index is stale"""
+    return sorted([path.name, path.stat().st_size] for path in xml_files)
+
+
+class _Groups:
+    """Union-find over alias keys"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key):
+        self.parent.setdefault(key, key)
+        while self.parent[key] != key:
+            self.parent[key] = self.parent[self.parent[key]]
+            key = self.parent[key]
+        return key
+
+    def union(self, keys):
+        keys = [key for key in keys if key]
+        for key in keys[1:]:
+            self.parent[self.find(key)] = self.find(keys[0])
+        if keys:
+            self.find(keys[0])
+
+
+def _usable(name):
+    return name and name != "unknown" and alias_key(name)
+
+
+class AliasIndex:
+    """Alias key -> canonical id per kind, with display names and each id's aliases"""
+
+    def __init__(self, data):
+        self.data = data
+        self.keys = {kind: {} for kind in KINDS}
+        self.blocks = {kind: {} for kind in KINDS}
+        for kind in KINDS:
+            for canonical_id, entry in data[kind].items():
+                for key in entry["aliases"]:
+                    self.keys[kind][key] = canonical_id
+                    self.blocks[kind].setdefault(key[:1], []).append(key)
+
+    @classmethod
+    def build(cls, xml_files, extra_aliases=()):
+        """Build the index from the headers and file names of xml_files.
+
+        extra_aliases are (kind, alias, name) triples that add an alias to
+        the group of name, e.g. ("work", "MBh", "Mahābhārata").
+        """
+        from make_dataset_openai_jsonl import SanskritTextProcessor
+
+        xml_files = sorted(xml_files)
+        parse_filename = SanskritTextProcessor(".").parse_filename
+        groups = {kind: _Groups() for kind in KINDS}
+        # Display-name candidates per key; header spellings count double
+        spellings = {kind: {} for kind in KINDS}
+        work_authors = Counter()
+
+        def observe(kind, names, header_names):
+            names = [name for name in names if _usable(name)]
+            groups[kind].union([alias_key(name) for name in names])
+            for name in names:
+                weight = 2 if name in header_names else 1
+                spellings[kind].setdefault(alias_key(name), Counter())[name] += weight
+
+        for path in xml_files:
+            file_metadata = parse_filename(path.name)
+            title, author = read_header(path)
+            # The extractor's work is the first word of the title
+            work = title.split()[0] if title else None
+            observe("author", [author, file_metadata["author"]], {author})
+            observe("work", [work, title, file_metadata["work"]], {work})
+            author_name = author if _usable(author) else file_metadata["author"]
+            work_name = work if _usable(work) else file_metadata["work"]
+            if _usable(author_name) and _usable(work_name):
+                work_authors[alias_key(work_name), alias_key(author_name)] += 1
+
+        for kind, alias, name in extra_aliases:
+            groups[kind].union([alias_key(name), alias_key(alias)])
+            spellings[kind].setdefault(alias_key(name), Counter())[name] += 0
+
+        data = {"version": 1, "corpus": corpus_signature(xml_files)}
+        roots = {}
+        for kind in KINDS:
+            members = {}
+            for key in groups[kind].parent:
+                members.setdefault(groups[kind].find(key), []).append(key)
+            entries = {}
+            for root, keys in members.items():
+                names = Counter()
+                for key in keys:
+                    names.update(spellings[kind].get(key, {}))
+                # Most common spelling, ties broken alphabetically for a stable id
+                name = min(names, key=lambda n: (-names[n], n)) if names else keys[0]
+                entries[alias_key(name)] = {"name": name, "aliases": sorted(keys)}
+                roots[kind, root] = alias_key(name)
+            data[kind] = dict(sorted(entries.items()))
+
+        for entry in data["work"].values():
+            authors = Counter()
+            for (work_key, author_key), count in work_authors.items():
+                if work_key in entry["aliases"]:
+                    authors[roots["author", groups["author"].find(author_key)]] += count
+            entry["author"] = min(authors, key=lambda a: (-authors[a], a)) if authors else None
+        return cls(data)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(f"{path}.tmp", path)
+
+    def is_current(self, xml_files):
+        return self.data.get("corpus") == corpus_signature(sorted(xml_files))
+
+    def __len__(self):
+        return sum(len(self.data[kind]) for kind in KINDS)
+
+    def resolve(self, kind, name):
+        """Canonical id of a name if its alias key is known, else None"""
+        if not name:
+            return None
+        return self.keys[kind].get(alias_key(name))
+
+    def match(self, kind, name, threshold=FUZZY_THRESHOLD):
+        """Like resolve(), falling back to the closest key with the same first letter"""
+        canonical_id = self.resolve(kind, name)
+        if canonical_id is not None or not name:
+            return canonical_id
+        from rapidfuzz import fuzz, process
+
+        key = alias_key(name)
+        best = process.extractOne(key, self.blocks[kind].get(key[:1], []), scorer=fuzz.WRatio,
+                                  score_cutoff=threshold)
+        return self.keys[kind][best[0]] if best else None
+
+    def name(self, kind, canonical_id):
+        return self.data[kind][canonical_id]["name"]
+
+    def aliases(self, kind, canonical_id):
+        return self.data[kind][canonical_id]["aliases"]
+
+
+def read_alias_file(path):
+    """(kind, alias, name) triples from a TSV with one "kind<TAB>alias<TAB>name" per line"""
+    triples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip() and not line.startswith("#"):
+                kind, alias, name = line.rstrip("\n").split("\t")
+                if kind not in KINDS:
+                    raise ValueError(f"{path}: unknown kind {kind!r}, expected one of {KINDS}")
+                triples.append((kind, alias, name))
+    return triples
+
+
+def load_or_build(data_path, path=DEFAULT_INDEX_PATH, alias_file=None):
+    """The saved index if it matches the corpus in data_path, else a freshly built and saved one"""
+    xml_files = sorted(Path(data_path).glob("*.xml"))
+    if os.path.exists(path):
+        index = AliasIndex.load(path)
+        if index.is_current(xml_files):
+            return index
+    index = AliasIndex.build(xml_files, read_alias_file(alias_file) if alias_file else ())
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the author/work alias index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the index from a directory of GRETIL XML files")
+    build.add_argument("data_path")
+    build.add_argument("-o", "--output", default=DEFAULT_INDEX_PATH)
+    build.add_argument("--aliases", default=None, help="TSV of extra kind/alias/name lines, e.g. abbreviations")
+
+    resolve = subparsers.add_parser("resolve", help="Print the canonical id and name of some names")
+    resolve.add_argument("kind", choices=KINDS)
+    resolve.add_argument("names", nargs="+")
+    resolve.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        xml_files = sorted(Path(args.data_path).glob("*.xml"))
+        index = AliasIndex.build(xml_files, read_alias_file(args.aliases) if args.aliases else ())
+        index.save(args.output)
+        counts = {kind: (len(index.data[kind]), len(index.keys[kind])) for kind in KINDS}
+        print(f"Indexed {len(xml_files)} files in {time.perf_counter() - start:.2f}s: "
+              + ", ".join(f"{n} {kind}s ({k} aliases)" for kind, (n, k) in counts.items())
+              + f" -> {args.output}")
+    else:
+        index = AliasIndex.load(args.index)
+        for name in args.names:
+            exact = index.resolve(args.kind, name)
+            canonical_id = exact or index.match(args.kind, name)
+            if canonical_id is None:
+                print(f"{name}: unknown (key {alias_key(name)!r})")
+            else:
+                how = "alias" if exact else "fuzzy"
+                print(f"{name}: {canonical_id} ({index.name(args.kind, canonical_id)}, {how})")
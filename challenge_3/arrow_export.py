@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from record_store import iter_records
+
+# Arrow / Hugging Face datasets export of the quote identification records.
+#
+# The generator writes JSONL, so every analysis over a regenerated corpus
+# starts by parsing all of it. This writes the splits as a DatasetDict with an
+# explicit schema instead: expected_answer and metadata (with its nested
+# chapter_info) are structs, and the optional words/lemmas from segmentation
+# are lists of strings. datasets.load_from_disk() memory-maps the Arrow files,
+# so filtering and evaluation run column-wise on the mapped data, with no JSON
+# parsing.
+#
+#   python arrow_export.py --output-dir sanskrit_dataset_output/arrow
+#   python make_dataset_openai_jsonl.py --arrow-output sanskrit_dataset_output/arrow
+#
+#   >>> from datasets import load_from_disk
+#   >>> ds = load_from_disk("sanskrit_dataset_output/arrow")
+#   >>> ds["train"].filter(lambda d: [x == "hard" for x in d], input_columns="difficulty", batched=True)
+
+DEFAULT_DATA_DIR = "sanskrit_dataset_output"
+DEFAULT_OUTPUT_DIR = "sanskrit_dataset_output/arrow"
+# Split name -> the name used in the generator's file names
+SPLIT_FILES = {"train": "train", "validation": "val", "test": "test"}
+
+
+def latest_splits(data_dir=DEFAULT_DATA_DIR):
+    """The train/val/test files of the most recent generator run in data_dir"""
+    train_files = sorted(Path(data_dir).glob("sanskrit_quote_id_train_*.jsonl"), key=lambda p: p.stat().st_mtime)
+    if not train_files:
+        raise FileNotFoundError(f"No training files found in {data_dir}")
+    timestamp = train_files[-1].stem[len("sanskrit_quote_id_train_"):]
+    return {name: Path(data_dir) / f"sanskrit_quote_id_{part}_{timestamp}.jsonl" for name, part in SPLIT_FILES.items()}
+
+
+def schema():
+    """Arrow schema of every column a quote record can have, in column order"""
+    from datasets import Value
+
+    return {
+        "id": Value("string"),
+        "messages": [{"role": Value("string"), "content": Value("string")}],
+        "quote": Value("string"),
+        "quote_type": Value("string"),
+        "meter": Value("string"),
+        "difficulty": Value("string"),
+        "expected_answer": {
+            "author": Value("string"),
+            "work": Value("string"),
+            "book": Value("string"),
+            "chapter": Value("string"),
+            "verse": Value("string"),
+            "confidence": Value("float64"),
+        },
+        "metadata": {
+            "filename": Value("string"),
+            "segment_id": Value("string"),
+            "chapter_info": {"book": Value("string"), "chapter": Value("string"), "section": Value("string")},
+            "text_length": Value("int64"),
+            # Canonical ids from alias_index.py
+            "author_id": Value("string"),
+            "work_id": Value("string"),
+        },
+        "answer_aliases": {"author": [Value("string")], "work": [Value("string")]},
+        # locations.py: integer path, the item's own labels and the levels' label offsets
+        "location": {"path": [Value("int64")], "labels": [Value("string")], "offsets": [Value("int64")]},
+        # Added by segmentation.add_tokens (--segment-words)
+        "words": [Value("string")],
+        "lemmas": [Value("string")],
+    }
+
+
+def features_for(columns):
+    """Features for the schema columns present in the records"""
+    from datasets import Features
+
+    full = schema()
+    unknown = set(columns) - set(full)
+    if unknown:
+        raise ValueError(f"No Arrow schema for record fields: {sorted(unknown)}")
+    return Features({name: feature for name, feature in full.items() if name in columns})
+
+
+def _rows(path, columns):
+    for record in iter_records(path):
+        yield {column: record.get(column) for column in columns}
+
+
+def export_arrow(splits, output_dir=DEFAULT_OUTPUT_DIR):
+    """Save splits (name -> JSONL path or list of records) as a DatasetDict.
+
+    JSONL files are streamed into Arrow rather than loaded, so this also works
+    for corpora that don't fit in memory. Returns the row count per split.
+    """
+    from datasets import Dataset, DatasetDict
+
+    columns = set()
+    for source in splits.values():
+        records = iter_records(source) if isinstance(source, (str, os.PathLike)) else source
+        for record in records:
+            columns.update(record)
+    features = features_for(columns)
+    columns = list(features)
+
+    # A private cache dir, so a regenerated file is never served from a stale cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        dataset = DatasetDict()
+        for name, source in splits.items():
+            if isinstance(source, (str, os.PathLike)):
+                dataset[name] = Dataset.from_generator(_rows, gen_kwargs={"path": str(source), "columns": columns},
+                                                       features=features, cache_dir=cache_dir)
+            else:
+                dataset[name] = Dataset.from_list([{column: record.get(column) for column in columns}
+                                                   for record in source], features=features)
+        dataset.save_to_disk(output_dir)
+    return {name: split.num_rows for name, split in dataset.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the quote JSONL splits as an Arrow DatasetDict")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR,
+                        help="Take the most recent train/val/test files from this directory")
+    for name in SPLIT_FILES:
+        parser.add_argument(f"--{name}", default=None, help=f"JSONL file for the {name} split")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args()
+
+    splits = latest_splits(args.data_dir) if not all(getattr(args, name) for name in SPLIT_FILES) else {}
+    splits.update({name: getattr(args, name) for name in SPLIT_FILES if getattr(args, name)})
+    start = time.perf_counter()
+    counts = export_arrow(splits, args.output_dir)
+    print(f"Wrote {args.output_dir} in {time.perf_counter() - start:.2f}s: "
+          + ", ".join(f"{name} {count} rows" for name, count in counts.items()))
@@ -0,0 +1,219 @@
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Meter (chandas) classification for verse segments.
+#
+# Each verse is scanned into a guru (G) / laghu (L) string per line, and the
+# lines are then run through an automaton compiled once from the vidyut
+# `meters.tsv` pāda patterns. A GRETIL line usually holds two pādas, so the
+# automaton is allowed to restart at every accepting state, which finds the
+# pāda boundary without knowing it in advance.
+
+METERS_PATH = "../challenge_2/vidyut-0.4.0/chandas/meters.tsv"
+
+# meters.tsv only contains vṛtta meters. The śloka (anuṣṭubh) is by far the most
+# common meter in the corpus, so it is recognised by rule instead.
+ANUSHTUBH = "anuṣṭubh"
+
+LONG_VOWELS = {'ā', 'ī', 'ū', 'ṝ', 'ḹ', 'e', 'ai', 'o', 'au'}
+VOWELS = LONG_VOWELS | {'a', 'i', 'u', 'ṛ', 'ḷ'}
+CLOSING = {'ṃ', 'ṁ', 'ḥ'}  # anusvāra and visarga make the preceding syllable heavy
+
+IAST_TOKEN = re.compile(
+    r"ai|au|kh|gh|ch|jh|ṭh|ḍh|th|dh|ph|bh|"
+    r"[aāiīuūṛṝḷḹeo]|[kgṅcjñṭḍṇtdnpbmyrlvśṣsh]|[ṃṁḥ]"
+)
+# Verse references such as "// Rmañj_6.62 //" or "MBh_1.1"
+REFERENCE = re.compile(r"\S*[_\d]\S*")
+
+SLP1_TO_IAST = {
+    'A': 'ā', 'I': 'ī', 'U': 'ū', 'f': 'ṛ', 'F': 'ṝ', 'x': 'ḷ', 'X': 'ḹ',
+    'E': 'ai', 'O': 'au', 'K': 'kh', 'G': 'gh', 'N': 'ṅ', 'C': 'ch', 'J': 'jh',
+    'Y': 'ñ', 'w': 'ṭ', 'W': 'ṭh', 'q': 'ḍ', 'Q': 'ḍh', 'R': 'ṇ', 'T': 'th',
+    'D': 'dh', 'P': 'ph', 'B': 'bh', 'S': 'ś', 'z': 'ṣ', 'M': 'ṃ', 'H': 'ḥ',
+}
+
+
+def slp1_to_iast(text: str) -> str:
+    """Transliterate the SLP1 meter names in meters.tsv to IAST"""
+    return ''.join(SLP1_TO_IAST.get(ch, ch) for ch in text)
+
+
+@lru_cache(maxsize=65536)
+def scan_line(line: str) -> str:
+    """Return the guru/laghu pattern of an IAST line, e.g. 'GLGGLLGL'"""
+    text = unicodedata.normalize('NFC', REFERENCE.sub(' ', line.lower()))
+    tokens = IAST_TOKEN.findall(text)
+
+    weights = []
+    for i, token in enumerate(tokens):
+        if token not in VOWELS:
+            continue
+        heavy = token in LONG_VOWELS
+        if not heavy:
+            consonants = 0
+            for following in tokens[i + 1:]:
+                if following in VOWELS:
+                    break
+                if following in CLOSING:
+                    heavy = True
+                    break
+                consonants += 1
+                if consonants >= 2:
+                    heavy = True
+                    break
+        weights.append('G' if heavy else 'L')
+    return ''.join(weights)
+
+
+def is_anushtubh_pada_pair(pattern: str) -> bool:
+    """Check the śloka rule for a 16-syllable half-verse"""
+    if len(pattern) != 16:
+        return False
+    odd, even = pattern[:8], pattern[8:]
+    # The even pāda always ends in a light-heavy-light 5th-7th syllable. The
+    # odd pāda is usually pathyā (light-heavy-heavy), but the vipulā variants
+    # allow anything there except the even pāda's own cadence.
+    return even[4:7] == 'LGL' and odd[4:7] != 'LGL'
+
+
+class MeterAutomaton:
+    """Trie automaton over guru/laghu pāda patterns"""
+
+    def __init__(self):
+        # transitions[state] = [next state on L, next state on G], -1 = dead
+        self.transitions: List[List[int]] = [[-1, -1]]
+        self.accepting: Dict[int, List[str]] = {}
+
+    def _add(self, pattern: str, meter: str):
+        state = 0
+        for ch in pattern:
+            bit = 1 if ch == 'G' else 0
+            nxt = self.transitions[state][bit]
+            if nxt < 0:
+                nxt = len(self.transitions)
+                self.transitions.append([-1, -1])
+                self.transitions[state][bit] = nxt
+            state = nxt
+        names = self.accepting.setdefault(state, [])
+        if meter not in names:
+            names.append(meter)
+
+    def add_pada(self, pattern: str, meter: str):
+        """Add a pāda pattern; its last syllable is anceps (may be G or L)"""
+        pattern = pattern.replace('|', '')
+        if len(pattern) < 4:
+            # One- to three-syllable meters would match almost any prose fragment
+            return
+        self._add(pattern[:-1] + 'G', meter)
+        self._add(pattern[:-1] + 'L', meter)
+
+    def match(self, pattern: str, start: int = 0) -> List[Tuple[int, List[str]]]:
+        """Return (end, meters) for every pāda that matches pattern[start:end]"""
+        matches = []
+        state = 0
+        for pos in range(start, len(pattern)):
+            state = self.transitions[state][1 if pattern[pos] == 'G' else 0]
+            if state < 0:
+                break
+            if state in self.accepting:
+                matches.append((pos + 1, self.accepting[state]))
+        return matches
+
+    def match_line(self, pattern: str, max_padas: int = 2) -> List[str]:
+        """Meters whose pādas tile the whole line (a GRETIL line holds one or two pādas)"""
+        # Breadth-first over pāda boundaries; the meter set is intersected so
+        # that every pāda on the line belongs to the same meter.
+        frontier = {0: None}
+        found: List[str] = []
+        for _ in range(max_padas):
+            next_frontier = {}
+            for start, meters in frontier.items():
+                for end, names in self.match(pattern, start):
+                    candidates = set(names) if meters is None else meters & set(names)
+                    if not candidates:
+                        continue
+                    if end == len(pattern):
+                        found.extend(m for m in candidates if m not in found)
+                    else:
+                        merged = next_frontier.get(end)
+                        next_frontier[end] = candidates if merged is None else merged | candidates
+            frontier = next_frontier
+        return found
+
+
+_automaton: Optional[MeterAutomaton] = None
+
+
+def load_meter_automaton(meters_path: str = METERS_PATH) -> MeterAutomaton:
+    """Compile (once per process) the automaton from meters.tsv"""
+    global _automaton
+    if _automaton is not None:
+        return _automaton
+
+    automaton = MeterAutomaton()
+    path = Path(meters_path)
+    if path.exists():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 3:
+                    continue
+                name = slp1_to_iast(fields[0])
+                # Ardhasama/viṣama meters list one pattern per pāda, separated by '/'
+                for pada in fields[2].split('/'):
+                    automaton.add_pada(pada, name)
+    else:
+        print(f"Warning: {meters_path} not found, only anuṣṭubh will be detected")
+
+    _automaton = automaton
+    return automaton
+
+
+def classify_verse(text: str, automaton: Optional[MeterAutomaton] = None) -> str:
+    """Classify the meter of a verse segment, or return 'unknown'"""
+    automaton = automaton or load_meter_automaton()
+
+    lines = [scan_line(part) for part in text.split('/')]
+    lines = [line for line in lines if line]
+    if not lines:
+        return 'unknown'
+
+    votes: Dict[str, int] = {}
+    for line in lines:
+        if is_anushtubh_pada_pair(line):
+            votes[ANUSHTUBH] = votes.get(ANUSHTUBH, 0) + 1
+            continue
+        for meter in automaton.match_line(line):
+            votes[meter] = votes.get(meter, 0) + 1
+
+    if not votes:
+        return 'unknown'
+    meter, count = max(votes.items(), key=lambda kv: kv[1])
+    # Require at least half of the lines to agree before labelling the verse
+    return meter if count * 2 >= len(lines) else 'unknown'
+
+
+def classify_segments(segments: List[Dict]) -> List[Dict]:
+    """Pipeline stage: add a 'meter' attribute to every verse segment"""
+    automaton = load_meter_automaton()
+    for segment in segments:
+        if segment['type'] == 'verse':
+            segment['meter'] = classify_verse(segment['text'], automaton)
+        else:
+            segment['meter'] = None
+    return segments
+
+
+if __name__ == "__main__":
+    import sys
+
+    automaton = load_meter_automaton()
+    print(f"Compiled {len(automaton.transitions)} automaton states")
+    for verse in sys.argv[1:] or [
+        "evaṃ punaḥ punar gandhaṃ dattvā dattvā bhiṣagvaraḥ / / samyak kurvīta sūtasya devi ṣaḍguṇajāraṇam // Rmañj_2.6 //",
+    ]:
+        print(classify_verse(verse, automaton), '<-', verse)
@@ -0,0 +1,276 @@
+import zlib
+
+# Integer-coded hierarchical locations of quotes.
+#
+# The librarian grader scores verse proximity with the first number in the
+# expected and model verse strings. For fallback ids such as verse_12, which
+# count verse groups across the whole file, or ids with a file number in
+# them, that number isn't a position in the chapter at all. Instead, the
+# extractor gives every segment its ordinals in document order,
+#
+#   [book, chapter, verse]   1-based; chapters count within their book and
+#                            verses within their chapter
+#
+# and the generator turns them into each item's location:
+#
+#   path       [work code, book, chapter, verse] as integers
+#   labels     the item's own book, chapter and verse labels, as in its
+#              expected_answer
+#   offsets    per level, label - ordinal when every label at that level of
+#              the item's book or chapter is the integer ordinal + offset,
+#              else None
+#
+# A model answer is mapped onto the same path label by label: the item's own
+# label gives its own ordinal (verse labels can repeat within a chapter, so
+# only this mapping is certain), an integer label on a consistently numbered
+# level gives label - offset, and anything else -1. The credit is
+# hierarchical: LEVEL_CREDIT[k] for k matching leading levels, plus a share
+# of the next step that decays with the ordinal distance at the first
+# differing level. grade_location_batch() scores a whole batch of the
+# location grader's outputs with that credit computed over NumPy arrays:
+#
+#   python locations.py sanskrit_dataset_output/sanskrit_quote_id_complete_*.jsonl --rollouts rollouts.jsonl
+#
+# checks its scores against the grader's grade() item by item and times both.
+
+# The levels and the scalar credit, as source text: the location grader in
+# openai_rl_job.py runs on OpenAI's side and includes this text, and this
+# module runs it for its own definitions
+CREDIT_SOURCE = r'''
+LEVELS = ("work", "book", "chapter", "verse")
+# Credit for 0..4 matching leading levels
+LEVEL_CREDIT = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+
+def label_key(label):
+    """Labels compare like the grader's normalize_string"""
+    return str(label).lower().strip() if label else ""
+
+
+def label_ordinal(location, level, label):
+    """The ordinal of a model label at level 1..3 (book, chapter, verse), -1 where it can't be placed"""
+    key = label_key(label)
+    if not key:
+        return -1
+    if key == label_key(location["labels"][level - 1]):
+        return location["path"][level]
+    offset = location["offsets"][level - 1]
+    if offset is not None and key.isdecimal():
+        ordinal = int(key) - offset
+        return ordinal if ordinal >= 1 else -1
+    return -1
+
+
+def model_path(location, work_matches, book, chapter, verse):
+    """The model's answer as a path comparable with location["path"]; -1 where it can't be placed"""
+    return [location["path"][0] if work_matches else -1] + [
+        label_ordinal(location, level, label) for level, label in enumerate((book, chapter, verse), 1)
+    ]
+
+
+def hierarchical_credit(expected, model):
+    """Credit in [0, 1] for a model path against the expected path"""
+    k = 0
+    while k < len(LEVELS) and model[k] == expected[k]:
+        k += 1
+    credit = LEVEL_CREDIT[k]
+    if 0 < k < len(LEVELS) and model[k] >= 0:
+        credit += (LEVEL_CREDIT[k + 1] - LEVEL_CREDIT[k]) / (1 + abs(model[k] - expected[k]))
+    return credit
+
+
+# Weights as in the librarian grader: author 2.0, work + book + chapter +
+# verse 10.0 for the location, confidence 0.5 (its credit is 0.5 at most)
+AUTHOR_WEIGHT = 2.0
+LOCATION_WEIGHT = 10.0
+LOCATION_MAX_SCORE = 12.5
+
+
+def location_score(author_credit, location_credit, confidence_credit):
+    """The location grader's score from its author, location and confidence credits"""
+    return max(0.0, min((AUTHOR_WEIGHT * author_credit + LOCATION_WEIGHT * location_credit + confidence_credit)
+                        / LOCATION_MAX_SCORE, 1.0))
+'''
+
+exec(CREDIT_SOURCE)
+
+
+def work_code(work_key):
+    """Stable non-negative integer for a canonical work id or alias key"""
+    return zlib.crc32(str(work_key).encode("utf-8")) & 0x7FFFFFFF
+
+
+def encode_locations(segments, positions):
+    """Set segment["location"] = [book, chapter, verse] ordinals, numbered in document order.
+
+    positions[i] is the document position of segments[i]'s element; the
+    segments themselves are left in their order.
+    """
+    books = {}
+    chapters = {}
+    chapter_counts = {}
+    verse_counts = {}
+    for i in sorted(range(len(segments)), key=positions.__getitem__):
+        info = segments[i]["chapter"]
+        book = books.setdefault(info["book"], len(books) + 1)
+        chapter = chapters.get((book, info["chapter"]))
+        if chapter is None:
+            chapter = chapters[book, info["chapter"]] = chapter_counts[book] = chapter_counts.get(book, 0) + 1
+        verse = verse_counts[book, chapter] = verse_counts.get((book, chapter), 0) + 1
+        segments[i]["location"] = [book, chapter, verse]
+    return segments
+
+
+def label_offset(table):
+    """label - ordinal if every label of an ordinal -> label table is that integer, else None"""
+    offsets = set()
+    for ordinal, label in table.items():
+        key = label_key(label)
+        if not key.isdecimal():
+            return None
+        offsets.add(int(key) - ordinal)
+        if len(offsets) > 1:
+            return None
+    return offsets.pop() if offsets else None
+
+
+class LocationTables:
+    """Ordinal -> label tables per file, from all the segments extracted from it"""
+
+    def __init__(self, segments, verse_label):
+        self.verse_label = verse_label
+        self.books = {}
+        self.chapters = {}
+        self.verses = {}
+        for segment in segments:
+            if "location" not in segment:
+                continue
+            filename = segment["metadata"]["filename"]
+            book, chapter, verse = segment["location"]
+            self.books.setdefault(filename, {}).setdefault(book, segment["chapter"]["book"])
+            self.chapters.setdefault((filename, book), {}).setdefault(chapter, segment["chapter"]["chapter"])
+            self.verses.setdefault((filename, book, chapter), {}).setdefault(verse, verse_label(segment))
+        # label_offset() per level and table, computed on first use
+        self._offsets = ({}, {}, {})
+
+    def _offset(self, level, key):
+        offsets = self._offsets[level]
+        if key not in offsets:
+            offsets[key] = label_offset((self.books, self.chapters, self.verses)[level][key])
+        return offsets[key]
+
+    def item_location(self, segment, work_key):
+        """The location stored with an item, or None for a segment without ordinals"""
+        if "location" not in segment:
+            return None
+        filename = segment["metadata"]["filename"]
+        book, chapter, verse = segment["location"]
+        return {
+            "path": [work_code(work_key), book, chapter, verse],
+            "labels": [segment["chapter"]["book"], segment["chapter"]["chapter"], self.verse_label(segment)],
+            "offsets": [self._offset(0, filename), self._offset(1, (filename, book)),
+                        self._offset(2, (filename, book, chapter))],
+        }
+
+
+def hierarchical_credit_batch(expected, model):
+    """hierarchical_credit() for (n, 4) integer arrays of expected and model paths, bit-for-bit"""
+    import numpy as np
+
+    expected = np.asarray(expected, dtype=np.int64).reshape(-1, len(LEVELS))
+    model = np.asarray(model, dtype=np.int64).reshape(-1, len(LEVELS))
+    credits = np.asarray(LEVEL_CREDIT, dtype=np.float64)
+    differs = expected != model
+    # Matching leading levels: index of the first difference, 4 if there is none
+    k = np.where(differs.any(axis=1), differs.argmax(axis=1), len(LEVELS))
+    level = np.minimum(k, len(LEVELS) - 1)
+    rows = np.arange(len(k))
+    m = model[rows, level]
+    partial = (credits[np.minimum(k + 1, len(LEVELS))] - credits[k]) / (1 + np.abs(m - expected[rows, level]))
+    return np.where((k > 0) & (k < len(LEVELS)) & (m >= 0), credits[k] + partial, credits[k])
+
+
+def grade_location_batch(location_answer, pairs):
+    """The location grader's scores for a list of (sample, item) pairs, equal to its grade() for each.
+
+    location_answer is the function of that name from the grader source
+    (openai_rl_job.LOCATION_GRADER_SOURCE). It parses each output in Python;
+    the hierarchical credit and the weighted score of the whole batch are
+    then computed over arrays.
+    """
+    import numpy as np
+
+    rows, author_credit, expected, model, confidence_credit = [], [], [], [], []
+    for row, (sample, item) in enumerate(pairs):
+        try:
+            answer = location_answer(sample, item)
+        except Exception:
+            # grade() scores an output it can't handle 0.0
+            continue
+        if answer is None:
+            continue
+        rows.append(row)
+        author_credit.append(answer[0])
+        expected.append(answer[1])
+        model.append(answer[2])
+        confidence_credit.append(answer[3])
+
+    scores = np.zeros(len(pairs))
+    if rows:
+        location_credit = hierarchical_credit_batch(expected, model)
+        weighted = (AUTHOR_WEIGHT * np.asarray(author_credit, dtype=np.float64) + LOCATION_WEIGHT * location_credit
+                    + np.asarray(confidence_credit, dtype=np.float64)) / LOCATION_MAX_SCORE
+        scores[rows] = np.clip(weighted, 0.0, 1.0)
+    return scores.tolist()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+    import sys
+    import time
+
+    # Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+    from openai_rl_job import LOCATION_GRADER_SOURCE
+    from record_store import iter_records
+
+    parser = argparse.ArgumentParser(description="Score location-grader rollouts in one batch and check the "
+                                                 "scores against grade()")
+    parser.add_argument("items", help="Dataset JSONL with location fields")
+    parser.add_argument("--rollouts", default=None,
+                        help="JSONL with output_text and item or item_index per line, as for grading_cache.py "
+                             "(default: each item's own expected answer)")
+    args = parser.parse_args()
+
+    items = list(iter_records(args.items))
+    if args.rollouts:
+        rollouts = list(iter_records(args.rollouts))
+        pairs = [({"output_text": r["output_text"]}, r["item"] if "item" in r else items[r["item_index"]])
+                 for r in rollouts]
+    else:
+        pairs = [({"output_text": json.dumps(item["expected_answer"], ensure_ascii=False)}, item) for item in items]
+
+    namespace = {}
+    exec(compile(LOCATION_GRADER_SOURCE, "<location grader>", "exec"), namespace)
+    # Import NumPy before the timed batch, as a grading process would have
+    import numpy
+    start = time.perf_counter()
+    expected_scores = [namespace["grade"](sample, item) for sample, item in pairs]
+    grade_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_scores = grade_location_batch(namespace["location_answer"], pairs)
+    batch_seconds = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected_scores, batch_scores)) if a != b]
+    print(f"{len(pairs)} outputs: grade() {1e6 * grade_seconds / max(len(pairs), 1):.2f}us each, "
+          f"batch {1e6 * batch_seconds / max(len(pairs), 1):.2f}us each "
+          f"({grade_seconds / batch_seconds if batch_seconds else 0:.2f}x); "
+          f"mean score {sum(batch_scores) / max(len(pairs), 1):.4f}")
+    if mismatches:
+        i = mismatches[0]
+        print(f"{len(mismatches)} scores differ from grade(), first at output {i}: "
+              f"{expected_scores[i]!r} != {batch_scores[i]!r}")
+        sys.exit(1)
+    print("All scores equal grade()")
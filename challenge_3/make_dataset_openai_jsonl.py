@@ -2,10 +2,21 @@ import os
 import json
 import re
 import random
+import sys
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime
 
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from alias_index import alias_key
+from chandas import ANUSHTUBH, classify_segments
+from instrumentation import metrics, profiled
+from locations import LocationTables, encode_locations
+from sharding import (check_shard_args, load_manifests, merge_shards, owns, write_output_manifest,
+                      write_shard)
+
 # Try to use lxml for better XML support, fall back to ElementTree
 try:
     from lxml import etree as ET
@@ -15,6 +26,8 @@ except ImportError:
     LXML_AVAILABLE = False
     print("Warning: lxml not available. Using xml.etree.ElementTree (some features may be limited)")
 
+VERSE_NUMBER_RE = re.compile(r'\d+')
+
 class SanskritTextProcessor:
     """Process GRETIL XML files to extract quotes and metadata"""
     
@@ -60,34 +73,44 @@ class SanskritTextProcessor:
             'filename': filename
         }
     
+    def _parse_tree(self, xml_path: Path):
+        """Parse an XML file, returning None if it can't be parsed"""
+        # Try different parsing approaches
+        tree = None
+        
+        if LXML_AVAILABLE:
+            try:
+                # Try lxml first (more robust)
+                parser = ET.XMLParser(recover=True, encoding='utf-8')
+                tree = ET.parse(str(xml_path), parser)
+            except Exception as e:
+                print(f"lxml parsing failed for {xml_path.name}: {e}")
+        
+        if tree is None:
+            # Fallback to ElementTree
+            try:
+                tree = ET.parse(xml_path)
+            except ET.ParseError as e:
+                print(f"XML parsing error in {xml_path.name}: {e}")
+            except Exception as e:
+                print(f"Unexpected error parsing {xml_path.name}: {e}")
+        
+        return tree
+    
     def extract_text_segments(self, xml_path: Path) -> List[Dict]:
         """Extract text segments from XML file with hierarchical structure"""
         try:
-            # Try different parsing approaches
-            tree = None
-            
-            if LXML_AVAILABLE:
-                try:
-                    # Try lxml first (more robust)
-                    parser = ET.XMLParser(recover=True, encoding='utf-8')
-                    tree = ET.parse(str(xml_path), parser)
-                except Exception as e:
-                    print(f"lxml parsing failed for {xml_path.name}: {e}")
-            
+            with metrics.stage("xml_parse"):
+                tree = self._parse_tree(xml_path)
             if tree is None:
-                # Fallback to ElementTree
-                try:
-                    tree = ET.parse(xml_path)
-                except ET.ParseError as e:
-                    print(f"XML parsing error in {xml_path.name}: {e}")
-                    return []
-                except Exception as e:
-                    print(f"Unexpected error parsing {xml_path.name}: {e}")
-                    return []
+                return []
             
             root = tree.getroot()
             
             segments = []
+            # Document position of each element, and the element of each segment
+            positions = {element: i for i, element in enumerate(root.iter())}
+            segment_elements = []
             file_metadata = self.parse_filename(xml_path.name)
             
             # Extract title from header if available
@@ -129,6 +152,7 @@ class SanskritTextProcessor:
                         'chapter': self._extract_chapter_info(lg, root),
                         'metadata': file_metadata.copy()
                     })
+                    segment_elements.append(lg)
             
             # Process standalone lines (not in verse groups)
             processed_line_ids = set()
@@ -148,6 +172,7 @@ class SanskritTextProcessor:
                         'chapter': self._extract_chapter_info(line, root),
                         'metadata': file_metadata.copy()
                     })
+                    segment_elements.append(line)
             
             # Process paragraphs
             for i, p in enumerate(paragraphs):
@@ -159,8 +184,10 @@ class SanskritTextProcessor:
                         'chapter': self._extract_chapter_info(p, root),
                         'metadata': file_metadata.copy()
                     })
+                    segment_elements.append(p)
             
-            return segments
+            # [book, chapter, verse] ordinals in document order (see locations.py)
+            return encode_locations(segments, [positions[element] for element in segment_elements])
             
         except Exception as e:
             print(f"Error processing {xml_path}: {e}")
@@ -168,6 +195,11 @@ class SanskritTextProcessor:
     
     def _extract_chapter_info(self, element, root=None) -> Dict[str, str]:
         """Extract chapter/section information from element context"""
+        with metrics.stage("chapter_lookup"):
+            return self._lookup_chapter_info(element, root)
+    
+    def _lookup_chapter_info(self, element, root=None) -> Dict[str, str]:
+        """Walk the div ancestors of an element to find its book/chapter/section"""
         chapter_info = {
             'book': 'unknown',
             'chapter': 'unknown',
@@ -216,29 +248,84 @@ class SanskritTextProcessor:
                 return True
         return False
 
+MAX_XML_FILES = 10
+SHARD_PREFIX = "sanskrit_quote_segments"
+
+def list_xml_files(data_path: str) -> List[Path]:
+    """The XML files a run processes, in a fixed order.
+
+    Sorted by name rather than in directory order, so every machine (and
+    every shard) agrees on which files are in the run and which shard owns
+    which file.
+    """
+    xml_files = sorted(Path(data_path).glob('*.xml'))[:MAX_XML_FILES]  # Hard limit to 10 files
+    print(f"Found {len(xml_files)} XML files, processing first {MAX_XML_FILES}")
+    return xml_files
+
+def iter_file_segments(data_path: str, shard_index: int = 0, num_shards: int = 1):
+    """((file position, segment position), segment) for the files a shard owns, in run order"""
+
+    check_shard_args(shard_index, num_shards)
+    processor = SanskritTextProcessor(data_path)
+    xml_files = list_xml_files(data_path)
+    owned = [i for i in range(len(xml_files)) if owns(i, shard_index, num_shards)]
+    
+    # Process each XML file, with rate-limited progress instead of a line per file
+    for done, i in enumerate(owned):
+        segments = processor.extract_text_segments(xml_files[i])
+        for j, segment in enumerate(segments):
+            yield (i, j), segment
+        metrics.count("xml_files")
+        metrics.count("segments", len(segments))
+        metrics.progress(done + 1, len(owned), unit="files")
+    metrics.progress(len(owned), len(owned), unit="files", force=True)
+
+def shard_run_spec(data_path: str) -> Dict:
+    """What determines the extracted segments, recorded in shard manifests"""
+    return {
+        "generator": "challenge_3/make_dataset_openai_jsonl.py",
+        "files": [path.name for path in list_xml_files(data_path)],
+        "lxml": LXML_AVAILABLE,
+    }
+
 def generate_quote_identification_dataset(data_path: str, 
                                         min_quote_length: int = 10,
                                         max_quote_length: int = 200,
-                                        num_samples: int = 1000) -> List[Dict]:
+                                        num_samples: int = 1000,
+                                        stratify_by_meter: bool = False,
+                                        seed: int = 42,
+                                        alias_index=None,
+                                        segment_words: bool = False,
+                                        vidyut_data_path: Optional[str] = None) -> List[Dict]:
     """Generate dataset for Sanskrit quote identification task"""
-    
-    processor = SanskritTextProcessor(data_path)
-    data_dir = Path(data_path)
-    
-    # Find all XML files and limit to 10
-    xml_files = list(data_dir.glob('*.xml'))[:10]  # Hard limit to 10 files
-    print(f"Found {len(xml_files)} XML files, processing first 10")
-    
-    all_segments = []
-    
-    # Process each XML file
-    for xml_file in xml_files:
-        print(f"Processing {xml_file.name}...")
-        segments = processor.extract_text_segments(xml_file)
-        all_segments.extend(segments)
-    
+    all_segments = [segment for _, segment in iter_file_segments(data_path)]
+    return build_quote_entries(all_segments, min_quote_length, max_quote_length, num_samples,
+                               stratify_by_meter, seed, alias_index, segment_words, vidyut_data_path)
+
+def build_quote_entries(all_segments: List[Dict],
+                        min_quote_length: int = 10,
+                        max_quote_length: int = 200,
+                        num_samples: int = 1000,
+                        stratify_by_meter: bool = False,
+                        seed: int = 42,
+                        alias_index=None,
+                        segment_words: bool = False,
+                        vidyut_data_path: Optional[str] = None) -> List[Dict]:
+    """Filter, classify and sample extracted segments into dataset entries.
+
+    Sampling uses its own Random(seed), so the same segments always give
+    the same entries, whether they were extracted in one run or merged
+    from shards. With an alias_index.AliasIndex, authors and works are
+    normalized to their canonical names and every entry gets the alias
+    keys the grader accepts for them. segment_words adds the words and
+    lemmas of every quote (segmentation.py), using the cheda data in
+    vidyut_data_path.
+    """
     print(f"Extracted {len(all_segments)} text segments total")
     
+    # Ordinal -> label tables over every segment, before any are filtered out
+    location_tables = LocationTables(all_segments, lambda segment: extract_verse_number(segment['id']))
+    
     # Filter segments by length
     valid_segments = [
         seg for seg in all_segments 
@@ -247,11 +334,20 @@ def generate_quote_identification_dataset(data_path: str,
     
     print(f"Found {len(valid_segments)} segments within length range")
     
+    # Classify the meter of every verse segment
+    with metrics.stage("meter_classification"):
+        classify_segments(valid_segments)
+    
     # Sample quotes for dataset
-    if len(valid_segments) > num_samples:
-        sampled_segments = random.sample(valid_segments, num_samples)
-    else:
-        sampled_segments = valid_segments
+    rng = random.Random(seed)
+    with metrics.stage("sampling"):
+        if len(valid_segments) > num_samples:
+            if stratify_by_meter:
+                sampled_segments = stratified_sample(valid_segments, num_samples, key='meter', rng=rng)
+            else:
+                sampled_segments = rng.sample(valid_segments, num_samples)
+        else:
+            sampled_segments = valid_segments
     
     # System message for the task
     system_message = """You are an expert Sanskrit librarian and scholar. Your task is to identify the source of Sanskrit text quotes from the GRETIL digital library corpus.
@@ -283,10 +379,20 @@ Now identify the source of this Sanskrit quote:"""
         # Create user input with the quote
         user_input = f'Sanskrit quote: "{segment["text"]}"'
         
+        author, work = segment['metadata']['author'], segment['metadata']['work']
+        canonical_ids = {}
+        if alias_index is not None:
+            for kind, name in (("author", author), ("work", work)):
+                canonical_id = alias_index.resolve(kind, name)
+                if canonical_id is not None:
+                    canonical_ids[kind] = canonical_id
+            author = alias_index.name("author", canonical_ids["author"]) if "author" in canonical_ids else author
+            work = alias_index.name("work", canonical_ids["work"]) if "work" in canonical_ids else work
+        
         # Create expected answer with cleaned verse number
         expected_answer = {
-            "author": segment['metadata']['author'],
-            "work": segment['metadata']['work'],
+            "author": author,
+            "work": work,
             "book": segment['chapter']['book'],
             "chapter": segment['chapter']['chapter'],
             "verse": extract_verse_number(segment['id']),
@@ -297,11 +403,13 @@ Now identify the source of this Sanskrit quote:"""
         difficulty = determine_difficulty(
             len(segment['text']),
             segment['metadata']['author'],
-            segment['metadata']['work']
+            segment['metadata']['work'],
+            segment.get('meter')
         )
         
         # Create JSONL entry
         jsonl_entry = {
+            "id": f"{segment['metadata']['filename']}#{segment['id']}",
             "messages": [
                 {
                     "role": "system",
@@ -314,6 +422,7 @@ Now identify the source of this Sanskrit quote:"""
             ],
             "quote": segment['text'],
             "quote_type": segment['type'],
+            "meter": segment.get('meter'),
             "difficulty": difficulty,
             "expected_answer": expected_answer,
             "metadata": {
@@ -323,9 +432,26 @@ Now identify the source of this Sanskrit quote:"""
                 "text_length": len(segment['text'])
             }
         }
+        location = location_tables.item_location(segment, canonical_ids.get("work") or alias_key(work))
+        if location is not None:
+            jsonl_entry["location"] = location
+        if alias_index is not None:
+            jsonl_entry["answer_aliases"] = {
+                kind: alias_index.aliases(kind, canonical_ids[kind]) if kind in canonical_ids else []
+                for kind in ("author", "work")
+            }
+            jsonl_entry["metadata"]["author_id"] = canonical_ids.get("author")
+            jsonl_entry["metadata"]["work_id"] = canonical_ids.get("work")
         
         jsonl_entries.append(jsonl_entry)
     
+    # Optional: split each quote into words and lemmas with the cheda model
+    if segment_words:
+        from segmentation import VIDYUT_DATA_PATH, add_tokens
+        with metrics.stage("segmentation"):
+            add_tokens(jsonl_entries, data_path=vidyut_data_path or VIDYUT_DATA_PATH)
+        metrics.count("segmented_quotes", len(jsonl_entries))
+    
     return jsonl_entries
 
 def extract_verse_number(verse_id: str) -> str:
@@ -333,18 +459,23 @@ def extract_verse_number(verse_id: str) -> str:
     if not verse_id:
         return "0"
     
-    # Use regex to find all numbers in the string
-    numbers = re.findall(r'\d+', verse_id)
+    # Only the first number is needed, so stop at the first match
+    match = VERSE_NUMBER_RE.search(verse_id)
     
-    # If we found numbers, return the first one, otherwise return "0"
-    return numbers[0] if numbers else "0"
+    # If we found a number, return it, otherwise return "0"
+    return match.group() if match else "0"
 
-def determine_difficulty(quote_length: int, author: str, work: str) -> str:
+def determine_difficulty(quote_length: int, author: str, work: str,
+                         meter: Optional[str] = None) -> str:
     """Determine difficulty level based on quote characteristics"""
     # Easy: well-known authors, longer quotes
     if (author.lower() in ['abhinavagupta', 'kalidasa', 'bhartrhari', 'nagarjuna'] or
         quote_length > 100):
         return 'easy'
+    # A classical (non-śloka) meter narrows the search down to kāvya and stotra
+    # works, so short quotes in such meters are not as hard as plain ślokas
+    elif meter and meter not in ('unknown', ANUSHTUBH) and quote_length >= 30:
+        return 'medium'
     # Hard: unknown/generic metadata, very short quotes  
     elif (author == 'unknown' or work == 'unknown' or quote_length < 30):
         return 'hard'
@@ -352,9 +483,26 @@ def determine_difficulty(quote_length: int, author: str, work: str) -> str:
     else:
         return 'medium'
 
+def stratified_sample(segments: List[Dict], num_samples: int, key: str,
+                      rng: random.Random = random) -> List[Dict]:
+    """Sample segments so that every value of segment[key] is represented proportionally"""
+    strata: Dict[str, List[Dict]] = {}
+    for seg in segments:
+        strata.setdefault(str(seg.get(key)), []).append(seg)
+    
+    sampled = []
+    for value in sorted(strata):
+        group = strata[value]
+        # At least one sample per stratum, otherwise proportional to its size
+        quota = max(1, round(num_samples * len(group) / len(segments)))
+        sampled.extend(rng.sample(group, min(quota, len(group))))
+    
+    rng.shuffle(sampled)
+    return sampled[:num_samples]
+
 def write_jsonl_file(data: List[Dict], filename: str):
     """Write data to JSONL file"""
-    with open(filename, 'w', encoding='utf-8') as f:
+    with metrics.stage("serialization"), open(filename, 'w', encoding='utf-8') as f:
         for entry in data:
             f.write(json.dumps(entry, ensure_ascii=False) + '\n')
 
@@ -376,12 +524,15 @@ def split_dataset(data: List[Dict], train_ratio: float = 0.7,
     
     return train_data, val_data, test_data
 
-if __name__ == "__main__":
+def main(arrow_output=None, shard_index=None, num_shards=None, shard_dir="sanskrit_dataset_output/shards",
+         merge=False, data_path=None, segment_words=False, vidyut_data_path=None):
     # Configuration
-    DATA_PATH = "./gretil_data/"  # Path to your XML files
+    DATA_PATH = data_path or "./gretil_data/"  # Path to your XML files
     NUM_SAMPLES = 2000
     MIN_QUOTE_LENGTH = 15
     MAX_QUOTE_LENGTH = 300
+    STRATIFY_BY_METER = False  # Sample proportionally from each meter
+    ALIAS_INDEX_PATH = "sanskrit_dataset_output/alias_index.json"  # None to keep file/header names as they are
     
     # Check if data path exists
     if not os.path.exists(DATA_PATH):
@@ -392,18 +543,62 @@ if __name__ == "__main__":
     output_dir = Path("sanskrit_dataset_output")
     output_dir.mkdir(exist_ok=True)
     
-    print("Generating Sanskrit quote identification dataset...")
+    metrics.name = "challenge_3"
+    metrics.reset()
+    
+    if num_shards is not None:
+        # Extract only this shard's XML files; --merge builds the dataset later
+        print(f"Extracting segments for shard {shard_index} of {num_shards}...")
+        manifest = write_shard(shard_dir, SHARD_PREFIX, shard_index, num_shards,
+                               iter_file_segments(DATA_PATH, shard_index, num_shards), shard_run_spec(DATA_PATH))
+        print(f"  {manifest['records']} segments -> {Path(shard_dir) / manifest['file']} "
+              f"(sha256 {manifest['sha256'][:16]}...)")
+        return
     
-    # Generate dataset
-    dataset = generate_quote_identification_dataset(
-        DATA_PATH, 
-        min_quote_length=MIN_QUOTE_LENGTH,
-        max_quote_length=MAX_QUOTE_LENGTH,
-        num_samples=NUM_SAMPLES
-    )
+    print("Generating Sanskrit quote identification dataset...")
+    alias_index = None
+    if ALIAS_INDEX_PATH:
+        # Built from all corpus headers and file names on first use, rebuilt when the corpus changes
+        from alias_index import load_or_build
+        with metrics.stage("alias_index"):
+            alias_index = load_or_build(DATA_PATH, ALIAS_INDEX_PATH)
+        print(f"Alias index: {len(alias_index.data['author'])} authors, {len(alias_index.data['work'])} works "
+              f"({ALIAS_INDEX_PATH})")
+    if merge:
+        # Same filtering, classification and sampling as a single run, over the merged segments
+        print(f"Merging shards from {shard_dir}...")
+        dataset = build_quote_entries(
+            list(merge_shards(shard_dir, SHARD_PREFIX, shard_run_spec(DATA_PATH))),
+            min_quote_length=MIN_QUOTE_LENGTH,
+            max_quote_length=MAX_QUOTE_LENGTH,
+            num_samples=NUM_SAMPLES,
+            stratify_by_meter=STRATIFY_BY_METER,
+            alias_index=alias_index,
+            segment_words=segment_words,
+            vidyut_data_path=vidyut_data_path
+        )
+    else:
+        # Generate dataset
+        dataset = generate_quote_identification_dataset(
+            DATA_PATH, 
+            min_quote_length=MIN_QUOTE_LENGTH,
+            max_quote_length=MAX_QUOTE_LENGTH,
+            num_samples=NUM_SAMPLES,
+            stratify_by_meter=STRATIFY_BY_METER,
+            alias_index=alias_index,
+            segment_words=segment_words,
+            vidyut_data_path=vidyut_data_path
+        )
     
     print(f"Generated {len(dataset)} training examples")
     
+    # Count meter distribution over verse quotes
+    meter_counts = {}
+    for entry in dataset:
+        if entry['meter']:
+            meter_counts[entry['meter']] = meter_counts.get(entry['meter'], 0) + 1
+    print(f"Meter distribution: {meter_counts}")
+    
     # Count difficulty distribution
     difficulty_counts = {'easy': 0, 'medium': 0, 'hard': 0}
     for entry in dataset:
@@ -426,14 +621,72 @@ if __name__ == "__main__":
     # Write complete dataset
     write_jsonl_file(dataset, output_dir / f"sanskrit_quote_id_complete_{timestamp}.jsonl")
     
+    if merge:
+        outputs = [output_dir / f"sanskrit_quote_id_{name}_{timestamp}.jsonl"
+                   for name in ("train", "val", "test", "complete")]
+        write_output_manifest(outputs, Path(shard_dir) / f"merged_{timestamp}.manifest.json",
+                              shard_run_spec(DATA_PATH), len(load_manifests(shard_dir, SHARD_PREFIX, verify=False)))
+    
     print(f"\nDataset files created in '{output_dir}':")
     print(f"  Training: {len(train_data)} examples")
     print(f"  Validation: {len(val_data)} examples") 
     print(f"  Test: {len(test_data)} examples")
     print(f"  Complete: {len(dataset)} examples")
     print(f"  Timestamp: {timestamp}")
+
+    if arrow_output:
+        from arrow_export import export_arrow
+        with metrics.stage("arrow_export"):
+            export_arrow({"train": train_data, "validation": val_data, "test": test_data}, arrow_output)
+        print(f"  Arrow DatasetDict (datasets.load_from_disk): {arrow_output}")
     
     # Print sample entry
     if dataset:
         print(f"\nSample entry:")
         print(json.dumps(dataset[0], indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate the Sanskrit quote identification dataset")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], default=None,
+                        help="Run the generator under a profiler")
+    parser.add_argument("--profile-output", default=None, help="Where to save the profiler output")
+    parser.add_argument("--timing-output", default="sanskrit_dataset_output/timing.json",
+                        help="Where to write the JSON timing summary")
+    parser.add_argument("--arrow-output", default=None,
+                        help="Also save the splits as an Arrow DatasetDict in this directory")
+    parser.add_argument("--data-path", default=None, help="Directory of GRETIL XML files (default ./gretil_data/)")
+    parser.add_argument("--shard-index", type=int, default=None,
+                        help="Only extract the XML files of this shard (0-based), into --shard-dir")
+    parser.add_argument("--num-shards", type=int, default=None, help="Total number of shards")
+    parser.add_argument("--shard-dir", default="sanskrit_dataset_output/shards",
+                        help="Where shard files and manifests are written/read")
+    parser.add_argument("--merge", action="store_true",
+                        help="Build the dataset from the shards in --shard-dir instead of the XML files")
+    parser.add_argument("--segment-words", action="store_true",
+                        help="Add the words and lemmas of every quote (needs the vidyut kosha data)")
+    parser.add_argument("--vidyut-data", default=None,
+                        help="vidyut data directory for --segment-words (default ../challenge_2/vidyut-0.4.0/)")
+    args = parser.parse_args()
+    if (args.shard_index is None) != (args.num_shards is None):
+        parser.error("--shard-index and --num-shards go together")
+    if args.num_shards is not None and args.merge:
+        parser.error("--merge combines all shards; don't pass --shard-index/--num-shards with it")
+    if args.segment_words:
+        if args.num_shards is not None:
+            parser.error("--segment-words runs when the dataset is built; pass it with --merge instead")
+        # Checked up front rather than after extracting the whole corpus
+        from segmentation import VIDYUT_DATA_PATH, check_data
+        try:
+            check_data(args.vidyut_data or VIDYUT_DATA_PATH)
+        except FileNotFoundError as e:
+            parser.exit(1, f"{e}\n")
+
+    with profiled(args.profile, args.profile_output):
+        main(args.arrow_output, args.shard_index, args.num_shards, args.shard_dir, args.merge, args.data_path,
+             args.segment_words, args.vidyut_data)
+
+    metrics.print_summary()
+    metrics.write_summary(args.timing_output)
+    print(f"Timing summary written to {args.timing_output}")
@@ -1,13 +1,29 @@
 import os
-from openai import OpenAI
-from openai.types.fine_tuning import ReinforcementMethod, ReinforcementHyperparameters
+import sys
 from pathlib import Path
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+# Modules shared by both challenges (output parsing, sharding, record stores, ...) live in ../common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
 
-def upload_files(output_dir="sanskrit_dataset_output"):
-    """Upload the JSONL files to OpenAI"""
+from alias_index import ALIAS_KEY_SOURCE
+from locations import CREDIT_SOURCE
+from output_parsing import PARSER_SOURCE
+
+# The OpenAI SDK is imported, and OPENAI_API_KEY read, only when a job is
+# actually launched, so GRADER_SOURCE and the helpers below can be imported
+# for local grading without either
+_client = None
+
+def get_client():
+    """The OpenAI client, created on first use"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return _client
+
+def latest_split_files(output_dir="sanskrit_dataset_output"):
+    """Return the most recent training and validation files in output_dir"""
     
     output_path = Path(output_dir)
     
@@ -22,13 +38,20 @@ def upload_files(output_dir="sanskrit_dataset_output"):
     train_file = max(train_files, key=lambda x: x.stat().st_mtime)
     val_file = max(val_files, key=lambda x: x.stat().st_mtime)
     
+    return train_file, val_file
+
+def upload_files(output_dir="sanskrit_dataset_output"):
+    """Upload the JSONL files to OpenAI"""
+    
+    train_file, val_file = latest_split_files(output_dir)
+    
     print(f"Using training file: {train_file}")
     print(f"Using validation file: {val_file}")
     
     # Upload training file
     print("Uploading training file...")
     with open(train_file, "rb") as f:
-        training_file = client.files.create(
+        training_file = get_client().files.create(
             file=f,
             purpose="fine-tune"
         )
@@ -37,7 +60,7 @@ def upload_files(output_dir="sanskrit_dataset_output"):
     # Upload validation file
     print("Uploading validation file...")
     with open(val_file, "rb") as f:
-        validation_file = client.files.create(
+        validation_file = get_client().files.create(
             file=f,
             purpose="fine-tune"
         )
@@ -45,39 +68,77 @@ def upload_files(output_dir="sanskrit_dataset_output"):
     
     return training_file.id, validation_file.id
 
-# Define the custom grader for Sanskrit text identification
-from openai.types.graders import PythonGrader
+# Define the custom grader for Sanskrit text identification. Graders run on
+# OpenAI's side and can't import local modules, so every grader source is put
+# together from the source constants of output_parsing.py, alias_index.py and
+# locations.py, which those modules also run themselves, plus its own code
+GRADER_NAME = "Sanskrit Librarian Text Identification Grader"
+
+# Name comparison shared by both graders: alias_key() from alias_index.py,
+# then exact, alias and fuzzy matching of a normalized name
+NAME_MATCH_SOURCE = ALIAS_KEY_SOURCE + """
+from functools import lru_cache
 
-sanskrit_librarian_grader = PythonGrader(
-    name="Sanskrit Librarian Text Identification Grader",
-    type="python",
-    source="""
-import json
-import re
 from rapidfuzz import fuzz, utils
 
+# Rollouts name the same authors and works over and over, so each distinct
+# model name is folded once per grader process
+_model_alias_key = lru_cache(maxsize=1 << 16)(alias_key)
+
 def normalize_string(s):
     \"\"\"Normalize strings for comparison - lowercase, remove extra spaces\"\"\"
     if not s:
         return ""
     return str(s).lower().strip()
 
+def is_alias(model_value, expected_value, aliases):
+    \"\"\"Exact match, or the model's name folds to one of the expected name's alias keys\"\"\"
+    return model_value == expected_value or bool(aliases) and _model_alias_key(model_value) in aliases
+
+def is_close(model_value, expected_value, aliases):
+    \"\"\"Fuzzy match, against the alias keys when the item has them\"\"\"
+    # With score_cutoff, WRatio returns 0 for anything below it and can stop early
+    if aliases:
+        key = _model_alias_key(model_value)
+        return any(fuzz.WRatio(key, alias, processor=utils.default_process, score_cutoff=80) >= 80
+                   for alias in aliases)
+    return fuzz.WRatio(model_value, expected_value, processor=utils.default_process, score_cutoff=80) >= 80
+"""
+
+GRADER_SOURCE = PARSER_SOURCE + NAME_MATCH_SOURCE + """
+import re
+
+_NUMBER_RE = re.compile(r'\\d+')
+
+# Scoring weights for different levels of the hierarchy
+# Higher weights for more specific identifications
+WEIGHTS = {
+    "author": 2.0,      # Important but broad
+    "work": 3.0,        # More specific than author
+    "book": 1.5,        # Structural but less critical
+    "chapter": 1.5,     # Structural but less critical
+    "verse": 4.0,       # Most specific and valuable
+    "confidence": 0.5   # Bonus for appropriate confidence
+}
+# +2.0 for the bonus
+MAX_SCORE = sum(WEIGHTS.values()) + 2.0
+
 def extract_numbers(s):
     \"\"\"Extract all numbers from a string\"\"\"
     if not s:
         return []
-    return re.findall(r'\\d+', str(s))
+    return _NUMBER_RE.findall(str(s))
 
 def grade(sample, item) -> float:
     try:
         # Extract the model's output text
         output_text = sample["output_text"].strip()
         
-        # Parse the model's JSON response
-        try:
-            model_response = json.loads(output_text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return 0
+        # Find the JSON answer, even inside a code fence or after some prose
+        model_response, parse_status = extract_json_fields(
+            output_text, ("author", "work", "book", "chapter", "verse", "confidence"))
+        if model_response is None:
+            # No usable JSON object, return 0
             return 0.0
         
         # Get expected answer from the item
@@ -97,33 +158,29 @@ def grade(sample, item) -> float:
         expected_chapter = normalize_string(expected.get("chapter", ""))
         expected_verse = str(expected.get("verse", "")).strip()
         
-        # Scoring weights for different levels of the hierarchy
-        # Higher weights for more specific identifications
-        weights = {
-            "author": 2.0,      # Important but broad
-            "work": 3.0,        # More specific than author
-            "book": 1.5,        # Structural but less critical
-            "chapter": 1.5,     # Structural but less critical  
-            "verse": 4.0,       # Most specific and valuable
-            "confidence": 0.5   # Bonus for appropriate confidence
-        }
+        # Alias keys of the expected author and work, when the generator wrote them
+        answer_aliases = item.get("answer_aliases") or {}
+        author_aliases = answer_aliases.get("author")
+        work_aliases = answer_aliases.get("work")
+        author_correct = is_alias(model_author, expected_author, author_aliases)
+        work_correct = is_alias(model_work, expected_work, work_aliases)
         
-        total_possible_score = sum(weights.values())
+        weights = WEIGHTS
         earned_score = 0.0
         
         # Score author match
         if expected_author and expected_author != "unknown":
-            if model_author == expected_author:
+            if author_correct:
                 earned_score += weights["author"]
-            elif model_author and fuzz.WRatio(model_author, expected_author, processor=utils.default_process) >= 80:
+            elif model_author and is_close(model_author, expected_author, author_aliases):
                 # Partial credit for close matches (transliteration variants)
                 earned_score += weights["author"] * 0.7
         
         # Score work match
         if expected_work and expected_work != "unknown":
-            if model_work == expected_work:
+            if work_correct:
                 earned_score += weights["work"]
-            elif model_work and fuzz.WRatio(model_work, expected_work, processor=utils.default_process) >= 80:
+            elif model_work and is_close(model_work, expected_work, work_aliases):
                 # Partial credit for close matches
                 earned_score += weights["work"] * 0.7
         
@@ -131,14 +188,16 @@ def grade(sample, item) -> float:
         if expected_book and expected_book != "unknown":
             if model_book == expected_book:
                 earned_score += weights["book"]
-            elif model_book and fuzz.WRatio(model_book, expected_book, processor=utils.default_process) >= 80:
+            elif model_book and fuzz.WRatio(model_book, expected_book, processor=utils.default_process,
+                                            score_cutoff=80) >= 80:
                 earned_score += weights["book"] * 0.7
         
         # Score chapter match
         if expected_chapter and expected_chapter != "unknown":
             if model_chapter == expected_chapter:
                 earned_score += weights["chapter"]
-            elif model_chapter and fuzz.WRatio(model_chapter, expected_chapter, processor=utils.default_process) >= 80:
+            elif model_chapter and fuzz.WRatio(model_chapter, expected_chapter, processor=utils.default_process,
+                                               score_cutoff=80) >= 80:
                 earned_score += weights["chapter"] * 0.7
         
         # Score verse match (special handling for numbers)
@@ -184,8 +243,8 @@ def grade(sample, item) -> float:
         
         # Bonus scoring for complete correct identification
         all_fields_correct = (
-            (not expected_author or expected_author == "unknown" or model_author == expected_author) and
-            (not expected_work or expected_work == "unknown" or model_work == expected_work) and
+            (not expected_author or expected_author == "unknown" or author_correct) and
+            (not expected_work or expected_work == "unknown" or work_correct) and
             (not expected_book or expected_book == "unknown" or model_book == expected_book) and
             (not expected_chapter or expected_chapter == "unknown" or model_chapter == expected_chapter) and
             (not expected_verse or expected_verse == "0" or model_verse == expected_verse)
@@ -195,38 +254,124 @@ def grade(sample, item) -> float:
             earned_score += 2.0  # Bonus for perfect identification
         
         # Normalize score to 0-1 range
-        final_score = min(earned_score / (total_possible_score + 2.0), 1.0)  # +2.0 for bonus
+        final_score = min(earned_score / MAX_SCORE, 1.0)
         
         return max(0.0, final_score)
         
     except Exception as e:
         return 0.0
 """
-)
 
-def create_rl_job(training_file_id, validation_file_id):
-    """Create the reinforcement learning fine-tuning job"""
+LOCATION_GRADER_NAME = "Sanskrit Librarian Hierarchical Location Grader"
+
+# Scores work/book/chapter/verse by distance along the integer location path
+# the generator stores with each item (see locations.py)
+LOCATION_GRADER_SOURCE = PARSER_SOURCE + NAME_MATCH_SOURCE + CREDIT_SOURCE + """
+def location_answer(sample, item):
+    \"\"\"(author credit, expected path, answer path, confidence credit) of one output, or None if it scores 0.0
+
+    locations.grade_location_batch() calls this too, so a batch is parsed
+    exactly as grade() parses each output.
+    \"\"\"
+    # Items from a generator run without location ordinals can't be scored
+    location = item.get("location")
+    if not location:
+        return None
     
-    print("Creating RL fine-tuning job...")
+    output_text = sample["output_text"].strip()
+    model_response, parse_status = extract_json_fields(
+        output_text, ("author", "work", "book", "chapter", "verse", "confidence"))
+    if model_response is None:
+        return None
+    
+    expected = item.get("expected_answer", {})
+    answer_aliases = item.get("answer_aliases") or {}
+    model_author = normalize_string(model_response.get("author", ""))
+    model_work = normalize_string(model_response.get("work", ""))
+    model_confidence = float(model_response.get("confidence", 0.0))
+    expected_author = normalize_string(expected.get("author", ""))
+    expected_work = normalize_string(expected.get("work", ""))
+    
+    # Author: the name or an alias, partial credit for a close match
+    author_credit = 0.0
+    if expected_author and expected_author != "unknown":
+        if is_alias(model_author, expected_author, answer_aliases.get("author")):
+            author_credit = 1.0
+        elif model_author and is_close(model_author, expected_author, answer_aliases.get("author")):
+            author_credit = 0.7
+    
+    # Work, book, chapter and verse: the answer's labels as ordinals on the
+    # item's integer path, -1 where a label can't be placed (see locations.py)
+    work_matches = bool(model_work) and is_alias(model_work, expected_work, answer_aliases.get("work"))
+    answer_path = model_path(location, work_matches, model_response.get("book", ""),
+                             model_response.get("chapter", ""), model_response.get("verse", ""))
+    
+    # Same confidence rule as the librarian grader
+    difficulty = item.get("difficulty", "medium")
+    confidence_credit = 0.0
+    if 0.0 <= model_confidence <= 1.0:
+        if ((difficulty == "easy" and model_confidence >= 0.7) or
+                (difficulty == "medium" and 0.4 <= model_confidence <= 0.8) or
+                (difficulty == "hard" and model_confidence <= 0.6)):
+            confidence_credit = 0.5
+        else:
+            confidence_credit = 0.25
     
-    job = client.fine_tuning.jobs.create(
+    return author_credit, location["path"], answer_path, confidence_credit
+
+def grade(sample, item) -> float:
+    try:
+        answer = location_answer(sample, item)
+        if answer is None:
+            return 0.0
+        author_credit, path, answer_path, confidence_credit = answer
+        return location_score(author_credit, hierarchical_credit(path, answer_path), confidence_credit)
+    
+    except Exception as e:
+        return 0.0
+"""
+
+GRADERS = {
+    "librarian": (GRADER_NAME, GRADER_SOURCE),
+    "location": (LOCATION_GRADER_NAME, LOCATION_GRADER_SOURCE),
+}
+
+def build_grader(kind="librarian"):
+    """The PythonGrader sent with the job: "librarian" (default) or "location" from GRADERS"""
+    from openai.types.graders import PythonGrader
+    name, source = GRADERS[kind]
+    return PythonGrader(name=name, type="python", source=source)
+
+def rl_job_params(training_file_id, validation_file_id, reasoning_effort="medium", n_epochs=3,
+                  grader="librarian", **hyperparameters):
+    """Keyword arguments for fine_tuning.jobs.create, shared by the sync and async paths"""
+    from openai.types.fine_tuning import ReinforcementMethod, ReinforcementHyperparameters
+
+    return dict(
         training_file=training_file_id,
         validation_file=validation_file_id,
         model="gpt-4o-mini-2024-07-18",  # Using GPT-4o-mini as base model
         method={
             "type": "reinforcement",
             "reinforcement": ReinforcementMethod(
-                grader=sanskrit_librarian_grader,
+                grader=build_grader(grader),
                 hyperparameters=ReinforcementHyperparameters(
-                    reasoning_effort="medium",  # Can be "low", "medium", or "high"
-                    n_epochs=3,
-                    # batch_size=8,  # Uncomment to set custom batch size
-                    # learning_rate_multiplier=1.0,  # Uncomment to set custom learning rate
+                    reasoning_effort=reasoning_effort,  # Can be "low", "medium", or "high"
+                    n_epochs=n_epochs,
+                    # batch_size=8 or learning_rate_multiplier=1.0 can be passed through **hyperparameters
+                    **hyperparameters,
                 )
             )
         },
         seed=42,
     )
+
+def create_rl_job(training_file_id, validation_file_id, grader="librarian"):
+    """Create the reinforcement learning fine-tuning job"""
+    
+    print("Creating RL fine-tuning job...")
+    
+    job = get_client().fine_tuning.jobs.create(**rl_job_params(training_file_id, validation_file_id, grader=grader))
     
     print(f"RL Job created successfully!")
     print(f"Job ID: {job.id}")
@@ -242,7 +387,7 @@ def monitor_job(job_id):
     print("You can also monitor this at: https://platform.openai.com/finetune")
     
     # Get current job status
-    job = client.fine_tuning.jobs.retrieve(job_id)
+    job = get_client().fine_tuning.jobs.retrieve(job_id)
     print(f"Current status: {job.status}")
     
     if job.status == "completed":
@@ -280,7 +425,57 @@ def test_grader_locally():
     print(f"Expected: {item['expected_answer']}")
     print("Note: Run this with the actual grader logic extracted for local testing")
 
-if __name__ == "__main__":
+async def run_async(args):
+    """Upload concurrently (skipping content that was already uploaded), then
+    launch one job, or a sweep of jobs, and stream their events until done"""
+    from functools import partial
+
+    from openai_async import AsyncJobOrchestrator, parse_sweep_configs
+
+    orchestrator = AsyncJobOrchestrator(base_url=args.base_url, max_concurrency=args.max_concurrency)
+    try:
+        paths = latest_split_files(args.output_dir)
+        if args.strip_fields:
+            # Upload copies with only the fields the model and the grader read
+            from upload_export import export_for_grader
+            paths = [report["outputs"][0] for report in export_for_grader(paths, GRADERS[args.grader][1])]
+        training_file_id, validation_file_id = await orchestrator.upload_all(paths)
+        configs = parse_sweep_configs(args.sweep) if args.command == "sweep" else [{}]
+        return await orchestrator.sweep(training_file_id, validation_file_id, configs,
+                                        partial(rl_job_params, grader=args.grader),
+                                        timeout=args.poll_timeout)
+    finally:
+        await orchestrator.close()
+
+def main(argv=None):
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Launch the Sanskrit librarian RL fine-tuning job")
+    parser.add_argument("command", nargs="?", choices=["test", "async", "sweep"], default="test",
+                        help="test: check the grader setup locally (default); async: concurrent uploads "
+                             "and streamed job events; sweep: one job per --sweep config")
+    parser.add_argument("--sweep", action="append", default=[],
+                        help="Hyperparameters for one sweep job, e.g. n_epochs=2,reasoning_effort=low")
+    parser.add_argument("--output-dir", default="sanskrit_dataset_output")
+    parser.add_argument("--base-url", default=None,
+                        help="API base URL, e.g. http://127.0.0.1:8089/v1 for mock_openai_server.py")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--strip-fields", action="store_true",
+                        help="Upload minimal copies without the fields the grader never reads (see upload_export.py)")
+    parser.add_argument("--grader", choices=sorted(GRADERS), default="librarian",
+                        help="librarian: field-by-field grader (default); "
+                             "location: hierarchical distance along the items' location paths")
+    parser.add_argument("--poll-timeout", type=float, default=None,
+                        help="Stop monitoring after this many seconds")
+    args = parser.parse_args(argv)
+
+    if args.command != "test":
+        if args.command == "sweep" and not args.sweep:
+            parser.error("sweep needs at least one --sweep config")
+        asyncio.run(run_async(args))
+        return
+
     try:
         # Step 0: Test grader logic locally (optional)
         print("🧪 Testing grader logic...")
@@ -330,3 +525,6 @@ if __name__ == "__main__":
         print("3. Have the 'sanskrit_dataset_output' directory with your training files")
         print("4. Have sufficient credits in your OpenAI account")
         print("5. Installed required packages: pip install rapidfuzz")
+
+if __name__ == "__main__":
+    main()
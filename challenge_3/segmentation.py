@@ -0,0 +1,180 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Batch word segmentation of quotes with the vidyut cheda model.
+#
+# The model in vidyut-0.4.0/cheda/model.msgpack is loaded once per worker
+# process (in the pool initializer) and reused for every quote that worker
+# handles. Quotes are IAST, cheda works on SLP1, so each quote is transliterated
+# on the way in and every token on the way out.
+#
+# Chedaka also needs the kosha (the word list) of the full vidyut data
+# release, which the copy in challenge_2/vidyut-0.4.0/ doesn't include.
+# Download it with
+#
+#   python -c "import vidyut; vidyut.download_data('../challenge_2/vidyut-0.4.0')"
+#
+# The quote generator runs it as an opt-in stage (make_dataset_openai_jsonl.py
+# --segment-words), which adds words/lemmas to every entry. On its own it
+# segments a generated dataset and reports throughput:
+#
+#   python segmentation.py --data-dir sanskrit_dataset_output
+
+VIDYUT_DATA_PATH = "../challenge_2/vidyut-0.4.0/"
+# Subdirectories of the vidyut data that Chedaka loads
+CHEDA_DATA_DIRS = ("cheda", "kosha", "sandhi")
+
+_chedaka = None
+
+
+def check_data(data_path: str = VIDYUT_DATA_PATH):
+    """Raise FileNotFoundError, saying what to download, if data_path lacks data Chedaka needs"""
+    missing = [name for name in CHEDA_DATA_DIRS if not os.path.isdir(os.path.join(data_path, name))]
+    if missing:
+        raise FileNotFoundError(
+            f"{data_path} has no {', '.join(missing)} data, which the cheda segmenter needs. Download the "
+            f"full vidyut 0.4.0 data with: python -c \"import vidyut; vidyut.download_data('{data_path}')\"")
+
+
+def _init_worker(data_path: str):
+    """Pool initializer: load the cheda model once for this process"""
+    global _chedaka
+    from vidyut.cheda import Chedaka
+    _chedaka = Chedaka(data_path)
+
+
+def _to_iast(text: str) -> str:
+    from vidyut.lipi import Scheme, transliterate
+    return transliterate(text, Scheme.Slp1, Scheme.Iast)
+
+
+def segment_text(text: str) -> Dict[str, List[str]]:
+    """Split one IAST quote into words and lemmas (requires an initialized worker)"""
+    from vidyut.lipi import Scheme, transliterate
+
+    words, lemmas = [], []
+    # Verse separators and references are not part of the text proper
+    for part in text.replace('|', '/').split('/'):
+        part = part.strip()
+        if not part:
+            continue
+        for token in _chedaka.run(transliterate(part, Scheme.Iast, Scheme.Slp1)):
+            words.append(_to_iast(token.text))
+            lemma = getattr(token, 'lemma', None) or token.text
+            lemmas.append(_to_iast(lemma))
+    return {'words': words, 'lemmas': lemmas}
+
+
+def _segment_batch(texts: List[str]) -> List[Dict[str, List[str]]]:
+    results = []
+    for text in texts:
+        try:
+            results.append(segment_text(text))
+        except Exception as e:
+            print(f"Segmentation failed for {text[:40]!r}: {e}")
+            results.append({'words': [], 'lemmas': []})
+    return results
+
+
+def segment_quotes(texts: List[str],
+                   data_path: str = VIDYUT_DATA_PATH,
+                   num_workers: Optional[int] = None,
+                   batch_size: int = 64) -> List[Dict[str, List[str]]]:
+    """Segment a list of quotes in parallel, preserving input order"""
+    if not texts:
+        return []
+    # Before starting the pool: a worker whose initializer fails only shows up as BrokenProcessPool
+    check_data(data_path)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    results: List[Dict[str, List[str]]] = []
+    with ProcessPoolExecutor(max_workers=num_workers,
+                             initializer=_init_worker,
+                             initargs=(data_path,)) as pool:
+        for batch_result in pool.map(_segment_batch, batches):
+            results.extend(batch_result)
+    return results
+
+
+def add_tokens(entries: List[Dict], **kwargs) -> List[Dict]:
+    """Pipeline stage: attach 'words' and 'lemmas' to each dataset entry"""
+    tokens = segment_quotes([entry['quote'] for entry in entries], **kwargs)
+    for entry, tok in zip(entries, tokens):
+        entry['words'] = tok['words']
+        entry['lemmas'] = tok['lemmas']
+    return entries
+
+
+def build_inverted_index(entries: Iterable[Dict], field: str = 'lemmas') -> Dict[str, List[int]]:
+    """Map each word (or lemma) to the positions of the entries containing it"""
+    index: Dict[str, List[int]] = {}
+    for i, entry in enumerate(entries):
+        for word in set(entry.get(field, [])):
+            index.setdefault(word, []).append(i)
+    return index
+
+
+def lexical_overlap(a: List[str], b: List[str]) -> float:
+    """Jaccard overlap of two token lists, for lexical-overlap grading"""
+    set_a, set_b = set(a), set(b)
+    if not set_a or not set_b:
+        return 0.0
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+def load_quotes(paths: List[Path]) -> List[str]:
+    """Read the quotes from one or more JSONL dataset files"""
+    quotes = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    quotes.append(json.loads(line)['quote'])
+    return quotes
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Segment dataset quotes with the vidyut cheda model")
+    parser.add_argument("--data-dir", default="sanskrit_dataset_output")
+    parser.add_argument("--vidyut-data", default=VIDYUT_DATA_PATH, help="vidyut data directory, with kosha/")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    try:
+        check_data(args.vidyut_data)
+    except FileNotFoundError as e:
+        parser.exit(1, f"{e}\n")
+
+    # The train/val/test splits together hold the full 2,000-quote dataset
+    data_dir = Path(args.data_dir)
+    split_files = sorted(
+        p for pattern in ("sanskrit_quote_id_train_*.jsonl",
+                          "sanskrit_quote_id_val_*.jsonl",
+                          "sanskrit_quote_id_test_*.jsonl")
+        for p in data_dir.glob(pattern)
+    )
+    quotes = load_quotes(split_files)
+    print(f"Loaded {len(quotes)} quotes from {len(split_files)} files")
+
+    start = time.perf_counter()
+    tokens = segment_quotes(quotes, args.vidyut_data, num_workers=args.workers, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    total_words = sum(len(t['words']) for t in tokens)
+    vocabulary = {lemma for t in tokens for lemma in t['lemmas']}
+    print(f"Segmented {len(quotes)} quotes into {total_words} words in {elapsed:.2f}s "
+          f"({len(quotes) / elapsed:.1f} segments/second)")
+    print(f"Distinct lemmas: {len(vocabulary)}")
+
+    if tokens:
+        print(f"\nSample: {quotes[0]}")
+        print(f"  words:  {tokens[0]['words']}")
+        print(f"  lemmas: {tokens[0]['lemmas']}")
@@ -0,0 +1,211 @@
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+# Synthetic GRETIL-like TEI corpus for testing and benchmarking the quote
+# pipeline without the real GRETIL data.
+#
+# Files mimic the structure SanskritTextProcessor expects: a teiHeader with
+# tei:title / tei:author, nested div elements (book > adhyāya > chapter >
+# section), lg/l verse groups and p paragraphs with xml:ids, plus a few
+# standalone l lines. Output is streamed to disk until a target size is
+# reached, so files from a few KB up to several GB can be produced without
+# holding them in memory. Everything is driven by a seed and is deterministic.
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+
+SYLLABLES = [
+    "a", "ā", "i", "ka", "kā", "ga", "ca", "ja", "ṭa", "ta", "tā", "da", "na", "nā", "pa",
+    "ba", "bha", "ma", "mā", "ya", "yā", "ra", "rā", "la", "va", "vā", "śa", "ṣa", "sa",
+    "ha", "ti", "tī", "ni", "ri", "vi", "śi", "ku", "gu", "tu", "du", "bhū", "mu", "ru",
+    "su", "ke", "te", "de", "ne", "me", "ve", "se", "ko", "to", "do", "no", "yo", "ro",
+    "vo", "so", "kṛ", "dṛ", "tṛ", "dha", "dhā", "tha", "kha", "gha", "ṇa", "jña", "kṣa",
+]
+FINALS = ["", "", "", "ḥ", "ṃ", "t", "n", "m"]
+
+AUTHORS = [
+    ("kAlidAsa", "Kālidāsa", ["raghuvaMSa", "kumArasaMBava", "meGadUta"]),
+    ("BAravi", "Bhāravi", ["kirAtArjunIya"]),
+    ("mAGa", "Māgha", ["SiSupAlavaDa"]),
+    ("Bartfhari", "Bhartṛhari", ["Satakatraya", "vAkyapadIya"]),
+    ("vyAsa", "Vyāsa", ["mahABArata"]),
+    ("vAlmIki", "Vālmīki", ["rAmAyaRa"]),
+    ("aSvaGoza", "Aśvaghoṣa", ["buddhacarita", "saundarananda"]),
+    ("nAgArjuna", "Nāgārjuna", ["mUlamaDyamakakArikA"]),
+]
+
+# (div type, how many of them per parent). The hierarchy is
+# book > adhyāya > chapter > section, and each level can be switched off.
+DIV_LEVELS = [("book", 3), ("adhyaya", 4), ("chapter", 5), ("section", 3)]
+
+
+class SyntheticTEIWriter:
+    """Stream one synthetic TEI file to disk"""
+
+    def __init__(self, seed: int = 0,
+                 levels: Optional[List[str]] = None,
+                 paragraph_every: int = 8,
+                 standalone_line_every: int = 12,
+                 include_ids: bool = True):
+        self.rng = random.Random(seed)
+        self.levels = [lvl for lvl in DIV_LEVELS if levels is None or lvl[0] in levels]
+        self.paragraph_every = paragraph_every
+        self.standalone_line_every = standalone_line_every
+        self.include_ids = include_ids
+
+    def word(self) -> str:
+        rng = self.rng
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))) + rng.choice(FINALS)
+
+    def line(self, words: int = 4) -> str:
+        return " ".join(self.word() for _ in range(words))
+
+    def paragraph(self) -> str:
+        return " ".join(self.line(self.rng.randint(4, 8)) for _ in range(self.rng.randint(2, 5))) + " /"
+
+    def header(self, title: str, author: str) -> str:
+        return (
+            f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<TEI xmlns="{TEI_NS}">\n'
+            f'<teiHeader><fileDesc><titleStmt>\n'
+            f'<title>{escape(title)}</title>\n'
+            f'<author>{escape(author)}</author>\n'
+            f'</titleStmt></fileDesc></teiHeader>\n'
+            f'<text><body>\n'
+        )
+
+    def write(self, path: Path, target_bytes: int, title: str, author: str,
+              file_id: str = "syn", malformed: Optional[str] = None) -> Dict[str, int]:
+        """Write a file of roughly target_bytes; returns element counts.
+
+        malformed can be None, "truncated" (file cut off mid-element),
+        "unclosed" (an l element that is never closed) or "entity" (a bare
+        '&' in the text); all of these need lxml's recover=True to parse.
+        """
+        counts = {"verses": 0, "lines": 0, "paragraphs": 0, "divs": 0, "bytes": 0}
+        footer = "</body></text>\n</TEI>\n"
+        budget = max(target_bytes - len(footer), 0)
+
+        with open(path, "w", encoding="utf-8") as f:
+            written = 0
+
+            def emit(text: str):
+                nonlocal written
+                f.write(text)
+                written += len(text.encode("utf-8"))
+
+            emit(self.header(title, author))
+            verse_no = 0
+            depth = 0                          # number of currently open divs
+            number = [0] * len(self.levels)    # n attribute of the open div at each level
+            siblings = [0] * len(self.levels)  # divs emitted so far inside the current parent
+            malformed_at = self.rng.randint(3, 20) if malformed in ("unclosed", "entity") else -1
+
+            # Keep cycling through the div hierarchy until the size budget is spent
+            while written < budget:
+                while depth < len(self.levels):
+                    div_type = self.levels[depth][0]
+                    number[depth] += 1
+                    siblings[depth] += 1
+                    emit(f'<div type="{div_type}" n="{number[depth]}">\n')
+                    counts["divs"] += 1
+                    depth += 1
+                    if depth < len(self.levels):
+                        # Child numbering restarts inside every new parent
+                        number[depth] = siblings[depth] = 0
+
+                for _ in range(self.rng.randint(8, 20)):
+                    if written >= budget:
+                        break
+                    verse_no += 1
+                    xml_id = f' xml:id="{file_id}_{verse_no}"' if self.include_ids else ""
+                    first, second = self.line(), self.line()
+                    if verse_no == malformed_at and malformed == "entity":
+                        first += " & "
+                    if verse_no == malformed_at and malformed == "unclosed":
+                        emit(f'<lg{xml_id}><l>{first} /\n<l>{second} // {verse_no} //</l></lg>\n')
+                    else:
+                        emit(f'<lg{xml_id}><l>{first} /</l><l>{second} // {verse_no} //</l></lg>\n')
+                    counts["verses"] += 1
+
+                    if self.standalone_line_every and verse_no % self.standalone_line_every == 0:
+                        emit(f'<l xml:id="{file_id}_l{verse_no}">{self.line()} /</l>\n')
+                        counts["lines"] += 1
+                    if self.paragraph_every and verse_no % self.paragraph_every == 0:
+                        emit(f'<p>{self.paragraph()}</p>\n')
+                        counts["paragraphs"] += 1
+
+                # Close the innermost div, and every parent that has all its children
+                if depth:
+                    emit('</div>\n')
+                    depth -= 1
+                while depth > 0 and siblings[depth] >= self.levels[depth][1]:
+                    emit('</div>\n')
+                    depth -= 1
+
+            if malformed == "truncated":
+                emit('<lg xml:id="truncated"><l>')
+            else:
+                emit('</div>\n' * depth + footer)
+            counts["bytes"] = written
+        return counts
+
+
+def parse_size(size: str) -> int:
+    """Parse sizes like '64KB', '10MB' or '2GB' into bytes"""
+    size = size.strip().upper()
+    for suffix, factor in (("GB", 1 << 30), ("MB", 1 << 20), ("KB", 1 << 10), ("B", 1)):
+        if size.endswith(suffix):
+            return int(float(size[:-len(suffix)]) * factor)
+    return int(size)
+
+
+def generate_corpus(output_dir: str, num_files: int = 10, file_size: int = 64 << 10,
+                    seed: int = 0, malformed_fraction: float = 0.2) -> List[Dict]:
+    """Write num_files synthetic TEI files named like GRETIL files (sa_author-work.xml)"""
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+
+    manifest = []
+    for i in range(num_files):
+        filename_author, author, works = AUTHORS[i % len(AUTHORS)]
+        work = works[(i // len(AUTHORS)) % len(works)]
+        suffix = f"{i // (len(AUTHORS) * len(works))}" if i >= len(AUTHORS) * len(works) else ""
+        filename = f"sa_{filename_author}-{work}{suffix}.xml"
+
+        malformed = None
+        if rng.random() < malformed_fraction:
+            malformed = rng.choice(["truncated", "unclosed", "entity"])
+
+        writer = SyntheticTEIWriter(seed=seed * 1000 + i)
+        counts = writer.write(out / filename, file_size, title=f"{work} {suffix}".strip(),
+                              author=author, file_id=f"{work}{suffix}", malformed=malformed)
+        manifest.append({"filename": filename, "malformed": malformed, **counts})
+    return manifest
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic GRETIL-like TEI corpus")
+    parser.add_argument("--output-dir", default="synthetic_gretil")
+    parser.add_argument("--num-files", type=int, default=10)
+    parser.add_argument("--file-size", default="64KB", help="Target size per file, e.g. 64KB, 10MB, 1GB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--malformed-fraction", type=float, default=0.2,
+                        help="Fraction of files that need recover=True to parse")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.output_dir, args.num_files, parse_size(args.file_size),
+                               args.seed, args.malformed_fraction)
+    with open(Path(args.output_dir) / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    total = sum(m["bytes"] for m in manifest)
+    print(f"Wrote {len(manifest)} files ({total / (1 << 20):.1f} MB) to {args.output_dir}")
+    for m in manifest:
+        print(f"  {m['filename']:<40} {m['bytes']:>12} bytes  {m['verses']:>8} verses"
+              f"{'  (malformed: ' + m['malformed'] + ')' if m['malformed'] else ''}")
@@ -0,0 +1,448 @@
+import argparse
+import html
+import json
+import math
+import os
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from record_store import iter_records
+
+# Single-pass, bounded-memory profiler for generated datasets.
+#
+# Reads JSONL files (either challenge's records, detected per record) or Arrow
+# DatasetDict directories written by arrow_export.py, once and in batches, and
+# aggregates what sampling decisions need:
+#
+#   morphology  answer length, derivation step count, accepted answers, sūtra
+#               frequency, lakāra / puruṣa / vacana / prayoga balance, dhātus
+#   tables      cells per paradigm table, answer length per cell, lakāra balance
+#   quotes      quote length, type, difficulty and meter, authors, works, and
+#               length / type / difficulty per work
+#
+# Numeric fields go into fixed-bin histograms that are updated from buffered
+# values with NumPy. Fields with few values are counted exactly, up to a cap.
+# High-cardinality fields (sūtra codes, dhātus, authors, works) go into
+# count-min sketches, which keep a fixed-size table plus the top-k heavy
+# hitters. Memory therefore doesn't grow with the size of the input, and a
+# multi-GB dataset is profiled in one pass. The report is a compact JSON file
+# and, optionally, a self-contained HTML page.
+#
+#   python ../common/dataset_profiler.py sanskrit_morphology_complete.jsonl --html profile.html
+#   python ../common/dataset_profiler.py sanskrit_morphology_arrow --json profile.json
+
+DEFAULT_JSON_PATH = "dataset_profile.json"
+BUFFER_SIZE = 65536
+BATCH_SIZE = 4096
+CATEGORY_LIMIT = 256
+GROUP_LIMIT = 512
+TOP_K = 25
+
+
+class Histogram:
+    """Fixed-width bins over non-negative integers, plus an overflow bin and exact moments"""
+
+    def __init__(self, width=1, bins=64):
+        self.width = width
+        self.bins = bins
+        self.counts = np.zeros(bins + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = None
+        self.max = None
+        self._buffer = []
+
+    def add(self, value):
+        self._buffer.append(value)
+        if len(self._buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        values = np.asarray(self._buffer, dtype=np.int64)
+        self._buffer = []
+        self.counts += np.bincount(np.minimum(values // self.width, self.bins), minlength=self.bins + 1)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values, dtype=np.float64).sum())
+        low, high = int(values.min()), int(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def quantile(self, q):
+        """Upper edge of the bin holding the q-quantile (the maximum for the overflow bin)"""
+        position = int(np.searchsorted(np.cumsum(self.counts), q * self.count, side="left"))
+        return self.max if position >= self.bins else min((position + 1) * self.width - 1, self.max)
+
+    def report(self):
+        self.flush()
+        if not self.count:
+            return {"count": 0}
+        mean = self.total / self.count
+        last = int(np.flatnonzero(self.counts).max())
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": round(mean, 3),
+            "std": round(math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0)), 3),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "bin_width": self.width,
+            # Trailing empty bins are dropped; the last one is the overflow bin if it is reached
+            "bins": self.counts[:last + 1].tolist(),
+            "overflow_from": self.bins * self.width,
+        }
+
+
+class CategoryCounter:
+    """Exact counts for up to limit distinct values; later new values count as "(other)" """
+
+    def __init__(self, limit=CATEGORY_LIMIT):
+        self.limit = limit
+        self.counts = Counter()
+
+    def add(self, value):
+        value = "(none)" if value is None or value == "" else str(value)
+        if value in self.counts or len(self.counts) < self.limit:
+            self.counts[value] += 1
+        else:
+            self.counts["(other)"] += 1
+
+    def report(self):
+        return dict(self.counts.most_common())
+
+
+class CountMinSketch:
+    """Count-min sketch with top-k heavy hitters, in fixed memory.
+
+    Estimates never undercount; with probability 1 - exp(-depth) they
+    overcount by at most e / width of the total.
+    """
+
+    def __init__(self, width=4096, depth=4, top_k=TOP_K):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self.candidates = {}
+        self._buffer = []
+
+    def _indices(self, keys):
+        encoded = [key.encode("utf-8") for key in keys]
+        return [np.fromiter((zlib.crc32(data, 0x9E3779B1 * (row + 1) & 0xFFFFFFFF) % self.width
+                             for data in encoded), dtype=np.int64, count=len(encoded))
+                for row in range(self.depth)]
+
+    def add(self, key):
+        self._buffer.append(str(key))
+        if len(self._buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def estimate(self, keys):
+        rows = self._indices(keys)
+        return np.min([self.table[row][indices] for row, indices in enumerate(rows)], axis=0)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        keys = self._buffer
+        self._buffer = []
+        for row, indices in enumerate(self._indices(keys)):
+            self.table[row] += np.bincount(indices, minlength=self.width)
+        self.total += len(keys)
+
+        # Heavy hitters: keep the 4 * top_k keys with the highest estimates seen so far
+        batch_keys = list(set(keys) | set(self.candidates))
+        estimates = self.estimate(batch_keys)
+        keep = np.argsort(-estimates, kind="stable")[:4 * self.top_k]
+        self.candidates = {batch_keys[i]: int(estimates[i]) for i in keep}
+
+    def distinct_estimate(self):
+        """Linear-counting estimate of the number of distinct keys, from the first row"""
+        empty = int(np.count_nonzero(self.table[0] == 0))
+        if empty == 0:
+            return None  # saturated: more distinct keys than the sketch can tell apart
+        return round(-self.width * math.log(empty / self.width))
+
+    def report(self):
+        self.flush()
+        top = sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))[:self.top_k]
+        return {
+            "total": self.total,
+            "distinct_estimate": self.distinct_estimate(),
+            "error_bound": round(math.e / self.width * self.total, 1),
+            "top": top,
+        }
+
+
+class GroupStats:
+    """Per-group quote length, type and difficulty, for up to limit groups"""
+
+    def __init__(self, limit=GROUP_LIMIT):
+        self.limit = limit
+        self.groups = {}
+
+    def add(self, group, length, quote_type, difficulty):
+        if group not in self.groups and len(self.groups) >= self.limit:
+            group = "(other)"
+        stats = self.groups.get(group)
+        if stats is None:
+            stats = self.groups[group] = {"quotes": 0, "length_total": 0, "types": Counter(), "difficulty": Counter()}
+        stats["quotes"] += 1
+        stats["length_total"] += length
+        stats["types"][str(quote_type)] += 1
+        stats["difficulty"][str(difficulty)] += 1
+
+    def report(self, top=50):
+        ordered = sorted(self.groups.items(), key=lambda item: (-item[1]["quotes"], item[0]))[:top]
+        return {
+            group: {"quotes": s["quotes"], "mean_length": round(s["length_total"] / s["quotes"], 1),
+                    "types": dict(s["types"].most_common()), "difficulty": dict(s["difficulty"].most_common())}
+            for group, s in ordered
+        }
+
+
+class DatasetProfile:
+    """Aggregates for one stream of records"""
+
+    MORPHOLOGY_CATEGORIES = ("pada_type", "lakara", "purusha", "vacana", "prayoga", "gana", "sanadi",
+                             "linga", "vibhakti")
+    QUOTE_CATEGORIES = ("quote_type", "difficulty", "meter")
+
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+        self.kinds = Counter()
+        self.fields = Counter()
+        self.histograms = {}
+        self.categories = {}
+        self.sketches = {}
+        self.groups = {}
+        self.seconds = 0.0
+
+    def _histogram(self, name, width=1, bins=64):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(width, bins)
+        return histogram
+
+    def _category(self, name):
+        counter = self.categories.get(name)
+        if counter is None:
+            counter = self.categories[name] = CategoryCounter()
+        return counter
+
+    def _sketch(self, name):
+        sketch = self.sketches.get(name)
+        if sketch is None:
+            sketch = self.sketches[name] = CountMinSketch()
+        return sketch
+
+    def add(self, record):
+        self.records += 1
+        self.fields.update(key for key, value in record.items() if value is not None)
+        if "quote" in record:
+            self.kinds["quote"] += 1
+            self._add_quote(record)
+        elif "expected_answer" in record:
+            self.kinds["morphology"] += 1
+            self._add_morphology(record)
+        elif "cells" in record:
+            self.kinds["table"] += 1
+            self._add_table(record)
+        else:
+            self.kinds["other"] += 1
+
+    def _add_morphology(self, record):
+        self._histogram("answer_length").add(len(str(record["expected_answer"])))
+        history = record.get("derivation_history") or []
+        self._histogram("derivation_steps").add(len(history))
+        sutras = self._sketch("sutra")
+        for step in history:
+            code = step.get("code") if isinstance(step, dict) else None
+            if code:
+                sutras.add(code)
+        if record.get("accepted_answers") is not None:
+            self._histogram("accepted_answers", bins=16).add(len(record["accepted_answers"]))
+        if record.get("alternative_derivations") is not None:
+            self._histogram("alternative_derivations", bins=16).add(len(record["alternative_derivations"]))
+        for field in self.MORPHOLOGY_CATEGORIES:
+            # Arrow rows have every column, None where the cell type doesn't use it
+            if record.get(field) is not None:
+                self._category(field).add(record[field])
+        for field in ("dhatu", "pratipadika"):
+            if record.get(field):
+                self._sketch(field).add(record[field])
+
+    def _add_table(self, record):
+        # Paradigm-table entries: one (dhātu, lakāra) with its puruṣa x vacana cells
+        cells = record.get("cells") or []
+        self._histogram("table_cells", bins=16).add(len(cells))
+        for cell in cells:
+            self._histogram("answer_length").add(len(str(cell.get("expected_answer") or "")))
+            self._histogram("accepted_answers", bins=16).add(len(cell.get("accepted_answers") or []))
+        for field in ("lakara", "prayoga", "gana"):
+            if record.get(field) is not None:
+                self._category(field).add(record[field])
+        if record.get("dhatu"):
+            self._sketch("dhatu").add(record["dhatu"])
+
+    def _add_quote(self, record):
+        quote = record.get("quote") or ""
+        self._histogram("quote_length", width=10, bins=100).add(len(quote))
+        for field in self.QUOTE_CATEGORIES:
+            self._category(field).add(record.get(field))
+        expected = record.get("expected_answer") or {}
+        for field in ("author", "work"):
+            if expected.get(field):
+                self._sketch(field).add(expected[field])
+        groups = self.groups.get("work")
+        if groups is None:
+            groups = self.groups["work"] = GroupStats()
+        groups.add(str(expected.get("work") or "unknown"), len(quote), record.get("quote_type"),
+                   record.get("difficulty"))
+
+    def report(self):
+        return {
+            "name": self.name,
+            "records": self.records,
+            "seconds": round(self.seconds, 3),
+            "kinds": dict(self.kinds),
+            "fields": dict(self.fields.most_common()),
+            "histograms": {name: h.report() for name, h in self.histograms.items()},
+            "categories": {name: c.report() for name, c in self.categories.items()},
+            "sketches": {name: s.report() for name, s in self.sketches.items()},
+            "groups": {name: g.report() for name, g in self.groups.items()},
+        }
+
+
+def is_arrow_dir(path):
+    return os.path.isdir(path) and (os.path.exists(os.path.join(path, "dataset_dict.json")) or
+                                    os.path.exists(os.path.join(path, "dataset_info.json")))
+
+
+def iter_sources(path, batch_size=BATCH_SIZE):
+    """(name, record iterator) per JSONL file or per split of an Arrow dataset directory"""
+    if not is_arrow_dir(path):
+        yield path, iter_records(path)
+        return
+    from datasets import Dataset, load_from_disk
+
+    loaded = load_from_disk(path)
+    splits = {"": loaded} if isinstance(loaded, Dataset) else dict(loaded)
+
+    def rows(dataset):
+        # Batches of the memory-mapped table, so only one batch is in Python objects at a time
+        for batch in dataset.iter(batch_size=batch_size):
+            columns = list(batch)
+            for values in zip(*(batch[column] for column in columns)):
+                yield dict(zip(columns, values))
+
+    for split, dataset in splits.items():
+        yield f"{path}:{split}" if split else path, rows(dataset)
+
+
+def profile_paths(paths, batch_size=BATCH_SIZE):
+    profiles = []
+    for path in paths:
+        for name, records in iter_sources(path, batch_size):
+            profile = DatasetProfile(name)
+            start = time.perf_counter()
+            for record in records:
+                profile.add(record)
+            profile.seconds = time.perf_counter() - start
+            profiles.append(profile)
+    return profiles
+
+
+def _bar_chart(values, labels, width=480, bar_height=14):
+    if not values:
+        return ""
+    peak = max(values) or 1
+    rows = []
+    for i, (label, value) in enumerate(zip(labels, values)):
+        y = i * (bar_height + 2)
+        length = round((width - 160) * value / peak)
+        rows.append(f'<text x="0" y="{y + bar_height - 3}">{html.escape(str(label))}</text>'
+                    f'<rect x="90" y="{y}" width="{length}" height="{bar_height}"></rect>'
+                    f'<text x="{94 + length}" y="{y + bar_height - 3}">{value}</text>')
+    return (f'<svg width="{width}" height="{len(values) * (bar_height + 2)}" font-size="11">'
+            + "".join(rows) + "</svg>")
+
+
+def _histogram_chart(report, max_bars=40):
+    bins = report.get("bins") or []
+    width = report["bin_width"]
+    # Merge adjacent bins so that long histograms stay readable
+    step = max(1, math.ceil(len(bins) / max_bars))
+    values, labels = [], []
+    for start in range(0, len(bins), step):
+        values.append(sum(bins[start:start + step]))
+        low = start * width
+        labels.append(f"≥{low}" if low >= report["overflow_from"] else f"{low}–{(start + step) * width - 1}")
+    return _bar_chart(values, labels)
+
+
+def render_html(reports):
+    """A self-contained HTML page for profile reports"""
+    parts = ["<!DOCTYPE html><html><head><meta charset='utf-8'><title>Dataset profile</title><style>"
+             "body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin:.5em 0}"
+             "td,th{border:1px solid #ccc;padding:2px 8px;text-align:left}rect{fill:#4a7ab7}"
+             "h2{border-bottom:1px solid #999}</style></head><body><h1>Dataset profile</h1>"]
+    for report in reports:
+        parts.append(f"<h2>{html.escape(report['name'])}</h2>"
+                     f"<p>{report['records']:,} records in {report['seconds']:.2f}s; kinds: "
+                     f"{html.escape(json.dumps(report['kinds'], ensure_ascii=False))}</p>")
+        for name, h in report["histograms"].items():
+            if not h["count"]:
+                continue
+            parts.append(f"<h3>{html.escape(name)}</h3><p>mean {h['mean']}, std {h['std']}, min {h['min']}, "
+                         f"p50 {h['p50']}, p90 {h['p90']}, p99 {h['p99']}, max {h['max']}</p>"
+                         + _histogram_chart(h))
+        for name, counts in report["categories"].items():
+            parts.append(f"<h3>{html.escape(name)}</h3>" + _bar_chart(list(counts.values()), list(counts)))
+        for name, sketch in report["sketches"].items():
+            distinct = sketch["distinct_estimate"]
+            parts.append(f"<h3>{html.escape(name)} (count-min sketch)</h3><p>{sketch['total']:,} occurrences, "
+                         f"~{distinct if distinct is not None else '?'} distinct, counts overestimated by at most "
+                         f"{sketch['error_bound']} (w.h.p.)</p>"
+                         + _bar_chart([count for _, count in sketch["top"]], [key for key, _ in sketch["top"]]))
+        for name, groups in report["groups"].items():
+            rows = "".join(
+                f"<tr><td>{html.escape(group)}</td><td>{g['quotes']}</td><td>{g['mean_length']}</td>"
+                f"<td>{html.escape(json.dumps(g['types'], ensure_ascii=False))}</td>"
+                f"<td>{html.escape(json.dumps(g['difficulty'], ensure_ascii=False))}</td></tr>"
+                for group, g in groups.items())
+            parts.append(f"<h3>per {html.escape(name)}</h3><table><tr><th>{html.escape(name)}</th><th>quotes</th>"
+                         f"<th>mean length</th><th>types</th><th>difficulty</th></tr>{rows}</table>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile generated JSONL or Arrow datasets in one streaming pass")
+    parser.add_argument("paths", nargs="+", help="JSONL files or arrow_export.py output directories")
+    parser.add_argument("--json", default=DEFAULT_JSON_PATH, help="Where to write the JSON report")
+    parser.add_argument("--html", default=None, help="Also write an HTML report here")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per Arrow batch")
+    args = parser.parse_args()
+
+    reports = [profile.report() for profile in profile_paths(args.paths, args.batch_size)]
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump({"profiles": reports}, f, ensure_ascii=False, separators=(",", ":"))
+    for report in reports:
+        print(f"{report['name']}: {report['records']:,} records in {report['seconds']:.2f}s "
+              f"({', '.join(f'{kind} {count}' for kind, count in report['kinds'].items())})")
+    print(f"JSON report -> {args.json}")
+    if args.html:
+        with open(args.html, "w", encoding="utf-8") as f:
+            f.write(render_html(reports))
+        print(f"HTML report -> {args.html}")
@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+
+# Persistent cache in front of a grader's grade(sample, item) function.
+#
+# Scores are stored in SQLite keyed by (hash of the grader source, item
+# identity, hash of the normalized output text). Re-scoring rollouts that were
+# already graded (repeated checkpoints, low-temperature sampling, re-runs after
+# a crash) is then a lookup instead of a grade() call. Editing the grader
+# changes its hash, so stale scores are never returned. grade_many() hashes
+# each item object once per cache instance and looks a whole batch up with a
+# few SELECTs, so a warm re-score costs a fraction of grading.
+#
+#   python ../common/grading_cache.py rollouts.jsonl
+#   python ../common/grading_cache.py rollouts.jsonl --grader answer   # any grader in the job script's GRADERS
+#
+# where each rollout line has "output_text" and either an "item" object or an
+# "item_index" into the dataset given with --items.
+
+DEFAULT_CACHE_PATH = "grading_cache.sqlite"
+# (item, output) pairs per SELECT when looking up a batch
+LOOKUP_BATCH = 500
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def normalize_output(text):
+    """Whitespace differences at the ends or in line endings don't change the score"""
+    return text.replace("\r\n", "\n").strip()
+
+
+def item_key(item):
+    """Stable identity of a dataset item: its id if it has one, else a hash of its content"""
+    if "id" in item:
+        return str(item["id"])
+    return _digest(json.dumps(item, sort_keys=True, ensure_ascii=False, separators=(",", ":")))
+
+
+def load_grade_function(source):
+    namespace = {}
+    exec(compile(source, "<grader>", "exec"), namespace)
+    return namespace["grade"]
+
+
+class GradingCache:
+    """grade() with a persistent (grader, item, output) -> score cache"""
+
+    def __init__(self, grader_source, path=DEFAULT_CACHE_PATH, grade_fn=None, name=None):
+        # Scores are keyed on the source, so every grader gets its own entries
+        self.grader_hash = _digest(grader_source)
+        self.name = name
+        self.grade_fn = grade_fn or load_grade_function(grader_source)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS grades ("
+            " grader TEXT NOT NULL, item TEXT NOT NULL, output TEXT NOT NULL, score REAL NOT NULL,"
+            " PRIMARY KEY (grader, item, output)) WITHOUT ROWID"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.grade_seconds = 0.0
+        # id(item) -> (item, item_key(item)). The items of a loaded dataset are
+        # the same objects every time they are graded, so each is serialized
+        # and hashed once; holding the item keeps its id from being reused.
+        self._item_keys = {}
+
+    def _item_key(self, item):
+        entry = self._item_keys.get(id(item))
+        if entry is None or entry[0] is not item:
+            entry = self._item_keys[id(item)] = (item, item_key(item))
+        return entry[1]
+
+    def _key(self, sample, item):
+        return self.grader_hash, self._item_key(item), _digest(normalize_output(sample.get("output_text", "")))
+
+    def _lookup(self, key):
+        row = self.conn.execute(
+            "SELECT score FROM grades WHERE grader = ? AND item = ? AND output = ?", key).fetchone()
+        return None if row is None else row[0]
+
+    def _lookup_many(self, keys):
+        """Stored scores for a batch of keys, by key, in one SELECT per LOOKUP_BATCH keys"""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), LOOKUP_BATCH):
+            chunk = unique[start:start + LOOKUP_BATCH]
+            params = [self.grader_hash]
+            for _, item, output in chunk:
+                params += (item, output)
+            rows = self.conn.execute(
+                "SELECT item, output, score FROM grades WHERE grader = ? AND (item, output) IN "
+                f"(VALUES {', '.join(['(?, ?)'] * len(chunk))})", params)
+            for item, output, score in rows:
+                found[self.grader_hash, item, output] = score
+        return found
+
+    def _grade(self, sample, item):
+        start = time.perf_counter()
+        score = self.grade_fn(sample, item)
+        self.grade_seconds += time.perf_counter() - start
+        return score
+
+    def grade(self, sample, item):
+        key = self._key(sample, item)
+        score = self._lookup(key)
+        if score is not None:
+            self.hits += 1
+            return score
+        self.misses += 1
+        score = self._grade(sample, item)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?)", (*key, score))
+        return score
+
+    def grade_many(self, pairs):
+        """Grade (sample, item) pairs, writing all new scores in one transaction"""
+        scores = []
+        new_rows = {}
+        keys = [self._key(sample, item) for sample, item in pairs]
+        stored = self._lookup_many(keys)
+        for (sample, item), key in zip(pairs, keys):
+            score = stored.get(key)
+            if score is None:
+                score = new_rows.get(key)
+            if score is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                score = self._grade(sample, item)
+                new_rows[key] = score
+            scores.append(score)
+
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?)",
+                                  [(*key, score) for key, score in new_rows.items()])
+        return scores
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        entries = self.conn.execute("SELECT COUNT(*) FROM grades WHERE grader = ?", (self.grader_hash,)).fetchone()[0]
+        return {
+            "grader": self.name or "default",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate(), 4),
+            "grade_seconds": round(self.grade_seconds, 4),
+            "cached_scores_for_grader": entries,
+        }
+
+    def print_report(self):
+        r = self.report()
+        print(f"Grading cache {self.path} ({r['grader']} grader): {r['hits']} hits, {r['misses']} misses "
+              f"({100 * r['hit_rate']:.1f}% hit rate), {r['grade_seconds']:.2f}s spent in grade(), "
+              f"{r['cached_scores_for_grader']} scores stored for this grader")
+
+    def close(self):
+        self.conn.close()
+
+
+def load_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    from upload_export import grader_source_by_kind
+
+    parser = argparse.ArgumentParser(description="Score rollouts through the persistent grading cache")
+    parser.add_argument("rollouts", help="JSONL with output_text and item or item_index per line")
+    parser.add_argument("--items", default=None, help="Dataset JSONL that item_index refers to")
+    parser.add_argument("--script", default="openai_rl_job.py", help="Job script that defines the graders")
+    parser.add_argument("--grader", default=None,
+                        help="Grader name from the script's GRADERS, as for openai_rl_job.py --grader "
+                             "(default: its GRADER_SOURCE)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--scores-output", default=None, help="Write the scores as JSON")
+    args = parser.parse_args()
+
+    rollouts = load_jsonl(args.rollouts)
+    items = []
+    if any("item" not in r for r in rollouts):
+        if not args.items:
+            parser.error("rollouts use item_index, so --items is required")
+        items = load_jsonl(args.items)
+    pairs = [({"output_text": r["output_text"]}, r["item"] if "item" in r else items[r["item_index"]])
+             for r in rollouts]
+
+    try:
+        grader_source = grader_source_by_kind(args.script, args.grader)
+    except ValueError as e:
+        parser.error(str(e))
+    cache = GradingCache(grader_source, args.cache, name=args.grader)
+    start = time.perf_counter()
+    scores = cache.grade_many(pairs)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {len(scores)} rollouts in {elapsed:.2f}s, mean score {sum(scores) / max(len(scores), 1):.4f}")
+    cache.print_report()
+    cache.close()
+
+    if args.scores_output:
+        with open(args.scores_output, "w", encoding="utf-8") as f:
+            json.dump(scores, f)
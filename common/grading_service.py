@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Long-lived grading service with a pool of warm worker processes.
+#
+# Grading rollouts as they are produced by spawning a process per batch spends
+# most of its time importing rapidfuzz (and vidyut, for QA graders that use
+# it) and exec'ing the grader. This service starts N workers once; each one
+# compiles the grader, loads the dataset and runs a warm-up grade before the
+# first request. Requests are newline-delimited JSON:
+#
+#   {"item_id": 17, "output_text": "{\"conjugated_verb\": ...}", "request_id": "optional"}
+#
+# item_id is the item's "id" field if the dataset has one, else its record
+# number in --items (0-based); --items can also be a record_store.py store.
+# --grader picks any grader of the job script by name, as openai_rl_job.py
+# --grader does.
+# Each request gets one JSON line back, in completion order, with the score,
+# the echoed ids and the request latency (queueing included). At most
+# --max-pending requests are in flight; beyond that the service stops
+# reading, so a fast producer blocks on its pipe or socket instead of growing
+# a queue. A {"cmd": "stats"} line returns the p50/p90/p99 latencies so far,
+# which are also printed to stderr at exit, on end of input, Ctrl-C or
+# SIGTERM alike.
+#
+#   python ../common/grading_service.py --items sanskrit_morphology_val.jsonl --workers 4 < requests.jsonl
+#   python ../common/grading_service.py --items sanskrit_morphology_val.jsonl --port 8765
+#   python ../common/grading_service.py --items sanskrit_morphology_val.jsonl --grader answer < requests.jsonl
+
+DEFAULT_MAX_PENDING = 256
+
+# Per-worker state, set up once by _init_worker
+_grade = None
+_items = None
+
+
+def load_items(path):
+    """Items by item_id: the "id" field when present, else the record number.
+
+    A record_store.py store is opened instead of loaded, so every worker
+    shares its pages and it also accepts the content-hash item ids.
+    """
+    if path.endswith(".store"):
+        from record_store import RecordStore
+        return RecordStore(path)
+    from record_store import iter_records
+
+    # iter_records also reads the pretty-printed challenge_3 *_complete files
+    return {str(item.get("id", index)): item for index, item in enumerate(iter_records(path))}
+
+
+def _init_worker(grader_source, items_path, preload):
+    global _grade, _items
+    import importlib
+
+    for module in preload:
+        importlib.import_module(module)
+    namespace = {}
+    exec(compile(grader_source, "<grader>", "exec"), namespace)
+    _grade = namespace["grade"]
+    _items = load_items(items_path)
+    # The first call pays for lazy initialisation inside the grader's imports
+    if len(_items):
+        _grade({"output_text": ""}, _items.get("0"))
+
+
+def _warm():
+    return _grade is not None
+
+
+def _grade_request(item_id, output_text):
+    item = _items.get(str(item_id))
+    if item is None:
+        raise KeyError(f"unknown item_id {item_id!r}")
+    return _grade({"output_text": output_text}, item)
+
+
+class LatencyStats:
+    """Request latencies with nearest-rank percentiles"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, seconds, error=False):
+        with self._lock:
+            self.latencies.append(seconds)
+            if error:
+                self.errors += 1
+
+    def percentile(self, ordered, q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def report(self):
+        with self._lock:
+            ordered = sorted(self.latencies)
+            errors = self.errors
+        elapsed = time.perf_counter() - self.started
+        report = {"requests": len(ordered), "errors": errors,
+                  "requests_per_s": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0}
+        if ordered:
+            for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                report[f"{name}_ms"] = round(1000 * self.percentile(ordered, q), 3)
+            report["max_ms"] = round(1000 * ordered[-1], 3)
+        return report
+
+    def print_report(self, stream=sys.stderr):
+        r = self.report()
+        line = f"{r['requests']} requests ({r['errors']} errors), {r['requests_per_s']:.1f}/s"
+        if r["requests"]:
+            line += (f", latency p50 {r['p50_ms']:.2f}ms, p90 {r['p90_ms']:.2f}ms, "
+                     f"p99 {r['p99_ms']:.2f}ms, max {r['max_ms']:.2f}ms")
+        print(line, file=stream, flush=True)
+
+
+class GradingService:
+    """A pool of warm grader processes behind a bounded number of pending requests"""
+
+    def __init__(self, grader_source, items_path, workers=2, max_pending=DEFAULT_MAX_PENDING, preload=()):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(grader_source, items_path, tuple(preload)))
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.stats = LatencyStats()
+        # Start every worker and let it finish warming up before serving
+        for future in [self.pool.submit(_warm) for _ in range(workers)]:
+            future.result()
+        self.stats.started = time.perf_counter()
+
+    def submit(self, request, respond):
+        """Grade one request and call respond(response) when done.
+
+        Blocks while max_pending requests are already in flight.
+        """
+        start = time.perf_counter()
+        self.pending.acquire()
+        try:
+            future = self.pool.submit(_grade_request, request["item_id"], request.get("output_text", ""))
+        except Exception:
+            self.pending.release()
+            raise
+
+        def done(future):
+            self.pending.release()
+            latency = time.perf_counter() - start
+            response = {"item_id": request["item_id"]}
+            if "request_id" in request:
+                response["request_id"] = request["request_id"]
+            error = future.exception()
+            if error is None:
+                response["score"] = future.result()
+            else:
+                response["error"] = f"{type(error).__name__}: {error}"
+            response["latency_ms"] = round(1000 * latency, 3)
+            self.stats.add(latency, error=error is not None)
+            respond(response)
+
+        future.add_done_callback(done)
+        return future
+
+    def serve_lines(self, lines, write):
+        """Handle a stream of request lines, writing one response line each"""
+        lock = threading.Condition()
+        outstanding = 0
+
+        def respond(response, submitted=False):
+            nonlocal outstanding
+            data = json.dumps(response, ensure_ascii=False) + "\n"
+            with lock:
+                try:
+                    write(data)
+                finally:
+                    if submitted:
+                        outstanding -= 1
+                        lock.notify_all()
+
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                respond({"error": f"bad request: {e}"})
+                continue
+            if isinstance(request, dict) and request.get("cmd") == "stats":
+                respond({"stats": self.stats.report()})
+                continue
+            if not isinstance(request, dict) or "item_id" not in request:
+                respond({"error": "bad request: expected an object with item_id and output_text"})
+                continue
+            with lock:
+                outstanding += 1
+            try:
+                self.submit(request, lambda response: respond(response, submitted=True))
+            except Exception:
+                with lock:
+                    outstanding -= 1
+                raise
+        # Responses for this stream must be written before it is closed
+        with lock:
+            lock.wait_for(lambda: outstanding == 0)
+
+    def close(self):
+        self.pool.shutdown()
+
+    def shutdown(self, stats_output=None):
+        """Stop the workers and report: the one exit path for every mode and for SIGTERM"""
+        self.close()
+        self.stats.print_report()
+        if stats_output:
+            with open(stats_output, "w", encoding="utf-8") as f:
+                json.dump(self.stats.report(), f, indent=2)
+
+
+def handle_sigterm():
+    """Exit on SIGTERM like on Ctrl-C, unwinding through GradingService.shutdown() in either mode"""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
+def serve_socket(service, port=None, unix_socket=None):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write(data):
+                self.wfile.write(data.encode("utf-8"))
+                self.wfile.flush()
+            service.serve_lines(self.rfile, write)
+
+    if unix_socket:
+        server = socketserver.ThreadingUnixStreamServer(unix_socket, Handler)
+        where = unix_socket
+    else:
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler)
+        where = f"127.0.0.1:{port}"
+    server.daemon_threads = True
+    print(f"Grading service listening on {where} with {service.workers} workers", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unix_socket:
+            os.unlink(unix_socket)
+
+
+if __name__ == "__main__":
+    from upload_export import grader_source_by_kind
+
+    parser = argparse.ArgumentParser(description="Grade newline-delimited (item_id, output_text) requests "
+                                                 "with a pool of warm grader processes")
+    parser.add_argument("--items", required=True, help="Dataset JSONL the item_ids refer to")
+    parser.add_argument("--script", default="openai_rl_job.py", help="Job script that defines the graders")
+    parser.add_argument("--grader", default=None,
+                        help="Grader name from the script's GRADERS, as for openai_rl_job.py --grader "
+                             "(default: its GRADER_SOURCE)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help="Requests in flight before the service stops reading input")
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="Modules to import in each worker up front, e.g. vidyut.prakriya")
+    parser.add_argument("--port", type=int, default=None, help="Serve on a local TCP port instead of stdin")
+    parser.add_argument("--unix-socket", default=None, help="Serve on a Unix socket instead of stdin")
+    parser.add_argument("--stats-output", default=None, help="Write the latency report as JSON at exit")
+    args = parser.parse_args()
+
+    try:
+        grader_source = grader_source_by_kind(args.script, args.grader)
+    except ValueError as e:
+        parser.error(str(e))
+    service = GradingService(grader_source, args.items, args.workers, args.max_pending, args.preload)
+    handle_sigterm()
+    try:
+        if args.port or args.unix_socket:
+            serve_socket(service, args.port, args.unix_socket)
+        else:
+            def write(data):
+                sys.stdout.write(data)
+                sys.stdout.flush()
+            try:
+                service.serve_lines(sys.stdin, write)
+            except KeyboardInterrupt:
+                pass
+    finally:
+        service.shutdown(args.stats_output)
@@ -0,0 +1,156 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+# Lightweight timing/counter instrumentation for the dataset generators.
+#
+# Stages are timed with `with metrics.stage("derive"): ...`, counters are bumped
+# with `metrics.count("entries")` and progress is reported with
+# `metrics.progress(done, total)`, which prints at most once per
+# `progress_interval` seconds instead of once per entry. At the end of a run
+# `metrics.write_summary(path)` dumps a JSON timing summary.
+
+
+class Instrumentation:
+    """Per-stage timers and counters with rate-limited progress logging"""
+
+    def __init__(self, name="generator", progress_interval=5.0, stream=None):
+        self.name = name
+        self.progress_interval = progress_interval
+        self.stream = stream or sys.stdout
+        self.reset()
+
+    def reset(self):
+        self.timers = {}   # stage -> total seconds
+        self.calls = {}    # stage -> number of times the stage ran
+        self.counters = {}
+        self.started = time.perf_counter()
+        self._last_progress = self.started
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of code and add it to the stage's total"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def progress(self, done, total=None, unit="entries", force=False):
+        """Print a progress line, at most once every progress_interval seconds"""
+        now = time.perf_counter()
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+
+        elapsed = now - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        line = f"[{self.name}] {done}"
+        if total:
+            eta = (total - done) / rate if rate else 0.0
+            line += f"/{total} {unit} ({100 * done / total:.1f}%), {rate:.1f} {unit}/s, ETA {eta:.0f}s"
+        else:
+            line += f" {unit}, {rate:.1f} {unit}/s"
+        print(line, file=self.stream, flush=True)
+
+    def snapshot(self):
+        """Raw timers/counters, e.g. to send back from a worker process"""
+        return {"timers": dict(self.timers), "calls": dict(self.calls), "counters": dict(self.counters)}
+
+    def merge(self, snapshot):
+        """Fold in a snapshot taken in another process"""
+        for key, value in snapshot["timers"].items():
+            self.timers[key] = self.timers.get(key, 0.0) + value
+        for key, value in snapshot["calls"].items():
+            self.calls[key] = self.calls.get(key, 0) + value
+        for key, value in snapshot["counters"].items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        stages = {
+            name: {
+                "seconds": round(seconds, 6),
+                "calls": self.calls[name],
+                "mean_ms": round(1000 * seconds / self.calls[name], 4) if self.calls[name] else 0.0,
+            }
+            for name, seconds in sorted(self.timers.items(), key=lambda kv: -kv[1])
+        }
+        return {
+            "name": self.name,
+            "wall_seconds": round(wall, 6),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\nTiming summary ({summary['wall_seconds']:.2f}s wall):", file=self.stream)
+        for name, stage in summary["stages"].items():
+            print(f"  {name:<20} {stage['seconds']:>10.3f}s  {stage['calls']:>9} calls  "
+                  f"{stage['mean_ms']:>9.3f} ms/call", file=self.stream)
+        for name, value in summary["counters"].items():
+            print(f"  {name:<20} {value:>10}", file=self.stream)
+
+    def write_summary(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+@contextmanager
+def profiled(mode=None, output=None):
+    """Optionally run a block under cProfile or pyinstrument.
+
+    mode is None (no profiling), "cprofile" or "pyinstrument". With cProfile the
+    stats are written to `output` (default: profile.pstats) and the top entries
+    printed; with pyinstrument a text report is printed (and saved as HTML if
+    `output` is given).
+    """
+    if mode is None:
+        yield
+        return
+
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output = output or "profile.pstats"
+            profiler.dump_stats(output)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+            print(f"cProfile stats written to {output}")
+    elif mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed (pip install pyinstrument); running without profiling")
+            yield
+            return
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            print(profiler.output_text(unicode=True, color=False))
+            if output:
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                print(f"pyinstrument report written to {output}")
+    else:
+        raise ValueError(f"Unknown profiler {mode!r}; use 'cprofile' or 'pyinstrument'")
+
+
+# Process-wide instance used by the generator modules
+metrics = Instrumentation()
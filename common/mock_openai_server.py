@@ -0,0 +1,200 @@
+import argparse
+import itertools
+import time
+
+from aiohttp import web
+
+# Minimal local stand-in for the OpenAI files / uploads / fine_tuning endpoints,
+# so that openai_async.py can be exercised without an API key or credits:
+#
+#   python ../common/mock_openai_server.py --port 8089
+#   OPENAI_API_KEY=test python openai_rl_job.py async --base-url http://127.0.0.1:8089/v1
+#
+# Jobs advance one status (validating_files -> queued -> running -> succeeded)
+# every `--step-seconds` seconds, emitting an event at each step. Jobs whose
+# hyperparameters contain n_epochs == --fail-epochs fail instead, so sweeps can
+# be tested with a mix of outcomes.
+
+JOB_STATUSES = ["validating_files", "queued", "running", "succeeded"]
+
+_ids = itertools.count(1)
+
+
+def new_id(prefix):
+    return f"{prefix}-mock{next(_ids):06d}"
+
+
+def file_object(file_id, filename, size, purpose):
+    return {"id": file_id, "object": "file", "bytes": size, "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed"}
+
+
+class MockOpenAI:
+    def __init__(self, step_seconds=1.0, fail_epochs=None):
+        self.step_seconds = step_seconds
+        self.fail_epochs = fail_epochs
+        self.files = {}
+        self.uploads = {}
+        self.jobs = {}
+        self.events = {}
+        self.requests = 0
+
+    def app(self):
+        app = web.Application(client_max_size=128 << 20, middlewares=[self.count_requests])
+        app.add_routes([
+            web.post("/v1/files", self.create_file),
+            web.get("/v1/files/{file_id}", self.retrieve_file),
+            web.post("/v1/uploads", self.create_upload),
+            web.post("/v1/uploads/{upload_id}/parts", self.add_part),
+            web.post("/v1/uploads/{upload_id}/complete", self.complete_upload),
+            web.post("/v1/fine_tuning/jobs", self.create_job),
+            web.get("/v1/fine_tuning/jobs/{job_id}", self.retrieve_job),
+            web.get("/v1/fine_tuning/jobs/{job_id}/events", self.list_events),
+            web.get("/mock/stats", self.stats),
+        ])
+        return app
+
+    @web.middleware
+    async def count_requests(self, request, handler):
+        self.requests += 1
+        return await handler(request)
+
+    @staticmethod
+    def not_found(kind, object_id):
+        return web.json_response({"error": {"message": f"No such {kind}: {object_id}",
+                                            "type": "invalid_request_error", "code": None}}, status=404)
+
+    # Files
+
+    async def create_file(self, request):
+        form = await request.post()
+        upload = form["file"]
+        data = upload.file.read()
+        file_id = new_id("file")
+        self.files[file_id] = file_object(file_id, upload.filename, len(data), form.get("purpose", "fine-tune"))
+        return web.json_response(self.files[file_id])
+
+    async def retrieve_file(self, request):
+        file_id = request.match_info["file_id"]
+        if file_id not in self.files:
+            return self.not_found("file", file_id)
+        return web.json_response(self.files[file_id])
+
+    # Multipart uploads
+
+    async def create_upload(self, request):
+        body = await request.json()
+        upload_id = new_id("upload")
+        self.uploads[upload_id] = {
+            "id": upload_id, "object": "upload", "bytes": body["bytes"], "filename": body["filename"],
+            "purpose": body["purpose"], "status": "pending", "created_at": int(time.time()),
+            "expires_at": int(time.time()) + 3600, "file": None, "_parts": {},
+        }
+        return web.json_response({k: v for k, v in self.uploads[upload_id].items() if not k.startswith("_")})
+
+    async def add_part(self, request):
+        upload_id = request.match_info["upload_id"]
+        if upload_id not in self.uploads:
+            return self.not_found("upload", upload_id)
+        form = await request.post()
+        part_id = new_id("part")
+        self.uploads[upload_id]["_parts"][part_id] = len(form["data"].file.read())
+        return web.json_response({"id": part_id, "object": "upload.part",
+                                  "created_at": int(time.time()), "upload_id": upload_id})
+
+    async def complete_upload(self, request):
+        upload_id = request.match_info["upload_id"]
+        if upload_id not in self.uploads:
+            return self.not_found("upload", upload_id)
+        upload = self.uploads[upload_id]
+        body = await request.json()
+        received = sum(upload["_parts"][part_id] for part_id in body["part_ids"])
+        if received != upload["bytes"]:
+            return web.json_response({"error": {
+                "message": f"Upload has {received} bytes in its parts, expected {upload['bytes']}",
+                "type": "invalid_request_error", "code": None}}, status=400)
+
+        file_id = new_id("file")
+        self.files[file_id] = file_object(file_id, upload["filename"], received, upload["purpose"])
+        upload.update(status="completed", file=self.files[file_id])
+        return web.json_response({k: v for k, v in upload.items() if not k.startswith("_")})
+
+    # Fine-tuning jobs
+
+    async def create_job(self, request):
+        body = await request.json()
+        for key in ("training_file", "validation_file"):
+            if body.get(key) and body[key] not in self.files:
+                return self.not_found("file", body[key])
+
+        job_id = new_id("ftjob")
+        hyperparameters = (body.get("method", {}).get("reinforcement", {}) or {}).get("hyperparameters", {})
+        self.jobs[job_id] = {
+            "id": job_id, "object": "fine_tuning.job", "created_at": int(time.time()),
+            "model": body["model"], "training_file": body["training_file"],
+            "validation_file": body.get("validation_file"), "method": body.get("method"),
+            "hyperparameters": hyperparameters, "seed": body.get("seed", 0), "status": JOB_STATUSES[0],
+            "error": None, "fine_tuned_model": None, "finished_at": None, "organization_id": "org-mock",
+            "result_files": [], "trained_tokens": None, "_started": time.monotonic(),
+        }
+        self.events[job_id] = []
+        self.add_event(job_id, "info", "Validating training file")
+        return web.json_response(self.public_job(job_id))
+
+    def add_event(self, job_id, level, message):
+        self.events[job_id].append({"id": new_id("ftevent"), "object": "fine_tuning.job.event",
+                                    "created_at": int(time.time()), "level": level, "message": message})
+
+    def advance(self, job_id):
+        job = self.jobs[job_id]
+        if job["status"] in ("succeeded", "failed"):
+            return
+        target = min(int((time.monotonic() - job["_started"]) / self.step_seconds), len(JOB_STATUSES) - 1)
+        while JOB_STATUSES.index(job["status"]) < target:
+            status = JOB_STATUSES[JOB_STATUSES.index(job["status"]) + 1]
+            if status == "succeeded" and self.fail_epochs is not None \
+                    and job["hyperparameters"].get("n_epochs") == self.fail_epochs:
+                job.update(status="failed", finished_at=int(time.time()),
+                           error={"code": "mock_failure", "message": "Failed on purpose", "param": None})
+                self.add_event(job_id, "error", "Job failed")
+                return
+            job["status"] = status
+            if status == "succeeded":
+                job.update(finished_at=int(time.time()), fine_tuned_model=f"ft:{job['model']}:mock:{job_id}")
+            self.add_event(job_id, "info", f"Job is {status}")
+
+    def public_job(self, job_id):
+        return {k: v for k, v in self.jobs[job_id].items() if not k.startswith("_")}
+
+    async def retrieve_job(self, request):
+        job_id = request.match_info["job_id"]
+        if job_id not in self.jobs:
+            return self.not_found("job", job_id)
+        self.advance(job_id)
+        return web.json_response(self.public_job(job_id))
+
+    async def list_events(self, request):
+        job_id = request.match_info["job_id"]
+        if job_id not in self.jobs:
+            return self.not_found("job", job_id)
+        limit = int(request.query.get("limit", 20))
+        events = list(reversed(self.events[job_id]))  # newest first, like the real API
+        return web.json_response({"object": "list", "data": events[:limit], "has_more": len(events) > limit})
+
+    async def stats(self, request):
+        return web.json_response({"requests": self.requests, "files": len(self.files),
+                                  "uploads": len(self.uploads), "jobs": len(self.jobs)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI files/fine_tuning API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--step-seconds", type=float, default=1.0,
+                        help="Seconds between job status transitions")
+    parser.add_argument("--fail-epochs", type=int, default=None,
+                        help="Jobs with this n_epochs fail instead of succeeding")
+    args = parser.parse_args()
+
+    mock = MockOpenAI(step_seconds=args.step_seconds, fail_epochs=args.fail_epochs)
+    web.run_app(mock.app(), host=args.host, port=args.port)
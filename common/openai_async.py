@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from openai import AsyncOpenAI, NotFoundError
+
+# Async orchestration for RL fine-tuning jobs.
+#
+# - Uploads run concurrently. Files above `multipart_threshold` go through the
+#   Uploads API in parallel parts. Every file is keyed by its SHA-256, so a file
+#   with the same content is never uploaded twice: not within one run, and not
+#   across runs (a local cache maps content hash -> file id).
+# - Jobs are monitored by a polling loop with exponential backoff that prints
+#   new job events as they arrive and resets the delay whenever something
+#   happens.
+# - A sweep launches several jobs concurrently and monitors them all.
+#
+# Pass base_url (e.g. http://127.0.0.1:8089/v1) to run against
+# mock_openai_server.py instead of the real API.
+
+UPLOAD_CACHE = ".upload_cache.json"
+PART_SIZE = 64 << 20            # The Uploads API accepts parts of up to 64 MB
+MULTIPART_THRESHOLD = 64 << 20  # Smaller files go through a single files.create
+TERMINAL_STATUSES = {"succeeded", "failed", "cancelled"}
+
+
+def file_digests(path):
+    """Return (sha256, md5) hex digests of a file, read in chunks"""
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+class AsyncJobOrchestrator:
+    """Concurrent, deduplicated uploads plus job creation and monitoring"""
+
+    def __init__(self, client=None, api_key=None, base_url=None,
+                 cache_path=UPLOAD_CACHE, max_concurrency=4,
+                 part_size=PART_SIZE, multipart_threshold=MULTIPART_THRESHOLD):
+        self.client = client or AsyncOpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY"),
+                                            base_url=base_url)
+        self.cache_path = Path(cache_path)
+        self.part_size = part_size
+        self.multipart_threshold = multipart_threshold
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}  # cache key -> Task, so concurrent uploads of one file share a task
+        self._cache = self._load_cache()
+
+    def _load_cache(self):
+        if self.cache_path.exists():
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _save_cache(self):
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def _cache_key(self, digest, purpose):
+        # Uploads are scoped to an API endpoint, so the mock server and the
+        # real API don't share cache entries
+        return f"{self.client.base_url}|{purpose}|{digest}"
+
+    async def upload(self, path, purpose="fine-tune"):
+        """Upload a file unless identical content was uploaded before; returns the file id"""
+        path = Path(path)
+        digest, md5 = await asyncio.to_thread(file_digests, path)
+        key = self._cache_key(digest, purpose)
+
+        if key not in self._in_flight:
+            self._in_flight[key] = asyncio.ensure_future(self._upload_once(path, purpose, key, md5))
+        return await self._in_flight[key]
+
+    async def _upload_once(self, path, purpose, key, md5):
+        cached = self._cache.get(key)
+        if cached:
+            try:
+                await self.client.files.retrieve(cached["file_id"])
+                print(f"Reusing {cached['file_id']} for {path.name} (same content as {cached['filename']})")
+                return cached["file_id"]
+            except NotFoundError:
+                print(f"Cached file {cached['file_id']} no longer exists, uploading {path.name} again")
+
+        size = path.stat().st_size
+        start = time.perf_counter()
+        if size > self.multipart_threshold:
+            file_id = await self._multipart_upload(path, size, purpose, md5)
+        else:
+            async with self._semaphore:
+                with open(path, "rb") as f:
+                    uploaded = await self.client.files.create(file=(path.name, f.read()), purpose=purpose)
+            file_id = uploaded.id
+        print(f"Uploaded {path.name} ({size / (1 << 20):.1f} MB) as {file_id} "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        self._cache[key] = {"file_id": file_id, "filename": path.name, "bytes": size}
+        self._save_cache()
+        return file_id
+
+    async def _multipart_upload(self, path, size, purpose, md5):
+        upload = await self.client.uploads.create(
+            bytes=size,
+            filename=path.name,
+            mime_type="application/jsonl",
+            purpose=purpose,
+        )
+
+        async def send_part(index):
+            async with self._semaphore:
+                with open(path, "rb") as f:
+                    f.seek(index * self.part_size)
+                    data = f.read(self.part_size)
+                part = await self.client.uploads.parts.create(upload.id, data=data)
+                return part.id
+
+        num_parts = (size + self.part_size - 1) // self.part_size
+        # gather keeps the part ids in file order, which complete() requires
+        part_ids = await asyncio.gather(*(send_part(i) for i in range(num_parts)))
+        completed = await self.client.uploads.complete(upload.id, part_ids=list(part_ids), md5=md5)
+        return completed.file.id
+
+    async def upload_all(self, paths, purpose="fine-tune"):
+        """Upload several files concurrently; returns their ids in the same order"""
+        return await asyncio.gather(*(self.upload(p, purpose) for p in paths))
+
+    async def create_job(self, **params):
+        job = await self.client.fine_tuning.jobs.create(**params)
+        print(f"Created job {job.id} ({job.status})")
+        return job
+
+    async def stream_job(self, job_id, initial_delay=2.0, max_delay=60.0, backoff=2.0, timeout=None):
+        """Poll a job until it finishes, printing new events; returns the final job"""
+        seen = set()
+        delay = initial_delay
+        start = time.monotonic()
+
+        while True:
+            job = await self.client.fine_tuning.jobs.retrieve(job_id)
+            page = await self.client.fine_tuning.jobs.list_events(job_id, limit=100)
+
+            # Events come newest first
+            new_events = [e for e in page.data if e.id not in seen]
+            for event in reversed(new_events):
+                seen.add(event.id)
+                print(f"[{job_id}] {event.level}: {event.message}")
+
+            if job.status in TERMINAL_STATUSES:
+                if job.status == "succeeded":
+                    print(f"[{job_id}] ✅ Job completed! Fine-tuned model: {job.fine_tuned_model}")
+                else:
+                    print(f"[{job_id}] ❌ Job {job.status}. Error: {job.error}")
+                return job
+
+            if timeout is not None and time.monotonic() - start > timeout:
+                print(f"[{job_id}] Still {job.status} after {timeout:.0f}s, giving up on monitoring")
+                return job
+
+            # Back off while nothing happens, poll quickly again once it does
+            delay = initial_delay if new_events else min(delay * backoff, max_delay)
+            await asyncio.sleep(delay)
+
+    async def sweep(self, training_file_id, validation_file_id, configs, job_params, **stream_kwargs):
+        """Launch one job per config concurrently and monitor them all.
+
+        job_params(training_file_id, validation_file_id, **config) must return
+        the keyword arguments for fine_tuning.jobs.create.
+        """
+        jobs = await asyncio.gather(*(
+            self.create_job(**job_params(training_file_id, validation_file_id, **config))
+            for config in configs
+        ))
+        finished = await asyncio.gather(*(self.stream_job(job.id, **stream_kwargs) for job in jobs))
+        for config, job in zip(configs, finished):
+            print(f"  {job.id}: {job.status:<10} {config} -> {job.fine_tuned_model}")
+        return finished
+
+    async def close(self):
+        await self.client.close()
+
+
+def parse_sweep_configs(specs):
+    """Parse 'n_epochs=3,reasoning_effort=low' style strings into dicts.
+
+    Values that are JSON literals (3, 0.5, true, null) are converted, and
+    anything else is kept as a string.
+    """
+    configs = []
+    for spec in specs:
+        config = {}
+        for pair in spec.split(","):
+            key, _, value = pair.partition("=")
+            value = value.strip()
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            config[key.strip()] = value
+        configs.append(config)
+    return configs
@@ -0,0 +1,189 @@
+import json
+from collections import Counter
+
+# Tolerant JSON extraction for model outputs.
+#
+# Models often wrap their JSON answer in a Markdown code fence or put a
+# sentence of prose before it, despite the prompt. A plain json.loads() then
+# fails and the rollout scores 0.0. extract_json_fields() instead scans for
+# the first JSON object that contains any of the requested keys and returns
+# only those keys. Scanning stops as soon as that object is closed, and only
+# the first max_chars characters of an output are looked at, so a huge
+# output (e.g. a model looping until the token limit) never gets fully parsed.
+#
+# The graders in openai_rl_job.py run on OpenAI's side and can't import this
+# module, so the parser is kept as source text (PARSER_SOURCE) that every
+# grader source includes.
+#
+#   python ../common/output_parsing.py rollouts.jsonl --keys conjugated_verb derivation_history
+
+# Parse statuses. The first three mean an object was found.
+OK = "ok"                      # the output is exactly one JSON object
+FENCED = "fenced"              # the object was inside a ``` code fence
+EMBEDDED = "embedded"          # the object was surrounded by other text
+EMPTY = "empty"                # blank output
+NO_OBJECT = "no_object"        # no '{' anywhere
+TRUNCATED = "truncated"        # the output ends inside an object
+MALFORMED = "malformed"        # the objects that were found are not valid JSON
+MISSING_KEYS = "missing_keys"  # valid objects, but none with a requested key
+TOO_LONG = "too_long"          # no object within the first max_chars characters
+SUCCESS_STATUSES = (OK, FENCED, EMBEDDED)
+
+# The parser, as source text: graders are built by concatenating it with their
+# own code (see openai_rl_job.py), and this module runs the same text for its
+# own definitions, so there is exactly one copy
+PARSER_SOURCE = r'''
+import json
+import re
+from json.decoder import scanstring
+
+_json_scan = json.JSONDecoder().scan_once
+_json_ws = re.compile(r'[ \t\n\r]*')
+_json_string_tail = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_json_structural = re.compile(r'["\[\]{}]')
+
+
+def _is_unterminated(text, pos):
+    """Whether the brackets opened at pos are still open at the end of text"""
+    depth = 0
+    while True:
+        m = _json_structural.search(text, pos)
+        if m is None:
+            return True
+        pos = m.end()
+        ch = m.group()
+        if ch == '"':
+            m = _json_string_tail.match(text, pos)
+            if m is None:
+                return True
+            pos = m.end()
+        elif ch in '[{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return False
+
+
+def _read_json_object(text, pos, keys):
+    """Decode the requested keys of the object starting at text[pos] == '{'"""
+    fields = {}
+    pos = _json_ws.match(text, pos + 1).end()
+    if text[pos] == '}':
+        return fields, pos + 1
+    while True:
+        if text[pos] != '"':
+            raise ValueError("expected a key")
+        key, pos = scanstring(text, pos + 1)
+        pos = _json_ws.match(text, pos).end()
+        if text[pos] != ':':
+            raise ValueError("expected ':'")
+        pos = _json_ws.match(text, pos + 1).end()
+        # The C scanner moves past a value faster than any pure-Python
+        # skipping would, so only the storing is conditional
+        value, pos = _json_scan(text, pos)
+        if key in keys:
+            fields[key] = value
+        pos = _json_ws.match(text, pos).end()
+        if text[pos] == '}':
+            return fields, pos + 1
+        if text[pos] != ',':
+            raise ValueError("expected ',' or '}'")
+        pos = _json_ws.match(text, pos + 1).end()
+
+
+def extract_json_fields(text, keys, max_attempts=20, max_chars=200_000):
+    """Find the first JSON object in text with any of keys.
+
+    Returns (fields, status). fields maps the requested keys found to their
+    values, or is None when nothing usable was found; status says why. Only
+    the first max_chars characters are looked at.
+    """
+    if not text or not text.strip():
+        return None, "empty"
+    too_long = len(text) > max_chars
+    if too_long:
+        text = text[:max_chars]
+    keys = frozenset(keys)
+
+    # Fast path: the whole output is one JSON object, as the prompt asks
+    stripped = text.strip()
+    if stripped[0] == '{' and not too_long:
+        try:
+            value, end = _json_scan(stripped, 0)
+        except (ValueError, StopIteration):
+            pass
+        else:
+            if end == len(stripped):
+                fields = {key: value[key] for key in keys if key in value}
+                if fields:
+                    return fields, "ok"
+
+    pos = text.find('{')
+    if pos < 0:
+        return None, "no_object"
+    status = "malformed"
+    for _ in range(max_attempts):
+        try:
+            fields, end = _read_json_object(text, pos, keys)
+        except (IndexError, ValueError, StopIteration):
+            if not _is_unterminated(text, pos):
+                status = "malformed"
+            else:
+                # The text ran out before the object was closed
+                status = "too_long" if too_long else "truncated"
+        else:
+            if fields:
+                if not text[:pos].strip() and not text[end:].strip():
+                    return fields, "ok"
+                if '```' in text[:pos] and '```' in text[end:]:
+                    return fields, "fenced"
+                return fields, "embedded"
+            status = "missing_keys"
+        pos = text.find('{', pos + 1)
+        if pos < 0:
+            break
+    return None, status
+'''
+
+exec(PARSER_SOURCE)
+
+
+class ParseStats:
+    """Counts of parse statuses, for diagnosing why rollouts score 0.0"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def extract(self, text, keys):
+        fields, status = extract_json_fields(text, keys)
+        self.counts[status] += 1
+        return fields, status
+
+    def report(self):
+        total = sum(self.counts.values())
+        return {status: {"count": count, "fraction": round(count / total, 4)}
+                for status, count in self.counts.most_common()}
+
+    def print_report(self):
+        total = sum(self.counts.values())
+        parsed = sum(self.counts[s] for s in SUCCESS_STATUSES)
+        print(f"{parsed}/{total} outputs yielded a JSON object")
+        for status, entry in self.report().items():
+            print(f"  {status:<14} {entry['count']:>8}  {100 * entry['fraction']:5.1f}%")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report how model outputs parse")
+    parser.add_argument("rollouts", help="JSONL with an output_text field per line")
+    parser.add_argument("--keys", nargs="+", required=True, help="Keys the grader reads from the answer")
+    args = parser.parse_args()
+
+    stats = ParseStats()
+    with open(args.rollouts, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                stats.extract(json.loads(line)["output_text"], args.keys)
+    stats.print_report()
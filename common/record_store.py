@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from grading_cache import item_key
+
+# Read-only, memory-mapped record store with O(1) lookup by item id.
+#
+# Finding the source record of a rollout used to mean json-loading a whole
+# JSONL file into a list, in every process that needed one. A store is two
+# files built once from the JSONL:
+#
+#   NAME.store      the records as compact JSON, one per line
+#   NAME.store.idx  header, uint64 record offsets (n + 1), and an open
+#                   addressing hash table of (uint64 id hash, uint32 position)
+#
+# Both are opened with mmap, so only the pages a lookup touches are read, and
+# worker processes opening the same store share them through the page cache.
+# Item ids are grading_cache.item_key(): the record's "id" if it has one,
+# else a hash of its content. Records can also be read by position.
+#
+#   python ../common/record_store.py build sanskrit_morphology_val.jsonl
+#   python ../common/record_store.py get sanskrit_morphology_val.store 17 4f0c...
+
+STORE_SUFFIX = ".store"
+INDEX_SUFFIX = ".idx"
+MAGIC = b"RECSTOR1"
+# magic, byte order, record count, hash table size
+HEADER = struct.Struct("<8sBxxxIQ")
+
+
+def id_hash(item_id):
+    return int.from_bytes(hashlib.blake2b(str(item_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def iter_records(path, skipped=None):
+    """Records of a JSONL file, also accepting pretty-printed records spanning several lines.
+
+    Each line is decoded on its own first. Only a line that opens an object
+    without closing it starts a multi-line record, which ends at the next
+    unindented line that completes it; an unindented line starting a new
+    object abandons it. A malformed line or record raises ValueError naming
+    the file and line, or, when `skipped` is a list, has its first line
+    number appended there and is skipped.
+    """
+    def malformed(lineno, error):
+        if skipped is None:
+            raise ValueError(f"{path}:{lineno}: malformed record: {error}")
+        skipped.append(lineno)
+
+    buffer = []
+    start = 0
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if buffer:
+                if line[:1] == "{":
+                    malformed(start, "record not closed before the next one")
+                    buffer = []
+                else:
+                    buffer.append(line)
+                    if line[:1].isspace():
+                        continue
+                    try:
+                        yield json.loads("".join(buffer))
+                    except json.JSONDecodeError as e:
+                        malformed(start, e)
+                    buffer = []
+                    continue
+            stripped = line.strip()
+            if not stripped:
+                continue
+            try:
+                yield json.loads(stripped)
+            except json.JSONDecodeError as e:
+                # An object cut off at the end of the line continues on the next ones
+                if stripped[0] == "{" and e.pos == len(stripped):
+                    buffer = [line]
+                    start = lineno
+                else:
+                    malformed(lineno, e)
+    if buffer:
+        malformed(start, "record not closed at end of file")
+
+
+def store_path(jsonl_path):
+    root, _ = os.path.splitext(jsonl_path)
+    return root + STORE_SUFFIX
+
+
+def build_store(jsonl_path, path=None):
+    """Write the store for a JSONL file; returns (path, records, duplicate ids)"""
+    path = path or store_path(jsonl_path)
+    offsets = array("Q", [0])
+    hashes = []
+    with open(path + ".tmp", "wb") as f:
+        for record in iter_records(jsonl_path):
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+            offsets.append(f.tell())
+            hashes.append(id_hash(item_key(record)))
+
+    # Power-of-two table at most half full, so probe sequences stay short
+    size = 1
+    while size < 2 * len(hashes):
+        size *= 2
+    mask = size - 1
+    table_hashes = array("Q", bytes(8 * size))
+    table_positions = array("I", bytes(4 * size))  # position + 1, 0 for an empty slot
+    duplicates = 0
+    for position, h in enumerate(hashes):
+        slot = h & mask
+        while table_positions[slot] and table_hashes[slot] != h:
+            slot = (slot + 1) & mask
+        if table_positions[slot]:
+            # Same id as an earlier record: the first one wins
+            duplicates += 1
+            continue
+        table_hashes[slot] = h
+        table_positions[slot] = position + 1
+
+    with open(path + INDEX_SUFFIX + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, sys.byteorder == "little", len(hashes), size))
+        offsets.tofile(f)
+        table_hashes.tofile(f)
+        table_positions.tofile(f)
+    os.replace(path + ".tmp", path)
+    os.replace(path + INDEX_SUFFIX + ".tmp", path + INDEX_SUFFIX)
+    return path, len(hashes), duplicates
+
+
+class RecordStore:
+    """Random access to the records of a store written by build_store()"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap can't map an empty file
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        with open(path + INDEX_SUFFIX, "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, little, self.count, size = HEADER.unpack_from(self._index, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path + INDEX_SUFFIX} is not a record store index")
+        if little != (sys.byteorder == "little"):
+            raise ValueError(f"{path} was built on a machine with the other byte order")
+        self._mask = size - 1
+        view = memoryview(self._index)
+        start = HEADER.size
+        self._offsets = view[start:start + 8 * (self.count + 1)].cast("Q")
+        start += 8 * (self.count + 1)
+        self._hashes = view[start:start + 8 * size].cast("Q")
+        start += 8 * size
+        self._positions = view[start:start + 4 * size].cast("I")
+
+    def __len__(self):
+        return self.count
+
+    def raw(self, position):
+        """The JSON bytes of the record at position"""
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+        return self._data[self._offsets[position]:self._offsets[position + 1] - 1]
+
+    def __getitem__(self, position):
+        return json.loads(self.raw(position))
+
+    def __iter__(self):
+        for position in range(self.count):
+            yield self[position]
+
+    def position(self, item_id):
+        """Position of the record with item_id, or None"""
+        h = id_hash(item_id)
+        slot = h & self._mask
+        while True:
+            position = self._positions[slot]
+            if not position:
+                return None
+            if self._hashes[slot] == h:
+                return position - 1
+            slot = (slot + 1) & self._mask
+
+    def get(self, item_id, default=None):
+        """The record with item_id; a record's position (int or decimal string) also works"""
+        position = self.position(item_id)
+        if position is None:
+            try:
+                position = int(item_id)
+            except (TypeError, ValueError):
+                return default
+            if not 0 <= position < self.count:
+                return default
+        return self[position]
+
+    def close(self):
+        for view in (self._offsets, self._hashes, self._positions):
+            view.release()
+        self._index.close()
+        if self._data:
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or read memory-mapped record stores")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build NAME.store and NAME.store.idx for JSONL files")
+    build.add_argument("files", nargs="+")
+
+    get = subparsers.add_parser("get", help="Print records by item id or position")
+    get.add_argument("store")
+    get.add_argument("ids", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for path in args.files:
+            output, records, duplicates = build_store(path)
+            note = f", {duplicates} duplicate ids (first kept)" if duplicates else ""
+            print(f"{path}: {records} records -> {output}{note}")
+    else:
+        with RecordStore(args.store) as store:
+            for item_id in args.ids:
+                record = store.get(item_id)
+                print(json.dumps(record, ensure_ascii=False) if record is not None else f"{item_id}: not found")
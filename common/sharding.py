@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
+from pathlib import Path
+
+# Shard files and manifests for generating a dataset on several machines.
+#
+# A generator run with --shard-index i --num-shards n does only the part of
+# the work that shard i owns (every nth cell or XML file) and writes its
+# records, each tagged with its position in a single-machine run (a cell
+# number, or a [file, segment] pair; anything that sorts in run order), to
+#
+#   DIR/PREFIX-0000i-of-0000n.jsonl           {"order": position, "data": record} per line
+#   DIR/PREFIX-0000i-of-0000n.manifest.json   shard index and count, run spec,
+#                                             record count, sha256 and size of the file
+#
+# The run spec describes everything that decides the output (generator
+# settings, library versions), so shards from different runs can't be mixed.
+# merge_shards() checks that all n manifests are present and agree and that
+# every file matches its checksum, then yields the records in position order;
+# the generator's --merge step splits and writes them exactly as a single
+# run would.
+#
+#   python ../common/sharding.py check shards/   # validate the manifests in a directory
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def owns(position, shard_index, num_shards):
+    """Whether the shard owns the cell or file at position"""
+    return position % num_shards == shard_index
+
+
+def check_shard_args(shard_index, num_shards):
+    if num_shards < 1:
+        raise ValueError(f"num_shards must be at least 1, got {num_shards}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+
+
+def shard_name(prefix, shard_index, num_shards):
+    return f"{prefix}-{shard_index:05d}-of-{num_shards:05d}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_shard(output_dir, prefix, shard_index, num_shards, rows, run_spec):
+    """Write (position, record) rows, in increasing position order, and the shard's manifest.
+
+    Returns the manifest.
+    """
+    check_shard_args(shard_index, num_shards)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    name = shard_name(prefix, shard_index, num_shards)
+    path = output_dir / f"{name}.jsonl"
+
+    digest = hashlib.sha256()
+    records = 0
+    last = None
+    with open(f"{path}.tmp", "wb") as f:
+        for position, record in rows:
+            if last is not None and position <= last:
+                raise ValueError(f"shard rows must be in increasing position order ({position} after {last})")
+            last = position
+            line = (json.dumps({"order": position, "data": record}, ensure_ascii=False) + "\n").encode("utf-8")
+            f.write(line)
+            digest.update(line)
+            records += 1
+    os.replace(f"{path}.tmp", path)
+
+    manifest = {
+        "prefix": prefix,
+        "shard_index": shard_index,
+        "num_shards": num_shards,
+        "run_spec": run_spec,
+        "file": path.name,
+        "records": records,
+        "bytes": path.stat().st_size,
+        "sha256": digest.hexdigest(),
+    }
+    manifest_path = output_dir / f"{name}{MANIFEST_SUFFIX}"
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return manifest
+
+
+def load_manifests(input_dir, prefix, verify=True):
+    """The manifests of a complete, consistent set of shards, by shard index.
+
+    Raises ValueError if a shard is missing or duplicated, the manifests
+    disagree on the shard count or run spec, or (with verify) a shard file
+    doesn't match its size and checksum.
+    """
+    input_dir = Path(input_dir)
+    manifests = {}
+    for path in sorted(input_dir.glob(f"{prefix}-*{MANIFEST_SUFFIX}")):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("prefix") != prefix:
+            continue
+        index = manifest["shard_index"]
+        if index in manifests:
+            raise ValueError(f"{path}: shard {index} appears twice")
+        manifests[index] = manifest
+    if not manifests:
+        raise ValueError(f"No {prefix} shard manifests in {input_dir}")
+
+    first = manifests[min(manifests)]
+    num_shards = first["num_shards"]
+    for index, manifest in manifests.items():
+        if manifest["num_shards"] != num_shards:
+            raise ValueError(f"shard {index} is one of {manifest['num_shards']} shards, shard {first['shard_index']} "
+                             f"one of {num_shards}")
+        if manifest["run_spec"] != first["run_spec"]:
+            raise ValueError(f"shard {index} was generated with a different run spec than shard "
+                             f"{first['shard_index']}: {manifest['run_spec']} != {first['run_spec']}")
+    missing = sorted(set(range(num_shards)) - set(manifests))
+    if missing:
+        raise ValueError(f"missing {len(missing)} of {num_shards} shards: {missing[:20]}")
+
+    if verify:
+        for index, manifest in sorted(manifests.items()):
+            path = input_dir / manifest["file"]
+            if not path.exists():
+                raise ValueError(f"shard {index}: {path} does not exist")
+            if path.stat().st_size != manifest["bytes"]:
+                raise ValueError(f"shard {index}: {path} has {path.stat().st_size} bytes, "
+                                 f"manifest says {manifest['bytes']}")
+            if file_sha256(path) != manifest["sha256"]:
+                raise ValueError(f"shard {index}: {path} does not match its sha256")
+    return manifests
+
+
+def _shard_rows(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row["order"], row["data"]
+
+
+def merge_shards(input_dir, prefix, run_spec=None):
+    """Records of all shards in position order, after validating the manifests.
+
+    With run_spec, the shards must also have been generated with it.
+    """
+    manifests = load_manifests(input_dir, prefix)
+    spec = next(iter(manifests.values()))["run_spec"]
+    if run_spec is not None and spec != run_spec:
+        raise ValueError(f"shards in {input_dir} were generated with {spec}, this run is {run_spec}")
+    streams = [_shard_rows(Path(input_dir) / manifests[index]["file"]) for index in sorted(manifests)]
+    last = None
+    for position, record in heapq.merge(*streams, key=lambda row: row[0]):
+        if position == last:
+            raise ValueError(f"position {position} appears in more than one shard")
+        last = position
+        yield record
+
+
+def write_output_manifest(paths, manifest_path, run_spec=None, shards=None):
+    """Record the sha256 and size of the merged output files"""
+    manifest = {"run_spec": run_spec, "num_shards": shards, "files": {}}
+    for path in paths:
+        path = Path(path)
+        manifest["files"][path.name] = {"bytes": path.stat().st_size, "sha256": file_sha256(path)}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate dataset shard manifests and checksums")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check = subparsers.add_parser("check", help="Check that a directory holds a complete, intact set of shards")
+    check.add_argument("input_dir")
+    check.add_argument("--prefix", default=None, help="Shard prefix (default: every prefix in the directory)")
+    args = parser.parse_args()
+
+    # The merged output manifest has no prefix
+    prefixes = [args.prefix] if args.prefix else sorted({
+        json.loads(path.read_text(encoding="utf-8")).get("prefix")
+        for path in Path(args.input_dir).glob(f"*{MANIFEST_SUFFIX}")
+    } - {None})
+    if not prefixes:
+        parser.error(f"no shard manifests in {args.input_dir}")
+    failed = False
+    for prefix in prefixes:
+        try:
+            manifests = load_manifests(args.input_dir, prefix)
+        except ValueError as e:
+            print(f"{prefix}: {e}")
+            failed = True
+            continue
+        records = sum(m["records"] for m in manifests.values())
+        print(f"{prefix}: {len(manifests)} shards, {records} records, checksums OK")
+    raise SystemExit(1 if failed else 0)
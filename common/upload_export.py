@@ -0,0 +1,268 @@
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+
+from record_store import iter_records
+
+# Upload-size optimizer for the RL training files.
+#
+# The records written by the dataset generators carry fields that neither the
+# model nor the grader ever look at (e.g. dhatu/gana/... in challenge_2,
+# quote/metadata in challenge_3). The fine-tuning API only needs the fields
+# sent to the model (`messages`) plus whatever the grader reads from `item`.
+# This script finds the latter by statically analysing the grader source for
+# `item["key"]`, `item.get("key")` and `"key" in item`, writes compact copies
+# of the files with only those fields, optionally shards them at a size limit,
+# and reports the bytes saved.
+#
+#   python ../common/upload_export.py sanskrit_morphology_train.jsonl sanskrit_morphology_val.jsonl
+#   python ../common/upload_export.py sanskrit_morphology_train.jsonl --grader answer   # keeps accepted_answers
+
+# Record fields that are sent to the model rather than to the grader
+MODEL_FIELDS = ("messages", "tools", "parallel_tool_calls")
+DEFAULT_OUTPUT_DIR = "upload_export"
+
+
+def load_job_script(path="openai_rl_job.py"):
+    """Import a job script from its path, with its directory on sys.path for its sibling modules.
+
+    Job scripts import the OpenAI SDK only when a job is launched, so this
+    needs neither the SDK nor an API key.
+    """
+    path = Path(path).resolve()
+    spec = importlib.util.spec_from_file_location(f"_grader_script_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(path.parent))
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(path.parent))
+    return module
+
+
+def grader_source_from_script(path="openai_rl_job.py", name="GRADER_SOURCE"):
+    """Return a grader source defined in a job script.
+
+    name picks another module-level source constant, e.g. ANSWER_GRADER_SOURCE.
+    Grader sources are built from shared pieces (output_parsing.PARSER_SOURCE,
+    ...), so the script is imported rather than parsed.
+    """
+    source = getattr(load_job_script(path), name, None)
+    if not isinstance(source, str):
+        raise ValueError(f"No grader source {name} found in {path}")
+    return source
+
+
+def grader_source_by_kind(path="openai_rl_job.py", kind=None):
+    """Source of the grader a job script's --grader option calls kind (its GRADERS table).
+
+    None is the script's default grader, GRADER_SOURCE.
+    """
+    module = load_job_script(path)
+    if kind is None:
+        return grader_source_from_script(path)
+    graders = getattr(module, "GRADERS", {})
+    if kind not in graders:
+        raise ValueError(f"{path} has no grader {kind!r}; choose from {sorted(graders)}")
+    return graders[kind][1]
+
+
+def referenced_item_fields(source, function="grade"):
+    """Top-level item fields read by the grader, or None if that can't be determined.
+
+    Only constant-key accesses are understood, and passing `item` to another
+    function of the grader source counts that function's accesses. If `item`
+    is used any other way (passed to anything else, iterated, indexed with a
+    variable, ...) the grader could read any field, so None is returned and
+    nothing should be stripped.
+    """
+    tree = ast.parse(source)
+    functions = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef):
+            functions.setdefault(node.name, node)
+    return _referenced_fields(functions, function, 1, set())
+
+
+def _referenced_fields(functions, function, position, visited):
+    """referenced_item_fields() for the item passed as positional argument `position` of `function`"""
+    fn = functions.get(function)
+    if fn is None or len(fn.args.args) <= position:
+        return None
+    if (function, position) in visited:
+        return set()
+    visited.add((function, position))
+    param = fn.args.args[position].arg
+
+    parents = {}
+    for node in ast.walk(fn):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    fields = set()
+    for node in ast.walk(fn):
+        if not (isinstance(node, ast.Name) and node.id == param and isinstance(node.ctx, ast.Load)):
+            continue
+        parent = parents.get(node)
+
+        # item["key"]
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            if isinstance(parent.slice, ast.Constant) and isinstance(parent.slice.value, str):
+                fields.add(parent.slice.value)
+                continue
+            return None
+
+        # item.get("key", ...)
+        if isinstance(parent, ast.Attribute) and parent.attr == "get":
+            call = parents.get(parent)
+            if isinstance(call, ast.Call) and call.func is parent and call.args \
+                    and isinstance(call.args[0], ast.Constant) and isinstance(call.args[0].value, str):
+                fields.add(call.args[0].value)
+                continue
+            return None
+
+        # "key" in item
+        if isinstance(parent, ast.Compare) and len(parent.ops) == 1 \
+                and isinstance(parent.ops[0], (ast.In, ast.NotIn)) and parent.comparators[0] is node \
+                and isinstance(parent.left, ast.Constant) and isinstance(parent.left.value, str):
+            fields.add(parent.left.value)
+            continue
+
+        # helper(..., item, ...) with helper defined in the grader source
+        if isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) \
+                and any(arg is node for arg in parent.args):
+            position = next(i for i, arg in enumerate(parent.args) if arg is node)
+            helper_fields = _referenced_fields(functions, parent.func.id, position, visited)
+            if helper_fields is None:
+                return None
+            fields |= helper_fields
+            continue
+
+        return None
+    return fields
+
+
+class _ShardedWriter:
+    """Write lines to one file, or to numbered shards of at most max_bytes each"""
+
+    def __init__(self, output_dir, stem, max_bytes=None):
+        self.output_dir = Path(output_dir)
+        self.stem = stem
+        self.max_bytes = max_bytes
+        self.paths = []
+        self._file = None
+        self._size = 0
+
+    def _open_next(self):
+        if self._file:
+            self._file.close()
+        suffix = f"-{len(self.paths):05d}" if self.max_bytes else ""
+        path = self.output_dir / f"{self.stem}.min{suffix}.jsonl"
+        self.paths.append(path)
+        self._file = open(path, "wb")
+        self._size = 0
+
+    def write(self, line):
+        if self._file is None or (self.max_bytes and self._size and self._size + len(line) > self.max_bytes):
+            self._open_next()
+        self._file.write(line)
+        self._size += len(line)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+def export_minimal(input_path, fields, output_dir=DEFAULT_OUTPUT_DIR, max_bytes=None):
+    """Stream input_path into compact JSONL files keeping only `fields`.
+
+    fields=None keeps every field (the records are still re-serialized
+    compactly). Returns a report with the output paths and byte counts.
+    """
+    input_path = Path(input_path)
+    os.makedirs(output_dir, exist_ok=True)
+    keep = None if fields is None else set(fields) | set(MODEL_FIELDS)
+    writer = _ShardedWriter(output_dir, input_path.stem, max_bytes)
+
+    records = 0
+    dropped = {}
+    output_bytes = 0
+    # The *_complete files in challenge_3 are pretty-printed; iter_records reads
+    # those too, and reports malformed lines instead of stopping at them
+    skipped = []
+    for record in iter_records(input_path, skipped):
+        if keep is not None:
+            for key in record.keys() - keep:
+                dropped[key] = dropped.get(key, 0) + 1
+            record = {k: v for k, v in record.items() if k in keep}
+        data = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        writer.write(data)
+        output_bytes += len(data)
+        records += 1
+    writer.close()
+
+    input_bytes = input_path.stat().st_size
+    return {
+        "input": str(input_path),
+        "outputs": [str(p) for p in writer.paths],
+        "records": records,
+        "skipped_lines": skipped,
+        "dropped_fields": dropped,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "saved_bytes": input_bytes - output_bytes,
+    }
+
+
+def export_for_grader(paths, grader_source, output_dir=DEFAULT_OUTPUT_DIR, max_bytes=None, verbose=True):
+    """Export each file with the minimal field set for the given grader source"""
+    fields = referenced_item_fields(grader_source)
+    if verbose:
+        if fields is None:
+            print("Grader uses `item` dynamically; keeping all fields")
+        else:
+            print(f"Grader reads item fields: {sorted(fields)}; also keeping {list(MODEL_FIELDS)}")
+
+    reports = [export_minimal(p, fields, output_dir, max_bytes) for p in paths]
+    if verbose:
+        for r in reports:
+            pct = 100 * r["saved_bytes"] / r["input_bytes"] if r["input_bytes"] else 0.0
+            print(f"  {Path(r['input']).name}: {r['input_bytes']:,} -> {r['output_bytes']:,} bytes "
+                  f"({pct:.1f}% smaller, {r['records']} records, {len(r['outputs'])} file(s))")
+            if r["dropped_fields"]:
+                print(f"    dropped: {', '.join(sorted(r['dropped_fields']))}")
+            if r["skipped_lines"]:
+                print(f"    skipped {len(r['skipped_lines'])} malformed record(s), first at line {r['skipped_lines'][0]}")
+        total_in = sum(r["input_bytes"] for r in reports)
+        total_out = sum(r["output_bytes"] for r in reports)
+        print(f"Total: {total_in:,} -> {total_out:,} bytes, saved {total_in - total_out:,}")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write upload copies of JSONL files with only the fields "
+                                                 "the model and the grader need")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--script", default="openai_rl_job.py", help="Job script that defines the graders")
+    parser.add_argument("--grader", default=None,
+                        help="Grader whose item fields are kept: a name from the script's GRADERS, as for "
+                             "openai_rl_job.py --grader (default: its GRADER_SOURCE)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--max-mb", type=float, default=None,
+                        help="Split outputs into shards of at most this many MB")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_mb * (1 << 20)) if args.max_mb else None
+    try:
+        grader_source = grader_source_by_kind(args.script, args.grader)
+    except ValueError as e:
+        parser.error(str(e))
+    reports = export_for_grader(args.files, grader_source, args.output_dir, max_bytes)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)